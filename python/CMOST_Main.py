@@ -30,7 +30,6 @@ import sys
 import re
 import copy
 import pickle
-import numpy as np
 
 # Ensure the python/ directory is on the import path so sibling modules
 # (calculate_sub, NumberCrunching_100000, Evaluation, etc.) can be found.
@@ -41,6 +40,8 @@ if _this_dir not in sys.path:
 import tkinter as tk
 from tkinter import messagebox, filedialog, simpledialog
 
+from settings_io import load_settings
+
 # ---------------------------------------------------------------------------
 # INDEX CONVENTION NOTES:
 #
@@ -163,95 +164,21 @@ def _isvarname(name):
 
 def _load_settings(filepath):
     """
-    Load a settings dictionary from a file.
-
-    Supports:
-      - .pkl (pickle) files: expected to contain a dict
-      - .py (Python settings module): expected to have a 'settings' dict
+    Load a settings dictionary from a file (see settings_io.load_settings).
 
     Returns
     -------
     dict or None
         The loaded settings dictionary, or None on failure.
     """
-    ext = os.path.splitext(filepath)[1].lower()
-
-    if ext == '.pkl':
-        try:
-            with open(filepath, 'rb') as f:
-                data = pickle.load(f)
-            if isinstance(data, dict):
-                return data
-        except Exception:
-            pass
-        return None
-
-    elif ext == '.py':
-        # Import the Python settings module dynamically
-        try:
-            import importlib.util
-            spec = importlib.util.spec_from_file_location('_tmp_settings', filepath)
-            mod = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(mod)
-            if hasattr(mod, 'settings') and isinstance(mod.settings, dict):
-                return copy.deepcopy(mod.settings)
-        except Exception:
-            pass
-        return None
-
-    elif ext == '.mat':
-        # Attempt to load MATLAB .mat file using scipy if available
-        try:
-            import scipy.io
-            mat_data = scipy.io.loadmat(filepath, squeeze_me=True)
-            # The MATLAB code saves as: save(filename, 'temp')
-            # so the dict key is 'temp'
-            if 'temp' in mat_data:
-                return _mat_struct_to_dict(mat_data['temp'])
-            elif 'Variables' in mat_data:
-                return _mat_struct_to_dict(mat_data['Variables'])
-            else:
-                # Return the first non-internal key
-                for key in mat_data:
-                    if not key.startswith('__'):
-                        return _mat_struct_to_dict(mat_data[key])
-        except ImportError:
-            messagebox.showwarning('scipy not available',
-                                   'Cannot load .mat files without scipy. '
-                                   'Please install scipy or use .pkl/.py files.')
-        except Exception:
-            pass
+    try:
+        return load_settings(filepath)
+    except ImportError:
+        messagebox.showwarning('scipy not available',
+                               'Cannot load .mat files without scipy. '
+                               'Please install scipy or use .pkl/.py files.')
         return None
 
-    return None
-
-
-def _mat_struct_to_dict(obj):
-    """
-    Recursively convert a scipy.io loaded MATLAB struct to a Python dict.
-    """
-    if hasattr(obj, 'dtype') and obj.dtype.names is not None:
-        # structured numpy array (MATLAB struct)
-        result = {}
-        for name in obj.dtype.names:
-            val = obj[name]
-            if hasattr(val, 'item'):
-                val = val.item()
-            result[name] = _mat_struct_to_dict(val)
-        return result
-    elif isinstance(obj, np.ndarray):
-        if obj.ndim == 0:
-            return obj.item()
-        elif obj.dtype.kind in ('U', 'S', 'O'):
-            # String or object array
-            if obj.size == 1:
-                return str(obj.flat[0])
-            return [str(x) for x in obj.flat]
-        else:
-            return obj.tolist()
-    else:
-        return obj
-
 
 def _save_settings(filepath, variables):
     """
@@ -22,6 +22,16 @@
 import numpy as np
 import math
 import os
+import functools
+from time import perf_counter
+
+from run_control import ProgressReporter
+from metrics_log import YearMetricsLog
+from checkpoint import save_checkpoint, load_checkpoint, inputs_fingerprint
+
+# Identifies this implementation of the engine in profiles, logs and caches
+# (the MATLAB original and any compiled port would use other labels).
+ENGINE_BACKEND = 'python'
 
 # ---------------------------------------------------------------------------
 # DEBUG_TRACE: set to True (or set env var CMOST_DEBUG_TRACE=1) to log every
@@ -43,16 +53,68 @@ _trace_rows = []  # populated when DEBUG_TRACE is True
 # when indexing into 0-based arrays (e.g. stage-7 for a 4-element array,
 # location-1 for a 13-element array).
 #
-# MATLAB's  rand  is replaced by  np.random.rand() .
+# MATLAB's  rand  is replaced by  _rand_nh()  for natural-history draws and
+#           _rand()  for intervention draws (screening, detection,
+#           complications).  Both are aliases of np.random.rand, so they form
+#           one stream as in MATLAB; common random numbers (crn.py) and
+#           instrumentation swap them for separate streams / counting wrappers.
 # MATLAB's  round(rand*999)+1  (giving 1..1000) becomes
-#           int(round(np.random.rand()*999))  (giving 0..999) for 0-based
+#           int(round(_rand()*999))  (giving 0..999) for 0-based
 #           array access into 1000-element lookup arrays.
 # ---------------------------------------------------------------------------
 
+_rand = np.random.rand
+_rand_nh = np.random.rand
+
 
 def _rand_idx_1000():
     """Return a random 0-based index in [0, 999] matching MATLAB round(rand*999+1) -> 1..1000."""
-    return int(round(np.random.rand() * 999))
+    return int(round(_rand() * 999))
+
+
+def _nh_idx_1000():
+    """_rand_idx_1000 drawing from the natural-history stream."""
+    return int(round(_rand_nh() * 999))
+
+
+# Enrollment of the rectosigmoidoscopy trial special scenarios: years
+# (= ages) at randomization and the fraction of the intervention arm that
+# attends the test.
+RS_TRIAL_ENROLLMENT = {
+    'Atkin': (np.arange(55, 65), 0.71),
+    'Schoen': (np.arange(55, 75), 0.83),
+    'Segnan': (np.arange(55, 65), 0.583),
+    'Holme': (np.arange(51, 66), 0.651),
+}
+
+
+def _trial_enrollment(trial, u):
+    """
+    Randomization year and test years of a rectosigmoidoscopy trial.
+
+    u holds uniform draws, one row per patient: column 0 selects the
+    randomization year, column 1 attendance; the Schoen trial uses columns
+    2-4 for the repeat test (after 3 or 5 years).  Patients who do not attend
+    keep test year 0.
+
+    The single-trial scenarios (Atkin, Segnan, Holme) enroll the whole
+    cohort at the first patient of year 1 with u = _rand(2 * n).reshape(n, 2):
+    randomly one test year and attendance, two draws per patient in patient
+    order, the numbers a loop over the patients would draw.
+
+    Returns
+    -------
+    tuple : (included, test_year, test_year2) float arrays
+    """
+    years, attendance = RS_TRIAL_ENROLLMENT[trial]
+    included = years[np.round(u[:, 0] * (len(years) - 1)).astype(int)].astype(float)
+    attends = u[:, 1] < attendance
+    test_year = np.where(attends, included, 0.0)
+    test_year2 = np.zeros(len(u))
+    if trial == 'Schoen':
+        repeat = attends & ((u[:, 2] < 0.65) | (u[:, 3] < 0.035))
+        test_year2[repeat] = included[repeat] + np.where(u[repeat, 4] < 0.25, 3, 5)
+    return included, test_year, test_year2
 
 
 def _find_last_nonzero(arr):
@@ -128,7 +190,7 @@ def Colonoscopy(z, y, q, Modus, Gender,
                 PaymentType_Cancer_ini, PaymentType_Cancer_con,
                 PaymentType_Cancer_fin,
                 PaymentType_QCancer_ini, PaymentType_QCancer_con,
-                PaymentType_QCancer_fin,
+                PaymentType_QCancer_fin, PaymentType_CancerQuarters,
                 Money_Screening, Money_Treatment, Money_FutureTreatment,
                 Money_FollowUp, Money_Other,
                 StageVariables, Cost, Location, risc,
@@ -159,7 +221,7 @@ def Colonoscopy(z, y, q, Modus, Gender,
         p_loc = Polyp_PolypLocation[z, f]  # 1-based location
         # MATLAB: rand < StageVariables.Colo_Detection(Tumor) * Location.ColoDetection(loc)
         #         AND CurrentReachMatrix(loc) == 1
-        if (np.random.rand() < StageVariables['Colo_Detection'][int(Tumor) - 1] *
+        if (_rand() < StageVariables['Colo_Detection'][int(Tumor) - 1] *
                 Location['ColoDetection'][int(p_loc) - 1] and
                 CurrentReachMatrix[int(p_loc) - 1] == 1):
             # we delete the current polyp
@@ -202,7 +264,7 @@ def Colonoscopy(z, y, q, Modus, Gender,
         Tumor = Ca_Cancer[z, f]
         ca_loc = Ca_CancerLocation[z, f]  # 1-based
         # MATLAB: rand < StageVariables.Colo_Detection(Tumor) AND CurrentReachMatrix(loc)==1
-        if (np.random.rand() < StageVariables['Colo_Detection'][int(Tumor) - 1] and
+        if (_rand() < StageVariables['Colo_Detection'][int(Tumor) - 1] and
                 CurrentReachMatrix[int(ca_loc) - 1] == 1):
 
             if counter == 0:
@@ -273,11 +335,11 @@ def Colonoscopy(z, y, q, Modus, Gender,
         PaymentType_ColonoscopyPolyp[m - 1, yi] += 1
 
     # Complications
-    if np.random.rand() < risc['Colonoscopy_RiscPerforation'] * factor:
+    if _rand() < risc['Colonoscopy_RiscPerforation'] * factor:
         # a perforation happened
         moneyspent += Cost['Colonoscopy_Perforation']
         PaymentType_Perforation[m - 1, yi] += 1
-        if np.random.rand() < risc['DeathPerforation']:
+        if _rand() < risc['DeathPerforation']:
             # patient died during colonoscopy from a perforation
             Included[z] = False
             DeathCause[z] = 3
@@ -288,22 +350,22 @@ def Colonoscopy(z, y, q, Modus, Gender,
                      PaymentType_Cancer_ini, PaymentType_Cancer_con,
                      PaymentType_Cancer_fin,
                      PaymentType_QCancer_ini, PaymentType_QCancer_con,
-                     PaymentType_QCancer_fin,
+                     PaymentType_QCancer_fin, PaymentType_CancerQuarters,
                      Money_Treatment, Money_FutureTreatment,
                      y + (q - 1) / 4.0, z, 'oc')
-    elif np.random.rand() < risc['Colonoscopy_RiscSerosaBurn'] * factor:
+    elif _rand() < risc['Colonoscopy_RiscSerosaBurn'] * factor:
         # serosal burn
         moneyspent += Cost['Colonoscopy_Serosal_burn']
         PaymentType_Serosa[m - 1, yi] += 1
-    elif np.random.rand() < risc['Colonoscopy_RiscBleeding'] * factor:
+    elif _rand() < risc['Colonoscopy_RiscBleeding'] * factor:
         # a bleeding episode (no transfusion)
         moneyspent += Cost['Colonoscopy_bleed']
         PaymentType_Bleeding[m - 1, yi] += 1
-    elif np.random.rand() < risc['Colonoscopy_RiscBleedingTransfusion'] * factor:
+    elif _rand() < risc['Colonoscopy_RiscBleedingTransfusion'] * factor:
         # bleeding requiring transfusion
         moneyspent += Cost['Colonoscopy_bleed_transfusion']
         PaymentType_BleedingTransf[m - 1, yi] += 1
-        if np.random.rand() < risc['DeathBleedingTransfusion']:
+        if _rand() < risc['DeathBleedingTransfusion']:
             # patient died during colonoscopy from a bleeding complication
             Included[z] = False
             DeathCause[z] = 3
@@ -356,7 +418,7 @@ def RectoSigmo(z, y, Polyp_Polyps, Polyp_PolypYear, Polyp_PolypLocation,
         for f in range(l_polyp - 1, -1, -1):
             Tumor = Polyp_Polyps[z, f]
             p_loc = Polyp_PolypLocation[z, f]
-            if (np.random.rand() < StageVariables['RectoSigmo_Detection'][int(Tumor) - 1] *
+            if (_rand() < StageVariables['RectoSigmo_Detection'][int(Tumor) - 1] *
                     Location['RectoSigmoDetection'][int(p_loc) - 1] and
                     CurrentReachMatrix[int(p_loc) - 1] == 1):
                 # in this scenario we only do follow up for larger polyps
@@ -374,7 +436,7 @@ def RectoSigmo(z, y, Polyp_Polyps, Polyp_PolypYear, Polyp_PolypLocation,
         for f in range(l_polyp - 1, -1, -1):
             Tumor = Polyp_Polyps[z, f]
             p_loc = Polyp_PolypLocation[z, f]
-            if (np.random.rand() < StageVariables['RectoSigmo_Detection'][int(Tumor) - 1] *
+            if (_rand() < StageVariables['RectoSigmo_Detection'][int(Tumor) - 1] *
                     Location['RectoSigmoDetection'][int(p_loc) - 1] and
                     CurrentReachMatrix[int(p_loc) - 1] == 1):
                 if Tumor > 2:
@@ -392,7 +454,7 @@ def RectoSigmo(z, y, Polyp_Polyps, Polyp_PolypYear, Polyp_PolypLocation,
         for f in range(l_polyp - 1, -1, -1):
             Tumor = Polyp_Polyps[z, f]
             p_loc = Polyp_PolypLocation[z, f]
-            if (np.random.rand() < StageVariables['RectoSigmo_Detection'][int(Tumor) - 1] *
+            if (_rand() < StageVariables['RectoSigmo_Detection'][int(Tumor) - 1] *
                     Location['RectoSigmoDetection'][int(p_loc) - 1] and
                     CurrentReachMatrix[int(p_loc) - 1] == 1):
                 if Tumor > 2:
@@ -410,7 +472,7 @@ def RectoSigmo(z, y, Polyp_Polyps, Polyp_PolypYear, Polyp_PolypLocation,
         for f in range(l_polyp - 1, -1, -1):
             Tumor = Polyp_Polyps[z, f]
             p_loc = Polyp_PolypLocation[z, f]
-            if (np.random.rand() < StageVariables['RectoSigmo_Detection'][int(Tumor) - 1] *
+            if (_rand() < StageVariables['RectoSigmo_Detection'][int(Tumor) - 1] *
                     Location['RectoSigmoDetection'][int(p_loc) - 1] and
                     CurrentReachMatrix[int(p_loc) - 1] == 1):
                 PolypFlag = 1
@@ -425,7 +487,7 @@ def RectoSigmo(z, y, Polyp_Polyps, Polyp_PolypYear, Polyp_PolypLocation,
     for f in range(l_ca - 1, -1, -1):
         Tumor = Ca_Cancer[z, f]
         ca_loc = Ca_CancerLocation[z, f]
-        if (np.random.rand() < StageVariables['RectoSigmo_Detection'][int(Tumor) - 1] and
+        if (_rand() < StageVariables['RectoSigmo_Detection'][int(Tumor) - 1] and
                 CurrentReachMatrix[int(ca_loc) - 1] == 1):
             counter += 1
             CancerFlag = 1
@@ -438,10 +500,10 @@ def RectoSigmo(z, y, Polyp_Polyps, Polyp_PolypYear, Polyp_PolypLocation,
         PaymentType_RSPolyp[0, yi] += 1
 
     # Complications
-    if np.random.rand() < risc['Rectosigmo_Perforation']:
+    if _rand() < risc['Rectosigmo_Perforation']:
         Money_Screening[yi] += Cost['Colonoscopy_Perforation']
         PaymentType_Perforation[0, yi] += 1
-        if np.random.rand() < risc['DeathPerforation']:
+        if _rand() < risc['DeathPerforation']:
             Included[z] = False
             DeathCause[z] = 3
             DeathYear[z] = y
@@ -459,6 +521,7 @@ def AddCosts(Detected_Cancer, Detected_CancerYear, Detected_CancerLocation,
              Detected_MortTime, CostStage,
              PaymentType_Cancer_ini, PaymentType_Cancer_con, PaymentType_Cancer_fin,
              PaymentType_QCancer_ini, PaymentType_QCancer_con, PaymentType_QCancer_fin,
+             PaymentType_CancerQuarters,
              Money_Treatment, Money_FutureTreatment,
              time, z, mode):
     """
@@ -466,9 +529,13 @@ def AddCosts(Detected_Cancer, Detected_CancerYear, Detected_CancerLocation,
     z is 0-based patient index.
     time is the continuous year (e.g. 5.25).
     mode is 'oc' (other causes) or 'tu' (tumor).
+    PaymentType_CancerQuarters (3, 4, 100) counts the booked cost entries by
+    phase (initial, continuing, final), stage and year.
     """
     SubCost = np.zeros((25, 404))
     SubCostFut = np.zeros((25, 404))
+    # booked quarter per cost entry: 1 initial, 2 continuing, 3 final
+    SubPhase = np.zeros((25, 404), dtype=np.int8)
 
     Ende = time
     l = _count_nonzero(Detected_Cancer[z, :])
@@ -487,18 +554,21 @@ def AddCosts(Detected_Cancer, Detected_CancerYear, Detected_CancerLocation,
         if Difference <= 1.0 / 4:
             # first quarter costs
             SubCost[x1, start_q] = CostStage['Initial'][stage_idx]
+            SubPhase[x1, start_q] = 1
             SubCostFut[x1, start_q] = CostStage['FutInitial'][stage_idx]
             PaymentType_Cancer_ini[stage_idx, int(math.floor(Start)) - 1] += 1
             PaymentType_QCancer_ini[stage_idx, int(math.floor(Start)) - 1, 0] += 1
 
         elif Difference > 1.0 / 4 and Difference <= 1.25:
             SubCost[x1, start_q] = CostStage['Initial'][stage_idx]
+            SubPhase[x1, start_q] = 1
             SubCostFut[x1, start_q] = CostStage['FutInitial'][stage_idx]
             PaymentType_Cancer_ini[stage_idx, int(math.floor(Start)) - 1] += 1
             PaymentType_QCancer_ini[stage_idx, int(math.floor(Start)) - 1, 0] += 1
 
             if mode != 'oc':
                 SubCost[x1, start_q + 1:ende_q] = 1.0 / 4 * CostStage['Final'][stage_idx]
+                SubPhase[x1, start_q + 1:ende_q] = 3
                 SubCostFut[x1, start_q + 1:ende_q] = 1.0 / 4 * CostStage['FutFinal'][stage_idx]
                 nq = ende_q - (start_q + 1)
                 PaymentType_Cancer_fin[stage_idx, int(math.floor(Ende - 1)) - 1] += nq / 4.0
@@ -506,6 +576,7 @@ def AddCosts(Detected_Cancer, Detected_CancerYear, Detected_CancerLocation,
                     PaymentType_QCancer_fin[stage_idx, int(math.floor(Ende - 1)) - 1, Qcount] += 1
             else:
                 SubCost[x1, start_q + 1:ende_q] = 1.0 / 4 * CostStage['Cont'][stage_idx]
+                SubPhase[x1, start_q + 1:ende_q] = 2
                 SubCostFut[x1, start_q + 1:ende_q] = 1.0 / 4 * CostStage['FutCont'][stage_idx]
                 nq = ende_q - (start_q + 1)
                 PaymentType_Cancer_con[stage_idx, int(math.floor(Ende - 1)) - 1] += nq / 4.0
@@ -514,9 +585,11 @@ def AddCosts(Detected_Cancer, Detected_CancerYear, Detected_CancerLocation,
 
         elif Difference > 1.25 and Difference <= 5.0:
             SubCost[x1, start_q:start_q + 1] = CostStage['Initial'][stage_idx]
+            SubPhase[x1, start_q:start_q + 1] = 1
             SubCostFut[x1, start_q:start_q + 1] = CostStage['FutInitial'][stage_idx]
             cont_end_q = int((Ende - 1) * 4)
             SubCost[x1, start_q + 1:cont_end_q] = 1.0 / 4 * CostStage['Cont'][stage_idx]
+            SubPhase[x1, start_q + 1:cont_end_q] = 2
             SubCostFut[x1, start_q + 1:cont_end_q] = 1.0 / 4 * CostStage['FutCont'][stage_idx]
             PaymentType_Cancer_ini[stage_idx, int(math.floor(Start)) - 1] += 1
             PaymentType_QCancer_ini[stage_idx, int(math.floor(Start)) - 1, 0] += 1
@@ -540,12 +613,14 @@ def AddCosts(Detected_Cancer, Detected_CancerYear, Detected_CancerLocation,
 
             if mode != 'oc':
                 SubCost[x1, cont_end_q:ende_q] = 1.0 / 4 * CostStage['Final'][stage_idx]
+                SubPhase[x1, cont_end_q:ende_q] = 3
                 SubCostFut[x1, cont_end_q:ende_q] = 1.0 / 4 * CostStage['FutFinal'][stage_idx]
                 PaymentType_Cancer_fin[stage_idx, int(math.floor(Ende)) - 2] += 1
                 for Qcount in range(4):
                     PaymentType_QCancer_fin[stage_idx, int(math.floor(Ende - 1)) - 1, Qcount] += 1
             else:
                 SubCost[x1, cont_end_q:ende_q] = 1.0 / 4 * CostStage['Cont'][stage_idx]
+                SubPhase[x1, cont_end_q:ende_q] = 2
                 SubCostFut[x1, cont_end_q:ende_q] = 1.0 / 4 * CostStage['FutCont'][stage_idx]
                 PaymentType_Cancer_con[stage_idx, int(math.floor(Ende)) - 2] += 1
                 for Qcount in range(4):
@@ -554,8 +629,10 @@ def AddCosts(Detected_Cancer, Detected_CancerYear, Detected_CancerLocation,
 
         elif Difference > 5:
             SubCost[x1, start_q:start_q + 1] = CostStage['Initial'][stage_idx]
+            SubPhase[x1, start_q:start_q + 1] = 1
             SubCostFut[x1, start_q:start_q + 1] = CostStage['FutInitial'][stage_idx]
             SubCost[x1, start_q + 1:ende_q] = 1.0 / 4 * CostStage['Cont'][stage_idx]
+            SubPhase[x1, start_q + 1:ende_q] = 2
             SubCostFut[x1, start_q + 1:ende_q] = 1.0 / 4 * CostStage['FutCont'][stage_idx]
             PaymentType_Cancer_ini[stage_idx, int(math.floor(Start)) - 1] += 1
             PaymentType_QCancer_ini[stage_idx, int(math.floor(Start)) - 1, 0] += 1
@@ -569,6 +646,12 @@ def AddCosts(Detected_Cancer, Detected_CancerYear, Detected_CancerLocation,
             for Qcount in range(3):
                 PaymentType_QCancer_con[stage_idx, int(math.floor(Start)) + con_y_val, Qcount] += 1
 
+    # entries per phase, stage and year, for re-costing (see recost.py)
+    for x1 in range(l):
+        cols = np.flatnonzero(SubPhase[x1, :400])
+        np.add.at(PaymentType_CancerQuarters[:, int(Detected_Cancer[z, x1]) - 7, :],
+                  (SubPhase[x1, cols] - 1, cols // 4), 1)
+
     SubCostAll = np.sum(SubCost, axis=0)
     SubCostAllFut = np.sum(SubCostFut, axis=0)
     Counter = 0
@@ -583,17 +666,191 @@ def AddCosts(Detected_Cancer, Detected_CancerYear, Detected_CancerLocation,
 #  MAIN FUNCTION: NumberCrunching_100000
 # ===================================================================
 
+# Engine state written to / restored from checkpoints (see checkpoint.py).
+# All arrays are updated in place during the run, so restoring them in place
+# resumes the simulation exactly where it stopped.
+CHECKPOINT_ARRAYS = (
+    'Included', 'Alive', 'DeathCause', 'DeathYear', 'NaturalDeathYear',
+    'DirectCancer', 'DirectCancerR', 'DirectCancer2', 'DirectCancer2R',
+    'ProgressedCancer', 'ProgressedCancerR', 'TumorRecord_Stage',
+    'TumorRecord_Location', 'TumorRecord_Sojourn', 'TumorRecord_DwellTime',
+    'TumorRecord_Gender', 'TumorRecord_Detection',
+    'TumorRecord_PatientNumber', 'DwellTimeProgression',
+    'DwellTimeFastCancer', 'Last_Colonoscopy', 'Last_Polyp',
+    'Last_AdvPolyp', 'Last_Cancer', 'Last_ScreenTest', 'Last_Included',
+    'Last_TestDone', 'Last_TestYear', 'Last_TestYear2', 'Polyp_Polyps',
+    'Polyp_PolypYear', 'Polyp_PolypLocation', 'Polyp_AdvProgression',
+    'Polyp_EarlyProgression', 'Ca_Cancer', 'Ca_CancerYear',
+    'Ca_CancerLocation', 'Ca_TimeStage_I', 'Ca_TimeStage_II',
+    'Ca_TimeStage_III', 'Ca_SympTime', 'Ca_SympStage', 'Ca_DwellTime',
+    'Detected_Cancer', 'Detected_CancerYear', 'Detected_CancerLocation',
+    'Detected_MortTime', 'HasCancer', 'NumPolyps', 'MaxPolyps', 'AllPolyps',
+    'DiagnosedCancer', 'NumCancer', 'MaxCancer', 'Money_AllCost',
+    'Money_AllCostFuture', 'Money_Treatment', 'Money_FutureTreatment',
+    'Money_Screening', 'Money_FollowUp', 'Money_Other',
+    'Number_Screening_Colonoscopy', 'Number_Symptoms_Colonoscopy',
+    'Number_Follow_Up_Colonoscopy', 'Number_Baseline_Colonoscopy',
+    'Number_RectoSigmo', 'Number_FOBT', 'Number_I_FOBT', 'Number_Sept9',
+    'Number_other', 'EarlyPolypsRemoved', 'AdvancedPolypsRemoved',
+    'YearIncluded', 'YearAlive', 'PaymentType_FOBT', 'PaymentType_I_FOBT',
+    'PaymentType_Sept9_HighSens', 'PaymentType_Sept9_HighSpec',
+    'PaymentType_RS', 'PaymentType_RSPolyp', 'PaymentType_Colonoscopy',
+    'PaymentType_ColonoscopyPolyp', 'PaymentType_Colonoscopy_Cancer',
+    'PaymentType_Perforation', 'PaymentType_Serosa', 'PaymentType_Bleeding',
+    'PaymentType_BleedingTransf', 'PaymentType_Cancer_ini',
+    'PaymentType_Cancer_con', 'PaymentType_Cancer_fin',
+    'PaymentType_QCancer_ini', 'PaymentType_QCancer_con',
+    'PaymentType_QCancer_fin', 'PaymentType_CancerQuarters', 'PaymentType_Other',
+    'CaSurv', 'CaDeath',
+)
+# randomized inputs (drawn by calculate_sub) which must match on resume
+CHECKPOINT_INPUTS = ('Gender', 'IndividualRisk', 'MortalityMatrix', 'ScreeningPreference')
+CHECKPOINT_SCALARS = ('AusschlussPolyp', 'AusschlussCa', 'AusschlussKolo',
+                      'PosPolyp', 'PosCa', 'PosPolypCa')
+
+# Inputs that shape the natural history up to a given year.  Year-indexed
+# inputs map to the axis of the simulated year and are only compared up to
+# the checkpoint year; policy inputs (flags, screening) are not included.
+NATURAL_HISTORY_INPUTS = {
+    'p': None, 'StageVariables': None, 'Location': None, 'Cost': None,
+    'CostStage': None, 'risc': None, 'female': None, 'AgeProgression': 1,
+    'NewPolyp': 0, 'ColonoscopyLikelyhood': None, 'IndividualRisk': None,
+    'RiskDistribution': None, 'Gender': None, 'LifeTable': 0,
+    'MortalityMatrix': 1, 'LocationMatrix_in': None, 'StageDuration': None,
+    'tx1': None, 'DirectCancerRate': 1, 'DirectCancerSpeed': None,
+    'DwellSpeed': None,
+}
+
+
+def _patient_year_matrix(n, streamed, dtype=float):
+    """
+    Zero (100, n) matrix.  If `streamed`, a view with all 100 rows on one
+    (n,) row, so [yi, z] indexing works unchanged but only the current year
+    is held in memory.
+    """
+    if not streamed:
+        return np.zeros((100, n), dtype=dtype)
+    row = np.zeros(n, dtype=dtype)
+    return np.lib.stride_tricks.as_strided(row, shape=(100, n),
+                                           strides=(0, row.strides[0]))
+
+
+def natural_history_fingerprint(year, inputs):
+    """
+    Digest of the engine inputs that determine the simulation up to and
+    including `year` (inputs: dict of engine argument name -> value).
+    Two runs with equal fingerprints reach the same state after `year`
+    when they start from the same random generator state.
+    """
+    values = {}
+    for name, axis in NATURAL_HISTORY_INPUTS.items():
+        value = inputs[name]
+        if axis is not None:
+            value = np.asarray(value)
+            value = np.take(value, np.arange(min(year, value.shape[axis])), axis=axis)
+        values[name] = value
+    return inputs_fingerprint(values)
+
+
+def _instrumented(engine):
+    """
+    Attach the optional CommonRandomNumbers (keyword 'common_random_numbers')
+    and EngineInstrumentation (keyword 'instrumentation') for the duration
+    of an engine run, so the draw functions and counting wrappers they
+    install are removed again even if the run raises (e.g. on cancellation).
+    A metrics log given as a file name (keyword 'metrics_log') is opened
+    here and closed the same way; a YearMetricsLog is left to its owner.
+    """
+    @functools.wraps(engine)
+    def wrapper(*args, **kwargs):
+        hooks = [kwargs[k] for k in ('common_random_numbers', 'instrumentation')
+                 if kwargs.get(k) is not None]
+        log = kwargs.get('metrics_log')
+        owned_log = None
+        if log is not None and not isinstance(log, YearMetricsLog):
+            owned_log = kwargs['metrics_log'] = YearMetricsLog(log)
+        if not hooks and owned_log is None:
+            return engine(*args, **kwargs)
+        attached = []
+        try:
+            for hook in hooks:
+                hook.attach(globals())
+                attached.append(hook)
+            return engine(*args, **kwargs)
+        finally:
+            for hook in reversed(attached):
+                hook.detach(globals())
+            if owned_log is not None:
+                owned_log.close()
+    return wrapper
+
+
+@_instrumented
 def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
                            flag, SpecialText, female, Sensitivity,
                            ScreeningTest, ScreeningPreference, AgeProgression,
                            NewPolyp, ColonoscopyLikelyhood, IndividualRisk,
                            RiskDistribution, Gender, LifeTable, MortalityMatrix,
                            LocationMatrix_in, StageDuration, tx1,
-                           DirectCancerRate, DirectCancerSpeed, DwellSpeed):
+                           DirectCancerRate, DirectCancerSpeed, DwellSpeed,
+                           progress_callback=None, cancel_token=None,
+                           progress_every=0, instrumentation=None,
+                           metrics_log=None, checkpoint_path=None,
+                           checkpoint_every=0, resume_from=None,
+                           resume_keep_preference=False, stop_after_year=None,
+                           warm_start=False, common_random_numbers=None,
+                           trial_design=None, scenarios=None, year_summary=None):
     """
     Main simulation function.
     All input arrays use the same conventions as the MATLAB caller.
     Returns a tuple of all output variables matching the MATLAB signature.
+
+    Optional keyword arguments (not part of the MATLAB signature):
+        progress_callback : callable, invoked with a progress dict after each
+                            simulated year (see run_control.ProgressReporter)
+        cancel_token      : run_control.CancellationToken; when cancelled the
+                            engine raises run_control.SimulationCancelled
+        progress_every    : also report/check every N patients within a year
+        instrumentation   : instrumentation.EngineInstrumentation; collects
+                            per-phase timings and per-year event counts
+        metrics_log       : file name or metrics_log.YearMetricsLog; one
+                            record of cohort metrics is appended per year
+        checkpoint_path   : directory for checkpoints (see checkpoint.py)
+        checkpoint_every  : write a checkpoint every K completed years
+                            (0 = never)
+        resume_from       : checkpoint directory; the run continues after
+                            the checkpointed year with the saved state,
+                            randomized inputs and RNG state, and gives the
+                            same results as an uninterrupted run
+        resume_keep_preference : use this call's ScreeningPreference instead
+                            of the checkpointed one (branching off a
+                            snapshot into another screening strategy)
+        stop_after_year   : end the simulation after this year; a checkpoint
+                            of that year is written if checkpoint_path is set
+        warm_start        : resume_from is a stored population state (see
+                            warmstart.py); this call's randomized inputs are
+                            kept and only have to agree with the state up to
+                            its year
+        common_random_numbers : crn.CommonRandomNumbers; natural-history and
+                            intervention draws come from separate streams
+                            positioned per patient-year (see crn.py)
+        trial_design      : rct.TrialDesign; the cohort is a stack of trial
+                            arms, each patient z runs the special scenario
+                            trial_design.flags[trial_design.arm[z]] and is
+                            enrolled as given by the design (see rct.py)
+        scenarios         : scenarios.ScenarioTable (prepared); the cohort is
+                            a stack of scenario blocks, each simulated with
+                            its own parameters and with its per-year totals
+                            recorded separately (see scenarios.py)
+        year_summary      : year_summary.YearSummary; the counts Evaluation
+                            needs are collected per year and the (100, n)
+                            matrices (HasCancer, ..., YearAlive) are not
+                            kept: only the current year is held and None is
+                            returned for them (see year_summary.py)
+
+    On resume the natural-history inputs up to the checkpoint year are
+    compared with the ones the checkpoint was written with (see
+    natural_history_fingerprint); a mismatch raises ValueError.
     """
 
     # to do:
@@ -668,14 +925,16 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
     Detected_CancerLocation = np.zeros((n, 50))
     Detected_MortTime = np.zeros((n, 50))
 
-    HasCancer = np.zeros((100, n))
-    NumPolyps = np.zeros((100, n))
-    MaxPolyps = np.zeros((100, n))
+    # (year, patient) matrices; with year_summary one row for all years
+    Streamed = year_summary is not None
+    HasCancer = _patient_year_matrix(n, Streamed)
+    NumPolyps = _patient_year_matrix(n, Streamed)
+    MaxPolyps = _patient_year_matrix(n, Streamed)
     AllPolyps = np.zeros((6, 100))
 
-    DiagnosedCancer = np.zeros((100, n))
-    NumCancer = np.zeros((100, n))
-    MaxCancer = np.zeros((100, n))
+    DiagnosedCancer = _patient_year_matrix(n, Streamed)
+    NumCancer = _patient_year_matrix(n, Streamed)
+    MaxCancer = _patient_year_matrix(n, Streamed)
 
     Money_AllCost = np.zeros(100)
     Money_AllCostFuture = np.zeros(100)
@@ -698,8 +957,8 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
     EarlyPolypsRemoved = np.zeros(100)
     AdvancedPolypsRemoved = np.zeros(100)
 
-    YearIncluded = np.zeros((100, n), dtype=bool)
-    YearAlive = np.zeros((100, n), dtype=bool)
+    YearIncluded = _patient_year_matrix(n, Streamed, dtype=bool)
+    YearAlive = _patient_year_matrix(n, Streamed, dtype=bool)
 
     # Payment types
     PaymentType_FOBT = np.zeros((1, 100))
@@ -721,6 +980,7 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
     PaymentType_QCancer_ini = np.zeros((4, 101, 4))
     PaymentType_QCancer_con = np.zeros((4, 101, 20))
     PaymentType_QCancer_fin = np.zeros((4, 101, 4))
+    PaymentType_CancerQuarters = np.zeros((3, 4, 100))
     PaymentType_Other = np.zeros((1, 100))
 
     # matrix for fast indexing
@@ -797,13 +1057,137 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
     # Make a mutable copy of ScreeningPreference
     ScreeningPreference = ScreeningPreference.copy()
 
+    # progress reporting / cancellation (no-op unless requested)
+    if progress_callback is not None or cancel_token is not None:
+        Reporter = ProgressReporter(progress_callback, n, progress_every, cancel_token)
+    else:
+        Reporter = None
+
+    # per-phase timing and event counts (no-op unless requested)
+    Instr = instrumentation
+
+    # common random numbers (no-op unless requested)
+    Crn = common_random_numbers
+    CrnSeed = None if Crn is None else Crn.seed
+
+    # stacked rectosigmoidoscopy trial arms (rct.py); enrollment is given
+    if trial_design is not None:
+        TrialArm = trial_design.arm
+        TrialFlags = trial_design.flags
+        Last_Included[:] = trial_design.included
+        Last_TestYear[:] = trial_design.test_year
+        Last_TestYear2[:] = trial_design.test_year2
+    else:
+        TrialArm = None
+
+    # streamed per-year summaries (year_summary.py)
+    if Streamed:
+        if scenarios is not None:
+            raise ValueError('scenario runs cannot stream year summaries')
+        if checkpoint_path is not None or resume_from is not None:
+            raise ValueError('runs with streamed year summaries cannot be checkpointed')
+        year_summary.start(Gender)
+
+    # stacked parameter scenarios (scenarios.py)
+    Scen = scenarios
+    if Scen is not None:
+        if resume_from is not None:
+            raise ValueError('scenario runs cannot be resumed from a checkpoint')
+        Scen.start(locals())
+
+    # streaming per-year metrics (no-op unless requested; a file name is
+    # opened and closed by _instrumented)
+    MetricsLog = metrics_log
+    DeathsLogged = np.zeros(4, dtype=np.int64)
+
+    def _log_year_metrics(year_seconds):
+        deaths = np.bincount(DeathCause.astype(int), minlength=4)
+        new_deaths = deaths - DeathsLogged
+        DeathsLogged[:] = deaths[:4]
+        stages = np.bincount(MaxPolyps[yi, Included].astype(int), minlength=7)
+        record = {'year': y,
+                  'included': int(np.count_nonzero(Included)),
+                  'alive': int(np.count_nonzero(Alive))}
+        for ff in range(1, 7):
+            record['polyp_stage_{}'.format(ff)] = int(stages[ff])
+        record.update({
+            'cancers_direct': int(DirectCancer2[yi]),
+            'cancers_progressed': int(ProgressedCancer[yi]),
+            'cancers_fast': int(np.sum(DirectCancer[:, yi])),
+            'deaths_natural': int(new_deaths[1]),
+            'deaths_cancer': int(new_deaths[2]),
+            'deaths_colonoscopy': int(new_deaths[3]),
+            'colo_screening': int(Number_Screening_Colonoscopy[yi]),
+            'colo_symptoms': int(Number_Symptoms_Colonoscopy[yi]),
+            'colo_follow_up': int(Number_Follow_Up_Colonoscopy[yi]),
+            'colo_baseline': int(Number_Baseline_Colonoscopy[yi]),
+            'rectosigmo': int(Number_RectoSigmo[yi]),
+            'money_treatment': float(np.sum(Money_Treatment)),
+            'money_future_treatment': float(np.sum(Money_FutureTreatment)),
+            'money_screening': float(np.sum(Money_Screening)),
+            'money_follow_up': float(np.sum(Money_FollowUp)),
+            'money_other': float(np.sum(Money_Other)),
+            'wall_seconds': year_seconds,
+        })
+        MetricsLog.write(record)
+
+    def _report_progress(patients_done):
+        Reporter.report(
+            y, patients_done, np.count_nonzero(Included),
+            np.sum(DirectCancer) + np.sum(DirectCancer2) + np.sum(ProgressedCancer),
+            np.sum(Number_Screening_Colonoscopy) + np.sum(Number_Symptoms_Colonoscopy) +
+            np.sum(Number_Follow_Up_Colonoscopy) + np.sum(Number_Baseline_Colonoscopy))
+
     # ===================================================================
     #  MAIN SIMULATION LOOP
     # ===================================================================
     y = 0  # year counter; incremented at start of loop to become 1-based
+
+    if resume_from is not None:
+        Resume = load_checkpoint(resume_from)
+        if Resume.n != n:
+            raise ValueError('checkpoint {} holds {} patients, this run has {}'.format(
+                resume_from, Resume.n, n))
+        if not warm_start:
+            Gender = np.array(Resume.arrays['Gender'])
+            IndividualRisk = np.array(Resume.arrays['IndividualRisk'])
+            MortalityMatrix = np.array(Resume.arrays['MortalityMatrix'])
+        if not (resume_keep_preference or warm_start):
+            ScreeningPreference = np.array(Resume.arrays['ScreeningPreference'])
+        EngineState = locals()
+        expected = Resume.meta.get('natural_history')
+        if expected is not None and expected != natural_history_fingerprint(Resume.year, EngineState):
+            raise ValueError('checkpoint {} was written with different natural-history '
+                             'inputs for years 1-{}'.format(resume_from, Resume.year))
+        if Resume.meta.get('crn_seed') != CrnSeed:
+            raise ValueError('checkpoint {} was written with common random numbers seed {}, '
+                             'this run uses {}'.format(resume_from, Resume.meta.get('crn_seed'), CrnSeed))
+        for name in CHECKPOINT_ARRAYS:
+            EngineState[name][...] = Resume.arrays[name]
+        del EngineState
+        AusschlussPolyp = Resume.scalars['AusschlussPolyp']
+        AusschlussCa = Resume.scalars['AusschlussCa']
+        AusschlussKolo = Resume.scalars['AusschlussKolo']
+        PosPolyp = Resume.scalars['PosPolyp']
+        PosCa = Resume.scalars['PosCa']
+        PosPolypCa = Resume.scalars['PosPolypCa']
+        DeathsLogged[:] = np.bincount(DeathCause.astype(int), minlength=4)[:4]
+        np.random.set_state(Resume.rng_state)
+        y = Resume.year
+        print('Resuming from {} after year {}'.format(resume_from, y))
     while np.sum(Included) > 0 and y < 100:
         y += 1
         yi = y - 1  # 0-based year index for arrays
+        if Streamed:
+            # the shared row starts the year empty, as a new row would
+            # (HasCancer stays set for all following years)
+            for Matrix in (NumPolyps, MaxPolyps, DiagnosedCancer, NumCancer, MaxCancer):
+                Matrix[yi] = 0
+
+        if Instr is not None:
+            Instr.begin_year(y)
+        if MetricsLog is not None:
+            YearStart = perf_counter()
 
         # for speed we make this calculation in advance
         PolypRate = np.ones(n)
@@ -811,10 +1195,23 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
         PolypRate = PolypRate * IndividualRisk
         # the age specific risk
         PolypRate = PolypRate * NewPolyp[yi]
+        if Scen is not None and Scen.new_polyp_scale is not None:
+            PolypRate = PolypRate * Scen.new_polyp_scale
         # the gender specific risk
         PolypRate[Gender == 2] = PolypRate[Gender == 2] * female['new_polyp_female']
 
+        if Instr is not None:
+            Instr.lap('year_setup')
+
         for z in range(n):  # z is 0-based (MATLAB z=1:n)
+            if Crn is not None:
+                Crn.start_patient(y, z)
+            if TrialArm is not None:
+                flag = TrialFlags[TrialArm[z]]
+            if Scen is not None and z % Scen.size == 0:
+                Scen.switch(yi, z // Scen.size)
+                StageVariables = Scen.stage_variables[z // Scen.size]
+                DirectCancerSpeed = Scen.direct_cancer_speed[z // Scen.size]
             for q in range(1, 5):  # q = 1,2,3,4
                 time = y + (q - 1) / 4.0
 
@@ -824,7 +1221,7 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
                 if Alive[z]:
                     # divided by 4 since this is a quarterly calculation
                     # MATLAB: LifeTable(y, Gender(z))  -- y and Gender are 1-based
-                    if np.random.rand() < (LifeTable[yi, int(Gender[z]) - 1] / 4.0):
+                    if _rand_nh() < (LifeTable[yi, int(Gender[z]) - 1] / 4.0):
                         Alive[z] = False
                         NaturalDeathYear[z] = time
 
@@ -842,10 +1239,13 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
                                          PaymentType_Cancer_ini, PaymentType_Cancer_con,
                                          PaymentType_Cancer_fin,
                                          PaymentType_QCancer_ini, PaymentType_QCancer_con,
-                                         PaymentType_QCancer_fin,
+                                         PaymentType_QCancer_fin, PaymentType_CancerQuarters,
                                          Money_Treatment, Money_FutureTreatment,
                                          time, z, 'oc')
 
+                if Instr is not None:
+                    Instr.lap('natural_death')
+
                 #%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
                 #    people die of cancer           %
                 #%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
@@ -869,7 +1269,7 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
                                              PaymentType_Cancer_ini, PaymentType_Cancer_con,
                                              PaymentType_Cancer_fin,
                                              PaymentType_QCancer_ini, PaymentType_QCancer_con,
-                                             PaymentType_QCancer_fin,
+                                             PaymentType_QCancer_fin, PaymentType_CancerQuarters,
                                              Money_Treatment, Money_FutureTreatment,
                                              time, z, 'tu')
                                     # MATLAB: CaDeath(Detected.Cancer(z,f)-6)
@@ -878,12 +1278,15 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
                             elif (time - Detected_CancerYear[z, f]) == 21.0 / 4:
                                 CaSurv[int(Detected_Cancer[z, f]) - 7] += 1
 
+                if Instr is not None:
+                    Instr.lap('cancer_death')
+
                 #%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
                 # a NEW POLYP appears               %
                 #%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
                 if Included[z]:
                     # a new polyp appears
-                    if np.random.rand() < PolypRate[z]:
+                    if _rand_nh() < PolypRate[z]:
                         if Polyp_Polyps[z, 0] > 0:
                             pos = _find_last_nonzero(Polyp_Polyps[z, :]) + 1
                         else:
@@ -892,34 +1295,37 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
                             Polyp_Polyps[z, pos] = 1
                             Polyp_PolypYear[z, pos] = time
                             # MATLAB: LocationMatrix(1, round(rand*999)+1) -- row 1 in MATLAB = row 0 in Python
-                            Polyp_PolypLocation[z, pos] = LocationMatrix[0, _rand_idx_1000()]
+                            Polyp_PolypLocation[z, pos] = LocationMatrix[0, _nh_idx_1000()]
 
                             # we just save the percentile of the risk
-                            Polyp_EarlyProgression[z, pos] = int(round(np.random.rand() * 499)) + 1
+                            Polyp_EarlyProgression[z, pos] = int(round(_rand_nh() * 499)) + 1
 
                             # if correlation applies, both percentiles are identical
                             if flag.get('Correlation', False):
                                 Polyp_AdvProgression[z, pos] = Polyp_EarlyProgression[z, pos]
                             else:
-                                Polyp_AdvProgression[z, pos] = int(round(np.random.rand() * 499)) + 1
+                                Polyp_AdvProgression[z, pos] = int(round(_rand_nh() * 499)) + 1
+
+                    if Instr is not None:
+                        Instr.lap('polyp_onset')
 
                     #%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
                     # a NEW Cancer appears DIRECTLY     %
                     #%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
                     # MATLAB: DirectCancerRate(Gender(z), y)  -- both 1-based
-                    if np.random.rand() < DirectCancerRate[int(Gender[z]) - 1, yi] * DirectCancerSpeed:
+                    if _rand_nh() < DirectCancerRate[int(Gender[z]) - 1, yi] * DirectCancerSpeed:
                         l2 = _count_nonzero(Ca_Cancer[z, :])
                         if l2 < 25:
                             Ca_Cancer[z, l2] = 7
                             Ca_CancerYear[z, l2] = time
                             # MATLAB: LocationMatrix(2, round(rand*999)+1) -- row 2 in MATLAB = row 1 in Python
-                            Ca_CancerLocation[z, l2] = LocationMatrix[1, _rand_idx_1000()]
+                            Ca_CancerLocation[z, l2] = LocationMatrix[1, _nh_idx_1000()]
                             Ca_DwellTime[z, l2] = 0
 
                             # a random number for stage and sojourn time
-                            tmp1 = int(StageMatrix[_rand_idx_1000()])
+                            tmp1 = int(StageMatrix[_nh_idx_1000()])
                             # MATLAB: SojournMatrix(round(rand*999+1), tmp1-6)
-                            tmp2 = SojournMatrix[_rand_idx_1000(), tmp1 - 7]
+                            tmp2 = SojournMatrix[_nh_idx_1000(), tmp1 - 7]
 
                             Ca_SympTime[z, l2] = time + tmp2
                             Ca_SympStage[z, l2] = tmp1
@@ -956,6 +1362,9 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
                                     'gender': int(Gender[z]),
                                 })
 
+                    if Instr is not None:
+                        Instr.lap('direct_cancer')
+
                     #%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
                     #      a polyp progresses           %
                     #%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
@@ -973,7 +1382,7 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
                                GenderProgression[polyp_stage - 1, int(Gender[z]) - 1] *
                                risk_mult)
 
-                        if np.random.rand() < tmp:
+                        if _rand_nh() < tmp:
                             Polyp_Polyps[z, f] += 1
                             if Polyp_Polyps[z, f] > 6:
                                 # this is cancer now
@@ -983,8 +1392,8 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
                                 Ca_CancerLocation[z, l2] = Polyp_PolypLocation[z, f]
                                 Ca_DwellTime[z, l2] = time - Polyp_PolypYear[z, f]
 
-                                tmp1 = int(StageMatrix[_rand_idx_1000()])
-                                tmp2 = SojournMatrix[_rand_idx_1000(), tmp1 - 7]
+                                tmp1 = int(StageMatrix[_nh_idx_1000()])
+                                tmp2 = SojournMatrix[_nh_idx_1000(), tmp1 - 7]
 
                                 Ca_SympTime[z, l2] = time + tmp2
                                 Ca_SympStage[z, l2] = tmp1
@@ -1025,7 +1434,7 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
                                                   Polyp_PolypLocation, Polyp_EarlyProgression,
                                                   Polyp_AdvProgression, z, f, l_now - 1)
 
-                        elif np.random.rand() < (
+                        elif _rand_nh() < (
                             (DwellSpeed == 'Slow') * (
                                 StageVariables['FastCancer'][polyp_stage - 1] *
                                 AgeProgression[5, yi] *
@@ -1046,8 +1455,8 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
                             Ca_CancerLocation[z, l2] = Polyp_PolypLocation[z, f]
                             Ca_DwellTime[z, l2] = time - Polyp_PolypYear[z, f]
 
-                            tmp1 = int(StageMatrix[_rand_idx_1000()])
-                            tmp2 = SojournMatrix[_rand_idx_1000(), tmp1 - 7]
+                            tmp1 = int(StageMatrix[_nh_idx_1000()])
+                            tmp2 = SojournMatrix[_nh_idx_1000(), tmp1 - 7]
 
                             Ca_SympTime[z, l2] = time + tmp2
                             Ca_SympStage[z, l2] = tmp1
@@ -1089,6 +1498,9 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
                                               Polyp_PolypLocation, Polyp_EarlyProgression,
                                               Polyp_AdvProgression, z, f, l_now - 1)
 
+                    if Instr is not None:
+                        Instr.lap('polyp_progression')
+
                     #%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
                     #   a polyp shrinks or disappears      %
                     #%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
@@ -1100,7 +1512,7 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
                     l_poly = _count_nonzero(Polyp_Polyps[z, :])  # recalculate
                     for f in range(l_poly - 1, -1, -1):
                         polyp_stage = int(Polyp_Polyps[z, f])
-                        if np.random.rand() < StageVariables['Healing'][polyp_stage - 1]:
+                        if _rand_nh() < StageVariables['Healing'][polyp_stage - 1]:
                             Polyp_Polyps[z, f] -= 1
                             if Polyp_Polyps[z, f] == 0:
                                 # polyp disappears — shift using l_poly (the count
@@ -1110,6 +1522,9 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
                                                   Polyp_AdvProgression, z, f, l_poly - 1)
                                 l_poly -= 1
 
+                    if Instr is not None:
+                        Instr.lap('polyp_healing')
+
                     #%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
                     # symptom development               %
                     #%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
@@ -1139,13 +1554,16 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
                                         PaymentType_Cancer_ini, PaymentType_Cancer_con,
                                         PaymentType_Cancer_fin,
                                         PaymentType_QCancer_ini, PaymentType_QCancer_con,
-                                        PaymentType_QCancer_fin,
+                                        PaymentType_QCancer_fin, PaymentType_CancerQuarters,
                                         Money_Screening, Money_Treatment, Money_FutureTreatment,
                                         Money_FollowUp, Money_Other,
                                         StageVariables, Cost, Location, risc,
                                         ColoReachMatrix, MortalityMatrix, CostStage)
                             break
 
+                    if Instr is not None:
+                        Instr.lap('symptoms')
+
                     #%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
                     # Cancer Progression                %
                     #%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
@@ -1161,6 +1579,9 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
                             if time >= Ca_TimeStage_III[z, f]:
                                 Ca_Cancer[z, f] = 10
 
+                    if Instr is not None:
+                        Instr.lap('cancer_progression')
+
                     #%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
                     #    baseline colonoscopy           %
                     #%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
@@ -1218,12 +1639,15 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
                                         PaymentType_Cancer_ini, PaymentType_Cancer_con,
                                         PaymentType_Cancer_fin,
                                         PaymentType_QCancer_ini, PaymentType_QCancer_con,
-                                        PaymentType_QCancer_fin,
+                                        PaymentType_QCancer_fin, PaymentType_CancerQuarters,
                                         Money_Screening, Money_Treatment, Money_FutureTreatment,
                                         Money_FollowUp, Money_Other,
                                         StageVariables, Cost, Location, risc,
                                         ColoReachMatrix, MortalityMatrix, CostStage)
 
+                        if Instr is not None:
+                            Instr.lap('surveillance')
+
                         # perhaps we do screening?
                         if flag.get('Screening', False):
                             # we only screen patients who are alive
@@ -1260,7 +1684,7 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
                                                     PaymentType_Cancer_ini, PaymentType_Cancer_con,
                                                     PaymentType_Cancer_fin,
                                                     PaymentType_QCancer_ini, PaymentType_QCancer_con,
-                                                    PaymentType_QCancer_fin,
+                                                    PaymentType_QCancer_fin, PaymentType_CancerQuarters,
                                                     Money_Screening, Money_Treatment, Money_FutureTreatment,
                                                     Money_FollowUp, Money_Other,
                                                     StageVariables, Cost, Location, risc,
@@ -1268,7 +1692,7 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
 
                                         elif preference == 2:  # Rectosigmoidoscopy
                                             if y - Last_ScreenTest[z] >= ScreeningTest[pi, 5]:
-                                                if np.random.rand() < ScreeningTest[pi, 1]:
+                                                if _rand() < ScreeningTest[pi, 1]:
                                                     Number_RectoSigmo[yi] += 1
                                                     Last_ScreenTest[z] = y
                                                     PolypFlag, AdvPolypFlag, CancerFlag = RectoSigmo(
@@ -1281,7 +1705,7 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
                                                         StageVariables, Cost, Location, risc,
                                                         RectoSigmoReachMatrix, flag)
                                                     if PolypFlag or CancerFlag or AdvPolypFlag:
-                                                        if np.random.rand() < ScreeningTest[pi, 2]:
+                                                        if _rand() < ScreeningTest[pi, 2]:
                                                             Number_Screening_Colonoscopy[yi] += 1
                                                             ScreeningPreference[z] = 1
                                                             Colonoscopy(z, y, q, 'Scre', Gender,
@@ -1305,7 +1729,7 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
                                                                 PaymentType_Cancer_ini, PaymentType_Cancer_con,
                                                                 PaymentType_Cancer_fin,
                                                                 PaymentType_QCancer_ini, PaymentType_QCancer_con,
-                                                                PaymentType_QCancer_fin,
+                                                                PaymentType_QCancer_fin, PaymentType_CancerQuarters,
                                                                 Money_Screening, Money_Treatment, Money_FutureTreatment,
                                                                 Money_FollowUp, Money_Other,
                                                                 StageVariables, Cost, Location, risc,
@@ -1313,7 +1737,7 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
 
                                         else:  # other test (FOBT, I_FOBT, Sept9, etc.)
                                             if y - Last_ScreenTest[z] >= ScreeningTest[pi, 5]:
-                                                if np.random.rand() < ScreeningTest[pi, 1]:
+                                                if _rand() < ScreeningTest[pi, 1]:
                                                     Last_ScreenTest[z] = y
                                                     Limit = 0
                                                     last_polyp_idx = _find_last_nonzero(Polyp_Polyps[z, :])
@@ -1326,8 +1750,8 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
                                                         max_c = int(np.max(Ca_Cancer[z, :]))
                                                         Limit = Sensitivity[pi, max_c - 1]
                                                     Limit = max(Limit, 1 - ScreeningTest[pi, 7])
-                                                    if np.random.rand() < Limit:
-                                                        if np.random.rand() < ScreeningTest[pi, 2]:
+                                                    if _rand() < Limit:
+                                                        if _rand() < ScreeningTest[pi, 2]:
                                                             Number_Screening_Colonoscopy[yi] += 1
                                                             ScreeningPreference[z] = 1
                                                             Colonoscopy(z, y, q, 'Scre', Gender,
@@ -1351,7 +1775,7 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
                                                                 PaymentType_Cancer_ini, PaymentType_Cancer_con,
                                                                 PaymentType_Cancer_fin,
                                                                 PaymentType_QCancer_ini, PaymentType_QCancer_con,
-                                                                PaymentType_QCancer_fin,
+                                                                PaymentType_QCancer_fin, PaymentType_CancerQuarters,
                                                                 Money_Screening, Money_Treatment, Money_FutureTreatment,
                                                                 Money_FollowUp, Money_Other,
                                                                 StageVariables, Cost, Location, risc,
@@ -1378,6 +1802,9 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
                                                         Money_Screening[yi] += Cost['other']
                                                         PaymentType_Other[0, yi] += 1
 
+                        if Instr is not None:
+                            Instr.lap('screening')
+
                         #%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
                         #    special scenarios              %
                         #%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
@@ -1404,7 +1831,7 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
                                 PaymentType_Cancer_ini, PaymentType_Cancer_con,
                                 PaymentType_Cancer_fin,
                                 PaymentType_QCancer_ini, PaymentType_QCancer_con,
-                                PaymentType_QCancer_fin,
+                                PaymentType_QCancer_fin, PaymentType_CancerQuarters,
                                 Money_Screening, Money_Treatment, Money_FutureTreatment,
                                 Money_FollowUp, Money_Other,
                                 StageVariables, Cost, Location, risc,
@@ -1424,13 +1851,10 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
                         if flag.get('SpecialFlag', False) and q == 1:
                             if flag.get('Atkin', False):
                                 if y == 1:
-                                    if z == 0:  # MATLAB z==1, first patient
-                                        # randomly one test year between 55 and 64
-                                        tmp_years = np.arange(55, 65)
-                                        for ff in range(n):
-                                            Last_Included[ff] = tmp_years[int(round(np.random.rand() * (len(tmp_years) - 1)))]
-                                            if np.random.rand() < 0.71:
-                                                Last_TestYear[ff] = Last_Included[ff]
+                                    if z == 0 and TrialArm is None:  # MATLAB z==1, first patient
+                                        # the whole cohort at once, see _trial_enrollment
+                                        Last_Included[:], Last_TestYear[:], _ = _trial_enrollment(
+                                            'Atkin', _rand(2 * n).reshape(n, 2))
                                 else:
                                     if Last_Included[z] == y:
                                         StudyFlag = True
@@ -1464,19 +1888,21 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
 
                             elif flag.get('Schoen', False):
                                 if y == 1:
-                                    if z == 0:
+                                    if z == 0 and TrialArm is None:
+                                        # the number of draws depends on earlier draws, so
+                                        # this enrollment stays a loop
                                         tmp_years = np.arange(55, 75)
                                         for ff in range(n):
-                                            Last_Included[ff] = tmp_years[int(round(np.random.rand() * (len(tmp_years) - 1)))]
-                                            if np.random.rand() < 0.83:
+                                            Last_Included[ff] = tmp_years[int(round(_rand() * (len(tmp_years) - 1)))]
+                                            if _rand() < 0.83:
                                                 Last_TestYear[ff] = Last_Included[ff]
-                                                if np.random.rand() < 0.65:
-                                                    if np.random.rand() < 0.25:
+                                                if _rand() < 0.65:
+                                                    if _rand() < 0.25:
                                                         Last_TestYear2[ff] = Last_Included[ff] + 3
                                                     else:
                                                         Last_TestYear2[ff] = Last_Included[ff] + 5
-                                                elif np.random.rand() < 0.035:
-                                                    if np.random.rand() < 0.25:
+                                                elif _rand() < 0.035:
+                                                    if _rand() < 0.25:
                                                         Last_TestYear2[ff] = Last_Included[ff] + 3
                                                     else:
                                                         Last_TestYear2[ff] = Last_Included[ff] + 5
@@ -1520,12 +1946,10 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
 
                             elif flag.get('Segnan', False):
                                 if y == 1:
-                                    if z == 0:
-                                        tmp_years = np.arange(55, 65)
-                                        for ff in range(n):
-                                            Last_Included[ff] = tmp_years[int(round(np.random.rand() * (len(tmp_years) - 1)))]
-                                            if np.random.rand() < 0.583:
-                                                Last_TestYear[ff] = Last_Included[ff]
+                                    if z == 0 and TrialArm is None:
+                                        # the whole cohort at once, see _trial_enrollment
+                                        Last_Included[:], Last_TestYear[:], _ = _trial_enrollment(
+                                            'Segnan', _rand(2 * n).reshape(n, 2))
                                 else:
                                     if Last_Included[z] == y:
                                         StudyFlag = True
@@ -1558,12 +1982,10 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
 
                             elif flag.get('Holme', False):
                                 if y == 1:
-                                    if z == 0:
-                                        tmp_years = np.arange(51, 66)
-                                        for ff in range(n):
-                                            Last_Included[ff] = tmp_years[int(round(np.random.rand() * (len(tmp_years) - 1)))]
-                                            if np.random.rand() < 0.651:
-                                                Last_TestYear[ff] = Last_Included[ff]
+                                    if z == 0 and TrialArm is None:
+                                        # the whole cohort at once, see _trial_enrollment
+                                        Last_Included[:], Last_TestYear[:], _ = _trial_enrollment(
+                                            'Holme', _rand(2 * n).reshape(n, 2))
                                 else:
                                     if Last_TestYear[z] == y:
                                         if Last_TestDone[z] != 1:
@@ -1671,6 +2093,9 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
                                         Detected_CancerLocation[z, :] = 0
                                         Detected_MortTime[z, :] = 0
 
+                        if Instr is not None:
+                            Instr.lap('special_scenarios')
+
                         #%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
                         #    summarizing polyps             %
                         #%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
@@ -1680,6 +2105,9 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
                             for ff in range(1, 7):  # 1..6
                                 AllPolyps[ff - 1, yi] += np.sum(Polyp_Polyps[z, :] == ff)
 
+                        if Instr is not None:
+                            Instr.lap('summary')
+
                 #%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
                 #    summarizing cancer             %
                 #%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
@@ -1688,12 +2116,49 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
                 MaxCancer[yi, z] = np.max(Ca_Cancer[z, :])
                 NumCancer[yi, z] = _count_nonzero(Ca_Cancer[z, :])
 
+            if Instr is not None:
+                Instr.lap('summary')
+
+            if Reporter is not None and Reporter.due(z):
+                _report_progress(z + 1)
+
+        if Scen is not None:
+            Scen.switch(yi, Scen.k)
+
         # we summarize the whole cohort
         YearIncluded[yi, :] = Included
         YearAlive[yi, :] = Alive
+        if Streamed:
+            year_summary.add(yi, MaxPolyps[yi], NumPolyps[yi], MaxCancer[yi],
+                             HasCancer[yi], Included, Alive)
 
         print('Calculating year {}'.format(y))
 
+        if MetricsLog is not None:
+            _log_year_metrics(perf_counter() - YearStart)
+
+        if checkpoint_path is not None and (
+                (checkpoint_every and y % checkpoint_every == 0) or y == stop_after_year):
+            EngineState = locals()
+            save_checkpoint(
+                checkpoint_path, y, n,
+                {name: EngineState[name] for name in CHECKPOINT_ARRAYS + CHECKPOINT_INPUTS},
+                {name: EngineState[name] for name in CHECKPOINT_SCALARS},
+                meta={'backend': ENGINE_BACKEND, 'SpecialText': SpecialText,
+                      'natural_history': natural_history_fingerprint(y, EngineState),
+                      'crn_seed': CrnSeed})
+            del EngineState
+
+        if Reporter is not None:
+            _report_progress(n)
+
+        if Instr is not None:
+            Instr.lap('year_summary')
+            Instr.end_year()
+
+        if y == stop_after_year:
+            break
+
     # Post-simulation
     for f in range(n):
         if Alive[f]:
@@ -1747,6 +2212,7 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
         'QCancer_ini': PaymentType_QCancer_ini,
         'QCancer_con': PaymentType_QCancer_con,
         'QCancer_fin': PaymentType_QCancer_fin,
+        'CancerQuarters': PaymentType_CancerQuarters,
         'Other': PaymentType_Other,
     }
 
@@ -1788,6 +2254,10 @@ def NumberCrunching_100000(p, StageVariables, Location, Cost, CostStage, risc,
             writer.writerows(_trace_rows)
         print(f"DEBUG_TRACE: wrote {len(_trace_rows)} cancer events to {trace_path}")
 
+    if Streamed:
+        HasCancer = NumPolyps = MaxPolyps = NumCancer = MaxCancer = None
+        DiagnosedCancer = YearIncluded = YearAlive = None
+
     return (y, Gender, DeathCause, Last, DeathYear, NaturalDeathYear,
             DirectCancer, DirectCancerR, DirectCancer2, DirectCancer2R,
             ProgressedCancer, ProgressedCancerR, TumorRecord,
@@ -0,0 +1,495 @@
+#!/usr/bin/env python3
+"""
+aggregate_runs.py -- Mean and confidence intervals of many runs per
+scenario (Scripts/EvaluateColonoscopyScreen.m, EvaluateStandardSettings.m).
+
+The MATLAB scripts cd into a pipeline directory, pair every settings file
+with its <name>_Results file, stop if one is missing, load the results one
+after another and average the summary variables, costs and life years lost
+per strategy.  Here:
+
+    runs, missing = discover_runs(['pipeline/'])
+    rows = aggregate(runs, control='no_intervention', workers=8)
+    write_table('summary.csv', rows)
+
+or from the command line
+
+    python aggregate_runs.py pipeline/ --out summary.csv --control no_intervention
+
+  * discover_runs() pairs settings files (settings_io.settings_files) with
+    <name>_Results.npz in the same or a separate results directory and
+    lists the settings without results; results without a settings file
+    are runs as well;
+  * a run's scenario and replica come from its name: '<scenario>_<k>' or
+    '<scenario>_repeat_<k>' (REPLICA_PATTERN), or from a list of
+    (scenario, regex) pairs, the first match wins (STANDARD_SCENARIOS are
+    the strategies of EvaluateStandardSettings.m);
+  * run_metrics() reads only the fields it needs from a results file
+    (results_io.ResultsFile); the files are read in parallel worker
+    processes and only the per-run metrics travel back;
+  * per scenario and metric, aggregate() reports the number of runs, mean,
+    standard deviation and the Student-t confidence interval of the mean.
+
+Metrics per run:
+  * the numeric summary variables (Results['Variable'], named by
+    Var_Legend);
+  * 'costs', 'discounted costs' and the costs per category ('costs
+    screening', ...): per patient, summed over the year indices from_year
+    to 99 (Results money series are per patient);
+  * 'life years lost', 'discounted life years lost': (YearsLostCa +
+    YearsLostColo) per patient over the same years;
+  * discounting as recost.discount_masks(discount_rate, discount_start);
+  * with a control scenario, for every other scenario 'incidence
+    reduction' and 'mortality reduction' (percent of the control mean of
+    'Number ALL Ca' / 'Colon cancer deaths'), 'life years gained',
+    'discounted life years gained' (per patient) and 'cost per discounted
+    life year gained' (a ratio of means, no interval).  The intervals of
+    the reductions and gains hold the scenario's spread around the
+    control mean, not the control's own uncertainty;
+  * with benchmarks=True, every benchmark row (Results['BM_Table'], or
+    BM_Description / BM_Value / Benchmark of older files) as a metric
+    'BM <description>' with its benchmark and the flag of the mean
+    (tolerance as Evaluation).
+"""
+
+import argparse
+import csv
+import math
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+_this_dir = os.path.dirname(os.path.abspath(__file__))
+if _this_dir not in sys.path:
+    sys.path.insert(0, _this_dir)
+
+from benchmark_table import agreement
+from recost import discount_masks
+from results_export import RESULTS_SUFFIX, run_name
+from results_io import ResultsFile
+from settings_io import settings_files
+
+REPLICA_PATTERN = re.compile(r'^(?P<scenario>.+?)_(?:repeat_)?(?P<replica>\d+)$')
+
+# strategies of EvaluateStandardSettings.m, matched in this order
+STANDARD_SCENARIOS = (
+    ('no_intervention', 'no_intervention'),
+    ('Screening_Kolo', 'Screening_Kolo'),
+    ('Hemocc_II', 'Hemocc_II'),
+    ('Hemocc_Sensa', 'Hemocc_Sensa'),
+    ('I_FOBT', 'I_FOBT'),
+    ('RectoSigmo', 'RectoSigmo'),
+    ('Kolo_special', 'Kolo_special'),
+)
+
+COST_SERIES = ('Treatment', 'Screening', 'FollowUp', 'Other')
+TABLE_COLUMNS = ('scenario', 'metric', 'n', 'mean', 'sd', 'ci_low', 'ci_high',
+                 'benchmark', 'flag')
+
+# summary variables the comparisons with the control use (Var_Legend)
+ALL_CANCER = 'Number ALL Ca'
+CANCER_DEATHS = 'Colon cancer deaths'
+
+
+# ----------------------------------------------------------------------
+# discovery
+# ----------------------------------------------------------------------
+def scenario_of(name, scenarios=None):
+    """
+    (scenario, replica) of a run name.
+
+    With `scenarios`, a sequence of (scenario, regex), the first pattern
+    found in the name gives the scenario (None if none matches); the
+    replica is taken from the trailing number either way (0 if none).
+    """
+    match = REPLICA_PATTERN.match(name)
+    replica = int(match.group('replica')) if match else 0
+    if scenarios is None:
+        return (match.group('scenario') if match else name), replica
+    for scenario, pattern in scenarios:
+        if re.search(pattern, name):
+            return scenario, replica
+    return None, replica
+
+
+def discover_runs(paths, results_dir=None, scenarios=None):
+    """
+    Pair settings files and results files.
+
+    Parameters
+    ----------
+    paths : sequence of str
+        Directories (their settings and results files) or files.
+    results_dir : str, optional
+        Where the results files are; default next to the settings.
+    scenarios : sequence of (str, str), optional
+        See scenario_of(); runs matching no pattern are left out.
+
+    Returns
+    -------
+    runs : list of dict
+        'name', 'scenario', 'replica', 'results' and 'settings' (None for
+        results without a settings file), sorted by scenario and replica.
+    missing : list of str
+        Settings files without a results file.
+    """
+    settings = {}
+    results = {}
+    for path in paths:
+        if os.path.isdir(path):
+            for f in settings_files(path):
+                settings[os.path.splitext(os.path.basename(f))[0]] = f
+            for f in os.listdir(path):
+                if f.endswith(RESULTS_SUFFIX):
+                    results[run_name(f)] = os.path.join(path, f)
+        elif path.endswith(RESULTS_SUFFIX):
+            results[run_name(path)] = path
+        else:
+            settings[os.path.splitext(os.path.basename(path))[0]] = path
+    if results_dir is not None:
+        for f in os.listdir(results_dir):
+            if f.endswith(RESULTS_SUFFIX):
+                results[run_name(f)] = os.path.join(results_dir, f)
+
+    runs = []
+    missing = sorted(path for name, path in settings.items() if name not in results)
+    for name, path in results.items():
+        scenario, replica = scenario_of(name, scenarios)
+        if scenario is None:
+            continue
+        runs.append({'name': name, 'scenario': scenario, 'replica': replica,
+                     'results': path, 'settings': settings.get(name)})
+    runs.sort(key=lambda r: (r['scenario'], r['replica'], r['name']))
+    return runs, missing
+
+
+# ----------------------------------------------------------------------
+# per-run metrics
+# ----------------------------------------------------------------------
+def _benchmark_rows(rf):
+    """(descriptions, values, benchmarks, scored) of a results file."""
+    if 'BM_Table' in rf:
+        table = rf['BM_Table']
+        return (table['description'].tolist(), table['value'], table['benchmark'],
+                table['flag'] != 'black')
+    descriptions = rf['BM_Description']
+    values = rf['BM_Value']
+    benchmarks = rf['Benchmark']
+    if rf.legacy:
+        descriptions = ['' if d is None else d for d in descriptions.tolist()]
+        values = np.array([np.nan if v is None else v for v in values.tolist()], dtype=float)
+        benchmarks = np.array([np.nan if v is None else v for v in benchmarks.tolist()], dtype=float)
+    else:
+        descriptions = descriptions.tolist()
+    keep = [k for k, d in enumerate(descriptions) if d]
+    benchmarks = np.asarray(benchmarks, dtype=float)[keep]
+    # rows without a benchmark value were not scored (black)
+    return ([descriptions[k] for k in keep], np.asarray(values, dtype=float)[keep],
+            benchmarks, benchmarks != 0)
+
+
+def run_metrics(path, discount_rate=0.03, discount_start=20, from_year=20,
+                benchmarks=False, allow_pickle=False):
+    """
+    The metrics of one results file (see the module docstring).
+
+    Returns
+    -------
+    dict : metric name -> float; with benchmarks=True also '_benchmarks':
+        (descriptions, values, benchmark values, scored).
+    """
+    metrics = {}
+    with ResultsFile(path, allow_pickle=allow_pickle) as rf:
+        legend = [str(v) for v in np.asarray(rf['Var_Legend']).tolist()]
+        variables = rf['Variable']
+        variables = [v for v in (variables.tolist() if isinstance(variables, np.ndarray)
+                                 else variables)]
+        for k, (label, value) in enumerate(zip(legend, variables)):
+            if isinstance(value, (int, float, np.integer, np.floating)) and value == value:
+                metrics[label if label not in metrics else '{} ({})'.format(label, k + 1)] = float(value)
+
+        n = metrics.get('Number Patients') or rf.meta.get('n')
+        mask = discount_masks(discount_rate, start=discount_start)[0]
+        series = {key: np.asarray(rf[key], dtype=float) for key in COST_SERIES}
+        total = sum(series.values())
+        years = slice(from_year, 100)
+        metrics['costs'] = float(np.sum(total[years]))
+        metrics['discounted costs'] = float(np.sum((total * mask[:len(total)])[years]))
+        for key, label in zip(COST_SERIES, ('treatment', 'screening', 'follow up', 'other')):
+            metrics['costs ' + label] = float(np.sum(series[key][years]))
+
+        lost = np.asarray(rf['YearsLostCa'], dtype=float) + np.asarray(rf['YearsLostColo'], dtype=float)
+        if n:
+            lost = lost / n
+        metrics['life years lost'] = float(np.sum(lost[years]))
+        metrics['discounted life years lost'] = float(np.sum((lost * mask[:len(lost)])[years]))
+
+        if benchmarks:
+            metrics['_benchmarks'] = _benchmark_rows(rf)
+    return metrics
+
+
+def _metrics_task(args):
+    path, kwargs = args
+    try:
+        return path, run_metrics(path, **kwargs), None
+    except Exception as e:
+        return path, None, '{}: {}'.format(type(e).__name__, e)
+
+
+# ----------------------------------------------------------------------
+# statistics
+# ----------------------------------------------------------------------
+def _betacf(a, b, x):
+    """Continued fraction of the incomplete beta function (modified Lentz)."""
+    tiny = 1e-300
+    qab, qap, qam = a + b, a + 1.0, a - 1.0
+    c = 1.0
+    d = 1.0 - qab * x / qap
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    h = d
+    for m in range(1, 300):
+        m2 = 2 * m
+        aa = m * (b - m) * x / ((qam + m2) * (a + m2))
+        d = 1.0 + aa * d
+        d = 1.0 / (d if abs(d) > tiny else tiny)
+        c = 1.0 + aa / c
+        c = c if abs(c) > tiny else tiny
+        h *= d * c
+        aa = -(a + m) * (qab + m) * x / ((a + m2) * (qap + m2))
+        d = 1.0 + aa * d
+        d = 1.0 / (d if abs(d) > tiny else tiny)
+        c = 1.0 + aa / c
+        c = c if abs(c) > tiny else tiny
+        delta = d * c
+        h *= delta
+        if abs(delta - 1.0) < 1e-15:
+            break
+    return h
+
+
+def _betainc(a, b, x):
+    """Regularized incomplete beta function I_x(a, b)."""
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b)
+                     + a * math.log(x) + b * math.log(1.0 - x))
+    if x < (a + 1.0) / (a + b + 2.0):
+        return front * _betacf(a, b, x) / a
+    return 1.0 - front * _betacf(b, a, 1.0 - x) / b
+
+
+def t_quantile(p, df):
+    """Quantile of Student's t distribution with df degrees of freedom."""
+    if not 0.0 < p < 1.0:
+        raise ValueError('p must lie in (0, 1), not {}'.format(p))
+    if p < 0.5:
+        return -t_quantile(1.0 - p, df)
+
+    def cdf(t):
+        return 1.0 - 0.5 * _betainc(df / 2.0, 0.5, df / (df + t * t))
+
+    lo, hi = 0.0, 1.0
+    while cdf(hi) < p:
+        hi *= 2.0
+    for _ in range(200):
+        mid = 0.5 * (lo + hi)
+        if cdf(mid) < p:
+            lo = mid
+        else:
+            hi = mid
+        if hi - lo < 1e-12 * max(1.0, hi):
+            break
+    return 0.5 * (lo + hi)
+
+
+def mean_ci(values, confidence=0.95):
+    """(n, mean, sd, ci_low, ci_high) of a sample; no interval for n < 2."""
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    if n == 0:
+        return 0, np.nan, np.nan, np.nan, np.nan
+    mean = float(np.mean(values))
+    if n < 2:
+        return n, mean, np.nan, np.nan, np.nan
+    sd = float(np.std(values, ddof=1))
+    half = t_quantile(0.5 + confidence / 2.0, n - 1) * sd / math.sqrt(n)
+    return n, mean, sd, mean - half, mean + half
+
+
+# ----------------------------------------------------------------------
+# aggregation
+# ----------------------------------------------------------------------
+def collect_metrics(runs, workers=None, log=print, **kwargs):
+    """
+    run_metrics() of every run, read in parallel worker processes.
+
+    Returns {results path: metrics} and {results path: error}.
+    """
+    tasks = [(run['results'], kwargs) for run in runs]
+    metrics, failed = {}, {}
+    if workers == 1 or len(tasks) < 2:
+        results = map(_metrics_task, tasks)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        chunk = max(1, len(tasks) // (8 * (workers or os.cpu_count() or 1)))
+        results = pool.map(_metrics_task, tasks, chunksize=chunk)
+    try:
+        for path, values, error in results:
+            if error is not None:
+                failed[path] = error
+                log('{}: failed ({})'.format(path, error))
+            else:
+                metrics[path] = values
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return metrics, failed
+
+
+def _row(scenario, metric, stats, benchmark=np.nan, flag=''):
+    n, mean, sd, lo, hi = stats
+    return {'scenario': scenario, 'metric': metric, 'n': n, 'mean': mean, 'sd': sd,
+            'ci_low': lo, 'ci_high': hi, 'benchmark': benchmark, 'flag': flag}
+
+
+def aggregate(runs, control=None, confidence=0.95, workers=None, benchmarks=False,
+              tolerance=0.2, discount_rate=0.03, discount_start=20, from_year=20,
+              allow_pickle=False, log=print):
+    """
+    Aggregate the runs of discover_runs() per scenario.
+
+    Returns
+    -------
+    list of dict
+        One row per scenario and metric with the keys TABLE_COLUMNS, in
+        scenario order (the control first) and metric order of the first
+        run.
+    """
+    metrics, failed = collect_metrics(
+        runs, workers=workers, log=log, discount_rate=discount_rate,
+        discount_start=discount_start, from_year=from_year, benchmarks=benchmarks,
+        allow_pickle=allow_pickle)
+
+    by_scenario = {}
+    for run in runs:
+        if run['results'] in metrics:
+            by_scenario.setdefault(run['scenario'], []).append(metrics[run['results']])
+    if control is not None and control not in by_scenario:
+        raise ValueError('no results for the control scenario {!r}'.format(control))
+    order = sorted(by_scenario, key=lambda s: (s != control, s))
+
+    control_means = {}
+    if control is not None:
+        for name in (ALL_CANCER, CANCER_DEATHS, 'life years lost', 'discounted life years lost',
+                     'discounted costs'):
+            control_means[name] = float(np.mean([m.get(name, np.nan) for m in by_scenario[control]]))
+
+    rows = []
+    for scenario in order:
+        group = by_scenario[scenario]
+        names = [k for k in group[0] if not k.startswith('_')]
+        for name in names:
+            rows.append(_row(scenario, name, mean_ci([m.get(name, np.nan) for m in group],
+                                                     confidence)))
+
+        if control is not None and scenario != control:
+            def relative(name):
+                return np.array([m.get(name, np.nan) for m in group])
+
+            c = control_means
+            rows.append(_row(scenario, 'incidence reduction', mean_ci(
+                (c[ALL_CANCER] - relative(ALL_CANCER)) / c[ALL_CANCER] * 100, confidence)))
+            rows.append(_row(scenario, 'mortality reduction', mean_ci(
+                (c[CANCER_DEATHS] - relative(CANCER_DEATHS)) / c[CANCER_DEATHS] * 100, confidence)))
+            gained = c['life years lost'] - relative('life years lost')
+            disc_gained = c['discounted life years lost'] - relative('discounted life years lost')
+            rows.append(_row(scenario, 'life years gained', mean_ci(gained, confidence)))
+            rows.append(_row(scenario, 'discounted life years gained',
+                             mean_ci(disc_gained, confidence)))
+            extra = float(np.mean(relative('discounted costs'))) - c['discounted costs']
+            mean_gained = float(np.mean(disc_gained))
+            icer = extra / mean_gained if mean_gained != 0 else np.nan
+            rows.append(_row(scenario, 'cost per discounted life year gained',
+                             (len(group), icer, np.nan, np.nan, np.nan)))
+
+        if benchmarks:
+            descriptions, _, bench, scored = group[0]['_benchmarks']
+            values = np.array([m['_benchmarks'][1] for m in group
+                               if m['_benchmarks'][0] == descriptions])
+            if len(values) < len(group):
+                log('{}: {} runs hold other benchmarks and are left out'.format(
+                    scenario, len(group) - len(values)))
+            means = np.mean(values, axis=0)
+            flags, _, _ = agreement(means, bench, tolerance)
+            for k, description in enumerate(descriptions):
+                rows.append(_row(scenario, 'BM ' + description,
+                                 mean_ci(values[:, k], confidence), float(bench[k]),
+                                 str(flags[k]) if scored[k] else 'black'))
+    return rows
+
+
+def write_table(path, rows):
+    """Write the rows of aggregate() as CSV in one pass."""
+    tmp = path + '.tmp'
+    with open(tmp, 'w', newline='') as fh:
+        writer = csv.DictWriter(fh, fieldnames=TABLE_COLUMNS, lineterminator='\n')
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({key: ('' if isinstance(value, float) and value != value else value)
+                             for key, value in row.items()})
+    os.replace(tmp, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Mean and confidence intervals of CMOST '
+                                                 'runs per scenario.')
+    parser.add_argument('paths', nargs='+', help='directories or files with settings and results')
+    parser.add_argument('--out', required=True, help='aggregated table (.csv)')
+    parser.add_argument('--results-dir', default=None,
+                        help='directory of the results files (default: next to the settings)')
+    parser.add_argument('--control', default=None, help='control scenario, e.g. no_intervention')
+    parser.add_argument('--standard', action='store_true',
+                        help='group runs into the strategies of EvaluateStandardSettings.m')
+    parser.add_argument('--benchmarks', action='store_true', help='aggregate the benchmark rows')
+    parser.add_argument('--confidence', type=float, default=0.95)
+    parser.add_argument('--discount-rate', type=float, default=0.03)
+    parser.add_argument('--discount-start', type=int, default=20)
+    parser.add_argument('--from-year', type=int, default=20,
+                        help='first year index of the cost and life year sums')
+    parser.add_argument('-j', '--workers', type=int, default=None)
+    parser.add_argument('--allow-missing', action='store_true',
+                        help='aggregate even if some settings have no results')
+    parser.add_argument('--allow-pickle', action='store_true',
+                        help='read results files written by np.savez (pickled entries)')
+    args = parser.parse_args(argv)
+
+    runs, missing = discover_runs(args.paths, args.results_dir,
+                                  STANDARD_SCENARIOS if args.standard else None)
+    if missing:
+        print('No results file for {} settings:'.format(len(missing)))
+        for path in missing:
+            print('  ' + path)
+        if not args.allow_missing:
+            return 1
+    if not runs:
+        print('No results files found.')
+        return 1
+    rows = aggregate(runs, control=args.control, confidence=args.confidence,
+                     workers=args.workers, benchmarks=args.benchmarks,
+                     discount_rate=args.discount_rate, discount_start=args.discount_start,
+                     from_year=args.from_year, allow_pickle=args.allow_pickle)
+    write_table(args.out, rows)
+    scenarios = {row['scenario'] for row in rows}
+    print('{} runs in {} scenarios -> {}'.format(len(runs), len(scenarios), args.out))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
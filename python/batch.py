@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+batch.py -- Run many settings files on a persistent pool of worker
+processes.
+
+The Starter batch of the GUI (CMOST_Main._start_batch_callback) runs the
+files of Variables['Starter']['CurrentSummary'] one after another in the GUI
+process; the MATLAB version needed CMOSTCluster and an external cluster to
+run them in parallel.  run_batch() runs a list of jobs on a
+ProcessPoolExecutor instead:
+
+    jobs = directory_jobs('my_settings')          # or starter_jobs(variables)
+    summary = run_batch(jobs, 'results', workers=8, retries=1, seed=42)
+
+or from the command line
+
+    python batch.py my_settings/ extra.pkl --out results --workers 8
+
+  * the workers are started once and import the engine once
+    (_init_worker); they stay alive for the whole batch;
+  * jobs are submitted longest first by estimate_cost(), so the expensive
+    scenarios do not end up alone at the tail of the batch;
+  * every finished run is written by its worker to <out>/<name>.result.pkl
+    (atomically, via a temporary file) and recorded as one JSON line in
+    <out>/batch.jsonl, so partial results survive an interrupted batch;
+  * a run that raises, returns no benchmarks or loses its worker process is
+    retried up to `retries` times; a failed job is recorded and the batch
+    goes on.
+
+Each run sets StarterFlag, Starter.Counter and ResultsPath as the GUI batch
+does, so Evaluation writes its own result files for settings with
+ResultsFlag on.  Settings_Name is set to the job name (unique within the
+batch), so replicas of one settings file (Repeat Identical) do not write
+the same <ResultsPath>/<Settings_Name>_Results.npz.  With a seed, job i is run with seed + i, so results do not
+depend on the number of workers or the order of completion.
+"""
+
+import argparse
+import copy
+import json
+import os
+import pickle
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+_this_dir = os.path.dirname(os.path.abspath(__file__))
+if _this_dir not in sys.path:
+    sys.path.insert(0, _this_dir)
+
+from settings_io import SETTINGS_EXTENSIONS, load_settings, settings_files
+
+MANIFEST = 'batch.jsonl'
+
+# relative extra work per patient of the interventions (estimate_cost)
+_SCREENING_COST = 0.6
+_SURVEILLANCE_COST = 0.2
+
+
+class BatchJob:
+    """
+    One simulation of a batch.
+
+    Parameters
+    ----------
+    name : str
+        Unique name; the result file is <name>.result.pkl.
+    variables : dict
+        Settings (handles['Variables']).
+    source : str, optional
+        Settings file the job was loaded from.
+    seed : int, optional
+        Seed of the global generator; run_batch() assigns one if None.
+    """
+
+    def __init__(self, name, variables, source=None, seed=None):
+        self.name = name
+        self.variables = variables
+        self.source = source
+        self.seed = seed
+        self.cost = estimate_cost(variables)
+
+
+def estimate_cost(variables):
+    """
+    Relative run time of a simulation: the number of patients, weighted
+    up for screening and surveillance, which add procedures to every
+    simulated year.  Only the order of the estimates is used.
+    """
+    n = float(variables.get('Number_patients', 0))
+    weight = 1.0
+    if variables.get('Screening', {}).get('Mode', 'off') == 'on':
+        weight += _SCREENING_COST
+    for key in ('Polyp_Surveillance', 'Cancer_Surveillance'):
+        if variables.get(key, 'off') == 'on':
+            weight += _SURVEILLANCE_COST
+    return n * weight
+
+
+def _job_name(path, taken):
+    name = os.path.splitext(os.path.basename(path))[0]
+    unique, i = name, 1
+    while unique in taken:
+        i += 1
+        unique = '{}_{}'.format(name, i)
+    taken.add(unique)
+    return unique
+
+
+def file_jobs(paths):
+    """
+    Jobs for settings files and directories of settings files
+    (.py, .pkl, .mat; see settings_io).  Files that cannot be loaded raise
+    a ValueError before anything is run.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(settings_files(path))
+        else:
+            files.append(path)
+    jobs, taken = [], set()
+    for path in files:
+        variables = load_settings(path)
+        if variables is None:
+            raise ValueError('could not load settings from {}'.format(path))
+        jobs.append(BatchJob(_job_name(path, taken), variables, source=path))
+    return jobs
+
+
+def directory_jobs(directory):
+    """Jobs for all settings files directly in `directory`."""
+    return file_jobs([directory])
+
+
+def starter_jobs(variables, results_path=None):
+    """
+    Jobs for the files of Variables['Starter'] (CurrentSummary in
+    CurrentPath), prepared as in the GUI batch: StarterFlag on, the Starter
+    of `variables` with Counter = position in the list (1-based) and
+    ResultsPath.
+    """
+    starter = variables.get('Starter', {})
+    summary = starter.get('CurrentSummary', [])
+    paths = starter.get('CurrentPath', [])
+    if not isinstance(summary, list):
+        summary = []
+    if results_path is None:
+        results_path = variables.get('ResultsPath', '')
+    jobs, taken = [], set()
+    for f, name in enumerate(summary):
+        path = os.path.join(paths[f], name)
+        loaded = load_settings(path)
+        if loaded is None:
+            raise ValueError('could not load settings from {}'.format(path))
+        loaded['StarterFlag'] = 'on'
+        loaded['Starter'] = copy.deepcopy(starter)
+        loaded['Starter']['Counter'] = f + 1
+        loaded['ResultsPath'] = results_path
+        jobs.append(BatchJob(_job_name(path, taken), loaded, source=path))
+    return jobs
+
+
+# ----------------------------------------------------------------------
+# worker side
+# ----------------------------------------------------------------------
+_calculate_sub = None
+
+
+def _init_worker():
+    """Import the engine once per worker process."""
+    global _calculate_sub
+    from calculate_sub import calculate_sub
+    _calculate_sub = calculate_sub
+
+
+def _write_atomic(path, obj):
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as fh:
+        pickle.dump(obj, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+def _run_job(name, variables, seed, out_dir, keep_data):
+    """
+    Run one job in a worker and write its result file.
+
+    Returns a record for the manifest; status is 'ok' or 'failed'.
+    """
+    if _calculate_sub is None:
+        _init_worker()
+    start = time.perf_counter()
+    record = {'name': name, 'seed': seed}
+    # Evaluation names the results file after the settings
+    variables['Settings_Name'] = name
+    try:
+        np.random.seed(seed)
+        handles, BM = _calculate_sub({'Variables': variables})
+    except Exception as e:
+        record.update(status='failed', error='{}: {}'.format(type(e).__name__, e),
+                      traceback=traceback.format_exc())
+    else:
+        if BM is None:
+            record.update(status='failed', error='simulation returned no benchmarks')
+        else:
+            result = {'Variables': handles['Variables'], 'BM': BM}
+            if keep_data:
+                result['data'] = handles['data']
+            path = os.path.join(out_dir, name + '.result.pkl')
+            _write_atomic(path, result)
+            record.update(status='ok', result=path)
+    record['seconds'] = time.perf_counter() - start
+    return record
+
+
+def _run_isolated(job, out_dir, keep_data):
+    """Run one job in a fresh single-worker process."""
+    with ProcessPoolExecutor(max_workers=1, initializer=_init_worker) as pool:
+        future = pool.submit(_run_job, job.name, job.variables, job.seed, out_dir, keep_data)
+        try:
+            return future.result()
+        except BrokenProcessPool as e:
+            return {'name': job.name, 'seed': job.seed, 'status': 'failed',
+                    'error': 'worker process died: {}'.format(e)}
+
+
+# ----------------------------------------------------------------------
+# driver
+# ----------------------------------------------------------------------
+def run_batch(jobs, out_dir, workers=None, retries=1, seed=None, keep_data=False,
+              log=print):
+    """
+    Run `jobs` on a pool of worker processes.
+
+    Parameters
+    ----------
+    jobs : list of BatchJob
+    out_dir : str
+        Directory for the result files and the manifest (batch.jsonl).
+    workers : int, optional
+        Number of worker processes (default os.cpu_count()); 1 runs the
+        jobs in this process.
+    retries : int
+        Extra attempts for a failed job.
+    seed : int, optional
+        Jobs without a seed get seed + (position in `jobs`); with None they
+        are seeded from fresh entropy.
+    keep_data : bool
+        Also store handles['data'] in the result files (large).
+    log : callable
+        Receives one progress line per finished attempt.
+
+    Returns
+    -------
+    dict : job name -> final manifest record (status, seconds, attempts,
+        result or error).
+    """
+    names = [job.name for job in jobs]
+    if len(set(names)) != len(names):
+        raise ValueError('job names must be unique')
+    if workers is None:
+        workers = os.cpu_count() or 1
+    os.makedirs(out_dir, exist_ok=True)
+
+    for i, job in enumerate(jobs):
+        if job.seed is None:
+            job.seed = (seed + i) if seed is not None else int(np.random.SeedSequence().entropy % 2**32)
+    pending = sorted(jobs, key=lambda job: job.cost, reverse=True)
+    attempts = dict.fromkeys(names, 0)
+    final = {}
+
+    with open(os.path.join(out_dir, MANIFEST), 'a') as manifest:
+        def finish(job, record):
+            attempts[job.name] += 1
+            record.update(attempts=attempts[job.name], source=job.source)
+            manifest.write(json.dumps(record) + '\n')
+            manifest.flush()
+            retry = record['status'] != 'ok' and attempts[job.name] <= retries
+            if not retry:
+                final[job.name] = record
+            log('[{}/{}] {} {} ({:.1f} s){}'.format(
+                len(final), len(jobs), job.name, record['status'],
+                record.get('seconds', 0.0), ', retrying' if retry else ''))
+            return not retry
+
+        if workers <= 1:
+            _init_worker()
+            for job in pending:
+                while not finish(job, _run_job(job.name, copy.deepcopy(job.variables),
+                                               job.seed, out_dir, keep_data)):
+                    pass
+            return final
+
+        queue = pending
+        while queue:
+            lost = []
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                running = {}
+                while (queue or running) and not lost:
+                    while queue and len(running) < 2 * workers:
+                        job = queue.pop(0)
+                        running[pool.submit(_run_job, job.name, job.variables, job.seed,
+                                            out_dir, keep_data)] = job
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    if any(isinstance(f.exception(), BrokenProcessPool) for f in done):
+                        # a worker died and took the pool down: collect the
+                        # jobs that were still running on it
+                        done, _ = wait(running)
+                    for future in done:
+                        job = running.pop(future)
+                        error = future.exception()
+                        if isinstance(error, BrokenProcessPool):
+                            lost.append(job)
+                            continue
+                        if error is None:
+                            record = future.result()
+                        else:
+                            record = {'name': job.name, 'seed': job.seed, 'status': 'failed',
+                                      'error': '{}: {}'.format(type(error).__name__, error)}
+                        if not finish(job, record):
+                            queue.insert(0, job)
+            # the job that killed its worker is unknown: rerun the lost jobs
+            # one by one in a process of their own, then go on in a new pool
+            for job in lost:
+                log('{} lost with its worker process, rerunning it alone'.format(job.name))
+                while not finish(job, _run_isolated(job, out_dir, keep_data)):
+                    pass
+    return final
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Run CMOST settings files on a pool of worker processes.')
+    parser.add_argument('paths', nargs='+',
+                        help='settings files or directories ({})'.format(
+                            ', '.join(SETTINGS_EXTENSIONS)))
+    parser.add_argument('--out', required=True,
+                        help='directory for the result files and batch.jsonl')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes (default: CPU count)')
+    parser.add_argument('--retries', type=int, default=1,
+                        help='extra attempts for a failed run')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='base seed; run i uses seed + i')
+    parser.add_argument('--patients', type=int, default=None,
+                        help='override Number_patients of every run')
+    parser.add_argument('--keep-data', action='store_true',
+                        help='also store the simulation data in the result files')
+    args = parser.parse_args(argv)
+
+    jobs = file_jobs(args.paths)
+    for job in jobs:
+        job.variables['StarterFlag'] = 'on'
+        job.variables['ResultsPath'] = args.out
+        if args.patients is not None:
+            job.variables['Number_patients'] = args.patients
+            job.cost = estimate_cost(job.variables)
+    start = time.perf_counter()
+    final = run_batch(jobs, args.out, workers=args.workers, retries=args.retries,
+                      seed=args.seed, keep_data=args.keep_data)
+    failed = sorted(name for name, record in final.items() if record['status'] != 'ok')
+    print('{} of {} runs finished in {:.1f} s'.format(
+        len(final) - len(failed), len(final), time.perf_counter() - start))
+    if failed:
+        print('failed: ' + ', '.join(failed))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
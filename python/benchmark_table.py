@@ -0,0 +1,173 @@
+"""
+benchmark_table.py -- Typed table of the benchmark comparisons of a run.
+
+Evaluation scores the simulation against the benchmarks row by row.  The
+rows are collected in a structured array with the columns of
+BENCHMARK_DTYPE:
+
+    group        benchmark group ('EarlyPolyp', 'CancerIncidence', ...)
+    description  the label shown in the GUI ('early polyps year 52')
+    sex          0 both, 1 male, 2 female (as data['Gender'])
+    age          benchmark year, NaN if the row is not age specific
+    benchmark    the benchmark value (0 for rows without one)
+    value        the simulated value
+    lower, upper tolerance band (NaN for rows without one)
+    flag         'green' / 'red' (inside / outside the band), 'black'
+                 (not scored)
+
+BM['Table'] holds the table of a run and the results file stores it as
+'BM_Table' (readable without pickle).  The GUI and older code read the
+lists BM['description'], ['value'], ['benchmark'] and ['flag']; Evaluation
+fills them from the table with legacy_lists().
+
+Tables of many runs with the same rows stack into a (runs, rows) array, so
+comparing calibration runs is a column operation:
+
+    runs = stack_tables([bm['Table'] for bm in results])
+    red = np.sum(runs['flag'] == 'red', axis=1)
+    error = np.sum((1 - runs['value'] / runs['benchmark']) ** 2, axis=1,
+                   where=runs['group'] == 'EarlyPolyp')
+"""
+
+import numpy as np
+
+BENCHMARK_DTYPE = np.dtype([
+    ('group', 'U24'),
+    ('description', 'U80'),
+    ('sex', 'i1'),
+    ('age', 'f8'),
+    ('benchmark', 'f8'),
+    ('value', 'f8'),
+    ('lower', 'f8'),
+    ('upper', 'f8'),
+    ('flag', 'U5'),
+])
+
+# number of slots of the legacy BM lists
+LEGACY_SIZE = 500
+
+
+def agreement(values, benchmarks, tolerance, inclusive=False, slack=None):
+    """
+    Score values against benchmarks with a relative tolerance.
+
+    A value agrees ('green') if it lies within benchmark * (1 -/+ tolerance),
+    with or without the bounds (`inclusive`), or, if `slack` is given, if it
+    differs from the benchmark by at most `slack`.
+
+    Returns
+    -------
+    flags : ndarray of str ('green' / 'red')
+    lower, upper : ndarray
+        The tolerance band.
+    """
+    values = np.asarray(values, dtype=float)
+    benchmarks = np.asarray(benchmarks, dtype=float)
+    lower = benchmarks * (1 - tolerance)
+    upper = benchmarks * (1 + tolerance)
+    if inclusive:
+        agree = (values >= lower) & (values <= upper)
+    else:
+        agree = (values > lower) & (values < upper)
+    if slack is not None:
+        agree |= np.abs(values - benchmarks) <= slack
+    return np.where(agree, 'green', 'red'), lower, upper
+
+
+def benchmark_rows(group, description, value, benchmark, flag, sex=0, age=np.nan,
+                   lower=np.nan, upper=np.nan):
+    """Structured rows of BENCHMARK_DTYPE; the arguments are broadcast."""
+    columns = np.broadcast_arrays(np.asarray(group), np.asarray(description),
+                                  np.asarray(sex), np.asarray(age, dtype=float),
+                                  np.asarray(benchmark, dtype=float),
+                                  np.asarray(value, dtype=float),
+                                  np.asarray(lower, dtype=float),
+                                  np.asarray(upper, dtype=float), np.asarray(flag))
+    rows = np.zeros(columns[0].size, dtype=BENCHMARK_DTYPE)
+    for name, column in zip(BENCHMARK_DTYPE.names, columns):
+        rows[name] = column.ravel()
+    return rows
+
+
+class BenchmarkTable:
+    """Benchmark rows collected in the order they are scored."""
+
+    def __init__(self):
+        self._parts = []
+        self._rows = 0
+
+    def __len__(self):
+        return self._rows
+
+    def add(self, group, description, value, benchmark, flag, sex=0, age=np.nan,
+            lower=np.nan, upper=np.nan):
+        """Append rows (see benchmark_rows) and return them."""
+        rows = benchmark_rows(group, description, value, benchmark, flag,
+                              sex=sex, age=age, lower=lower, upper=upper)
+        self._parts.append(rows)
+        self._rows += len(rows)
+        return rows
+
+    def score(self, group, description, value, benchmark, tolerance, sex=0,
+              age=np.nan, inclusive=False, slack=None):
+        """Append rows scored with agreement() and return their flags."""
+        flags, lower, upper = agreement(value, benchmark, tolerance,
+                                        inclusive=inclusive, slack=slack)
+        self.add(group, description, value, benchmark, flags, sex=sex, age=age,
+                 lower=lower, upper=upper)
+        return flags
+
+    def array(self):
+        """All rows as one structured array."""
+        if not self._parts:
+            return np.zeros(0, dtype=BENCHMARK_DTYPE)
+        return np.concatenate(self._parts)
+
+
+def legacy_lists(table, size=LEGACY_SIZE):
+    """
+    The BM lists 'description', 'value', 'benchmark' and 'flag' of `table`,
+    padded with None to `size` slots as the GUI expects.
+    """
+    if len(table) > size:
+        raise ValueError('{} benchmarks do not fit into {} slots'.format(len(table), size))
+    pad = [None] * (size - len(table))
+    return {
+        'description': table['description'].tolist() + pad,
+        'value': table['value'].tolist() + pad,
+        'benchmark': table['benchmark'].tolist() + pad,
+        'flag': table['flag'].tolist() + pad,
+    }
+
+
+def save_table(path, table):
+    """Write a table (or stacked tables) to an .npy file."""
+    np.save(path, np.asarray(table, dtype=BENCHMARK_DTYPE), allow_pickle=False)
+
+
+def load_table(path, mmap_mode=None):
+    """Read a table written by save_table()."""
+    table = np.load(path, mmap_mode=mmap_mode, allow_pickle=False)
+    if table.dtype != BENCHMARK_DTYPE:
+        raise ValueError('{} does not hold a benchmark table'.format(path))
+    return table
+
+
+def stack_tables(tables):
+    """
+    Stack the tables of several runs into a (runs, rows) array.
+
+    All tables must hold the same benchmarks (group, description, sex) in
+    the same order, as runs of the same Evaluation groups do.
+    """
+    tables = [np.asarray(t, dtype=BENCHMARK_DTYPE) for t in tables]
+    if not tables:
+        return np.zeros((0, 0), dtype=BENCHMARK_DTYPE)
+    first = tables[0]
+    for k, table in enumerate(tables[1:], 1):
+        if (len(table) != len(first)
+                or np.any(table['group'] != first['group'])
+                or np.any(table['description'] != first['description'])
+                or np.any(table['sex'] != first['sex'])):
+            raise ValueError('table {} holds other benchmarks than table 0'.format(k))
+    return np.stack(tables)
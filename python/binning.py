@@ -0,0 +1,201 @@
+"""
+binning.py -- Counting and binning helpers for Evaluation.
+
+Evaluation summarises the (year, patient) matrices of the engine output
+(YearIncluded, MaxPolyps, NumPolyps, ...) and the (year, slot) tumour
+records by year, gender, stage, detection mode and location, and then
+groups years into age bands.  Instead of one boolean mask per group and
+year, the helpers here count all groups of a matrix with a single
+np.bincount over combined keys:
+
+    hist = year_counts(data['MaxPolyps'], mask=data['YearIncluded'],
+                       by=gender, n_by=3)
+    # hist[f, g, v]: included patients of gender g with MaxPolyps == v in year f
+    counts_above(hist)[:, :, 4]     # ... with MaxPolyps > 4 (advanced)
+    band_sums(counts, INCIDENCE_BANDS)
+
+Counts are exact integers; ratio() divides the way the original loops did
+(count / total * scale, zero where the total is zero), so the results are
+bit-identical.
+"""
+
+import numpy as np
+
+# age bands of the incidence and mortality benchmarks (0-based years, half
+# open).  Years 8 and 9 belong to no band, as in the MATLAB version.
+INCIDENCE_BANDS = ((0, 4), (4, 8), (10, 15), (15, 20), (20, 25), (25, 30),
+                   (30, 35), (35, 40), (40, 45), (45, 50), (50, 55), (55, 60),
+                   (60, 65), (65, 70), (70, 75), (75, 80), (80, 85), (85, 90))
+
+# rows of the stage distribution tables: <50, the decades 50-99 and all ages
+STAGE_BANDS = ((0, 50), (50, 60), (60, 70), (70, 80), (80, 90), (90, 100), (0, 100))
+
+def band_sums(values, bands=INCIDENCE_BANDS, axis=-1):
+    """
+    Sum `values` over the (start, stop) index bands along `axis`.
+
+    Bands may overlap or leave gaps; the result has len(bands) entries
+    along `axis`.
+    """
+    values = np.moveaxis(np.asarray(values, dtype=float), axis, -1)
+    # reduceat sums between consecutive indices; with the indices
+    # start0, stop0, start1, stop1, ... every even entry is a band.  The
+    # zero column keeps stop == length a valid index.
+    padded = np.concatenate([values, np.zeros(values.shape[:-1] + (1,))], axis=-1)
+    sums = np.add.reduceat(padded, np.ravel(bands), axis=-1)[..., ::2]
+    return np.moveaxis(sums, -1, axis)
+
+
+def count_by(keys, shape, weights=None):
+    """
+    Number of entries (or sum of `weights`) per combination of integer keys.
+
+    Parameters
+    ----------
+    keys : sequence of array_like
+        One integer array per output dimension, broadcast together.
+    shape : tuple of int
+        Output shape; keys must lie in range(shape[i]).
+    weights : array_like, optional
+
+    Returns
+    -------
+    ndarray of `shape`
+        Integer counts, or float sums if weights are given.
+    """
+    keys = np.broadcast_arrays(*[np.asarray(k) for k in keys])
+    flat = np.ravel_multi_index([k.astype(np.intp).ravel() for k in keys], shape)
+    if weights is not None:
+        weights = np.broadcast_to(weights, keys[0].shape).ravel()
+    counts = np.bincount(flat, weights=weights, minlength=int(np.prod(shape)))
+    return counts.reshape(shape)
+
+
+def year_counts(values, size=None, mask=None, by=None, n_by=None):
+    """
+    Histogram of the integer values of a (years, m) matrix for every year.
+
+    Parameters
+    ----------
+    values : ndarray (years, m)
+        Integer-valued entries (bool, int or float) in range(size).
+    size : int, optional
+        Number of value bins; default max(values) + 1.
+    mask : ndarray (years, m) of bool, optional
+        Only count these entries.
+    by : ndarray (m,) or (years, m), optional
+        Integer group in range(n_by) of every column (e.g. the patients'
+        gender) or entry (e.g. the tumour records' detection mode).
+    n_by : int, optional
+        Number of groups; default max(by) + 1.
+
+    Returns
+    -------
+    ndarray (years, size), or (years, n_by, size) if `by` is given
+        out[f, g, v] is the number of counted entries in row f with value
+        v and group g.
+    """
+    values = np.asarray(values)
+    years, m = values.shape
+    if size is None:
+        size = _bins(values)
+    groups = 1
+    if by is not None:
+        by = np.asarray(by)
+        groups = n_by if n_by is not None else _bins(by)
+    # bin 0 collects the masked entries
+    bins = groups * size + 1
+    offset = 1 if by is None else (by * size + 1).astype(np.intp)
+
+    out = np.zeros((years, bins), dtype=np.int64)
+    # row by row: the temporaries of one row stay in cache
+    for f in range(years):
+        key = values[f].astype(np.intp)
+        key += offset if by is None or by.ndim == 1 else offset[f]
+        if mask is not None:
+            key *= np.asarray(mask[f], dtype=bool)
+        counts = np.bincount(key, minlength=bins)
+        if len(counts) > bins:
+            raise ValueError('values outside range({}) or groups outside range({})'
+                             .format(size, groups))
+        out[f] = counts
+    out = out[:, 1:]
+    return out if by is None else out.reshape(years, groups, size)
+
+
+def _bins(values):
+    """max(values) + 1 for non-negative integer values."""
+    if not values.size:
+        return 1
+    if values.min() < 0:
+        raise ValueError('negative values can not be counted')
+    return int(values.max()) + 1
+
+
+def counts_above(hist):
+    """
+    Turn a histogram over values 0..K-1 (last axis) into the counts of
+    values greater than 0, 1, ..., K-1.
+    """
+    above = np.cumsum(hist[..., ::-1], axis=-1)[..., ::-1]
+    return np.concatenate([above[..., 1:], np.zeros_like(above[..., :1])], axis=-1)
+
+
+def hist_mean_std(hist):
+    """
+    Mean and (population) standard deviation of the values 0..K-1 counted
+    in `hist`; (0, 0) for an empty histogram.
+    """
+    hist = np.asarray(hist, dtype=float)
+    total = np.sum(hist)
+    if total == 0:
+        return 0.0, 0.0
+    values = np.arange(len(hist))
+    mean = np.sum(hist * values) / total
+    return mean, np.sqrt(np.sum(hist * (values - mean) ** 2) / total)
+
+
+def ratio(num, den, scale=1):
+    """num / den * scale elementwise, 0 where den is not positive."""
+    num = np.asarray(num, dtype=float)
+    den = np.broadcast_to(np.asarray(den, dtype=float), num.shape)
+    out = np.zeros(num.shape)
+    np.divide(num, den, out=out, where=den > 0)
+    return out * scale
+
+
+def years_lived(times, length=101):
+    """
+    Fraction of every year index lived before each of `times`, summed.
+
+    out[i] is the sum of min(max(t - i, 0), 1) over all t: the per-patient
+    rows of Evaluation's life years arrays (1 up to floor(t), then the
+    fraction t - floor(t)) added up without building them.
+    """
+    times = np.asarray(times, dtype=float)
+    whole = np.floor(times).astype(np.intp)
+    # entries alive through the whole of year i: floor(t) > i
+    ended = np.bincount(np.minimum(whole, length), minlength=length + 1)
+    alive = (len(times) - np.cumsum(ended)[:length]).astype(float)
+    part = whole < length
+    frac = np.bincount(whole[part], weights=(times - whole)[part], minlength=length)
+    return alive + frac
+
+
+def span_sums(weights, first, last):
+    """
+    weights[first[i]] + ... + weights[last[i]] for every i.
+
+    Indices past the end of `weights` are ignored and the sum is 0 if
+    first > last.  The sums are read from a table of running sums that
+    adds from left to right, so they equal a loop over the span exactly.
+    """
+    weights = np.asarray(weights, dtype=float)
+    length = len(weights)
+    # table[a, b]: sum of weights[a:b]
+    table = np.zeros((length + 1, length + 1))
+    for a in range(length):
+        table[a, a + 1:] = np.cumsum(weights[a:])
+    first = np.clip(np.asarray(first, dtype=np.intp), 0, length)
+    stop = np.clip(np.asarray(last, dtype=np.intp) + 1, 0, length)
+    return table[first, stop]
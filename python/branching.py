@@ -0,0 +1,179 @@
+"""
+branching.py -- Simulate natural history once, then fork the cohort into
+several screening strategies.
+
+Screening only starts at the start year of the screening tests (typically
+age 50), so every strategy comparison re-simulates identical years of natural
+history.  run_branches() instead
+
+  1. runs a trunk simulation with screening switched off up to the year
+     before the earliest screening start of all branches and snapshots the
+     full engine state, including the random generator (see checkpoint.py);
+  2. resumes every branch from that snapshot with its own settings, i.e. its
+     own ScreeningTest, surveillance / special flags and ScreeningPreference.
+
+Twenty strategies then cost about 1 + 20 x (remaining fraction) runs instead
+of 20 full runs.  Branches start from the same random generator state, so
+each branch gives exactly the result of a full run of its settings with the
+same seed, as long as the branch differs from the trunk only in settings
+that act from the branch year on (screening).  Surveillance or special
+scenario changes apply from the branch year on.
+
+Snapshots can be cached on disk; the cache key covers all engine settings
+except 'Screening', the seed and the branch year:
+
+    base = load_settings(...)
+    branches = {
+        'colo10': {'Screening': colo_every_10y},
+        'fit2':   {'Screening': fit_every_2y},
+    }
+    results = run_branches(base, branches, seed=42, cache_dir='snapshots')
+    handles, BM = results['colo10']
+"""
+
+import copy
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+_this_dir = os.path.dirname(os.path.abspath(__file__))
+if _this_dir not in sys.path:
+    sys.path.insert(0, _this_dir)
+
+from calculate_sub import calculate_sub, screening_tables
+from checkpoint import settings_fingerprint, load_checkpoint
+from NumberCrunching_100000 import ENGINE_BACKEND
+
+
+def screening_start_year(variables):
+    """
+    First simulated year in which any enabled screening test can be done,
+    or None if screening is off / no test is assigned to any patients.
+    """
+    screening = variables.get('Screening', {})
+    if screening.get('Mode', 'off') != 'on':
+        return None
+    screening_test, _ = screening_tables(screening)
+    used = screening_test[:, 0] > 0
+    if not np.any(used):
+        return None
+    return int(np.ceil(np.min(screening_test[used, 3])))
+
+
+def branch_year(base, branches):
+    """
+    Latest year after which all branches can still be forked: the year
+    before the earliest screening start of any branch.
+    """
+    starts = []
+    for overrides in branches.values():
+        start = screening_start_year(branch_variables(base, '', overrides))
+        if start is not None:
+            starts.append(start)
+    if not starts:
+        raise ValueError('no branch has screening enabled; nothing to branch on')
+    return max(min(starts) - 1, 1)
+
+
+def branch_variables(base, name, overrides):
+    """Settings of one branch: a copy of `base` updated with `overrides`."""
+    variables = copy.deepcopy(base)
+    for key, value in overrides.items():
+        variables[key] = copy.deepcopy(value)
+    if name and 'Settings_Name' not in overrides:
+        variables['Settings_Name'] = '{}_{}'.format(base.get('Settings_Name', ''), name)
+    return variables
+
+
+def snapshot_key(variables, seed, year, crn_seed=None):
+    """Cache key of the trunk snapshot for these settings, seed and year."""
+    return settings_fingerprint(variables, exclude=('Screening',), seed=seed,
+                                year=year, backend=ENGINE_BACKEND, crn_seed=crn_seed)
+
+
+def run_trunk(variables, year, seed=42, cache_dir=None, crn_seed=None):
+    """
+    Simulate the cohort with screening off up to and including `year` and
+    return the path of the snapshot (checkpoint directory).
+
+    With a cache_dir an existing snapshot for the same key is reused.
+    """
+    if cache_dir is None:
+        cache_dir = tempfile.mkdtemp(prefix='cmost_trunk_')
+    path = os.path.join(cache_dir, 'trunk_' + snapshot_key(variables, seed, year, crn_seed)[:32])
+    if os.path.isdir(path):
+        try:
+            if load_checkpoint(path).year == year:
+                print('Using cached snapshot {}'.format(path))
+                return path
+        except ValueError:
+            pass
+
+    trunk = copy.deepcopy(variables)
+    trunk['Screening'] = copy.deepcopy(trunk['Screening'])
+    trunk['Screening']['Mode'] = 'off'
+    trunk['ResultsFlag'] = False
+    np.random.seed(seed)
+    handles, _ = calculate_sub({'Variables': trunk}, checkpoint_path=path,
+                               stop_after_year=year, crn_seed=crn_seed)
+    if 'data' not in handles:
+        raise RuntimeError('trunk simulation failed')
+    return path
+
+
+def run_branch(variables, snapshot, seed=42, crn_seed=None):
+    """Resume one branch from a trunk snapshot; returns (handles, BM)."""
+    np.random.seed(seed)
+    return calculate_sub({'Variables': variables}, resume_from=snapshot,
+                         resume_keep_preference=True, crn_seed=crn_seed)
+
+
+def _run_branch_job(job):
+    return run_branch(*job)
+
+
+def run_branches(base, branches, seed=42, year=None, cache_dir=None, workers=1,
+                 crn_seed=None):
+    """
+    Run several screening strategies from one shared natural history.
+
+    Parameters
+    ----------
+    base : dict
+        Settings (handles['Variables']) shared by all branches.
+    branches : dict of name -> dict
+        Per-branch setting overrides, e.g. {'Screening': {...},
+        'Polyp_Surveillance': 'off'}.  Settings_Name defaults to
+        <base name>_<branch name>.
+    seed : int
+        Seed of the trunk and of every branch.
+    year : int or None
+        Branch year (last simulated year of the trunk); defaults to the year
+        before the earliest screening start of all branches.
+    cache_dir : str or None
+        Directory for (cached) trunk snapshots.
+    workers : int
+        Number of worker processes for the branches (1 = in-process).
+    crn_seed : int or None
+        Use common random numbers (crn.py) in the trunk and all branches, so
+        that the branches also share the natural history after the branch
+        year.
+
+    Returns
+    -------
+    dict of name -> (handles, BM)
+    """
+    if year is None:
+        year = branch_year(base, branches)
+    snapshot = run_trunk(base, year, seed=seed, cache_dir=cache_dir, crn_seed=crn_seed)
+
+    jobs = {name: (branch_variables(base, name, overrides), snapshot, seed, crn_seed)
+            for name, overrides in branches.items()}
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {name: pool.submit(_run_branch_job, job) for name, job in jobs.items()}
+            return {name: fut.result() for name, fut in futures.items()}
+    return {name: run_branch(*job) for name, job in jobs.items()}
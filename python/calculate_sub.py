@@ -40,6 +40,7 @@ Returns:
 
 import os
 import sys
+import time
 import numpy as np
 
 # Ensure the python/ directory is on the import path so sibling modules
@@ -50,9 +51,117 @@ if _this_dir not in sys.path:
 
 from NumberCrunching_100000 import NumberCrunching_100000
 from Evaluation import Evaluation
+from run_control import SimulationCancelled
+from warmstart import warm_start_state
+from crn import CommonRandomNumbers
+from checkpoint import settings_fingerprint
+from rct import SPECIAL_FLAGS, TrialDesign, evaluate_trials
+from result_cache import ResultCache, engine_version, run_key
+from run_registry import RunRegistry
+from year_summary import YearSummary
 
 
-def calculate_sub(handles):
+def screening_tables(screening):
+    """
+    Build the ScreeningTest matrix and the 1000-slot ScreeningMatrix lookup
+    table from the Screening settings (handles['Variables']['Screening']).
+
+    Returns
+    -------
+    tuple : (screening_test, screening_matrix)
+        screening_test : (7, 8) array, one row per test; columns are
+            PercentPop, Adherence, FollowUp, y-start, y-end, interval,
+            y after colo, specificity
+        screening_matrix : (1000,) int array of 0-based test indices
+    """
+    # ScreeningTest matrix: 7 tests x 8 parameters
+    # Row 0: Colonoscopy, Row 1: Rectosigmoidoscopy, Row 2: FOBT,
+    # Row 3: I_FOBT, Row 4: Sept9_HiSens, Row 5: Sept9_HiSpec, Row 6: other
+    screening_test = np.zeros((7, 8))
+
+    # Colonoscopy: MATLAB inserts 0 as third element
+    # MATLAB: [handles.Variables.Screening.Colonoscopy(1:2), 0, handles.Variables.Screening.Colonoscopy(3:7)]
+    col_vars = list(screening['Colonoscopy'])
+    screening_test[0, :] = [col_vars[0], col_vars[1], 0,
+                            col_vars[2], col_vars[3], col_vars[4], col_vars[5], col_vars[6]]
+
+    screening_test[1, :] = screening['Rectosigmoidoscopy']
+    screening_test[2, :] = screening['FOBT']
+    screening_test[3, :] = screening['I_FOBT']
+    screening_test[4, :] = screening['Sept9_HiSens']
+    screening_test[5, :] = screening['Sept9_HiSpec']
+    screening_test[6, :] = screening['other']
+
+    screening_handles = ['Colonoscopy', 'Rectosigmoidoscopy', 'FOBT', 'I_FOBT',
+                         'Sept9_HiSens', 'Sept9_HiSpec', 'other']
+
+    # Construct ScreeningMatrix: a 1000-element lookup table for screening type assignment
+    # MATLAB: ScreeningMatrix = zeros(1, 1000) then fills with test index (1-based)
+    # Python: we fill with 0-based test index, then patients look up their preference
+    screening_matrix = np.zeros(1000, dtype=int)
+    start_idx = 0
+    for f_idx, name in enumerate(screening_handles):
+        prob = screening[name][0]
+        if prob > 0:
+            length = int(round(prob * 1000))
+            end_idx = min(start_idx + length, 1000)
+            # MATLAB stores 1-based test index (f); in Python NumberCrunching uses
+            # ScreeningPreference values to index into ScreeningTest which is 0-based.
+            # The MATLAB code: ScreeningMatrix(Start:Ende) = f (where f=1..7)
+            # NumberCrunching then does: ScreeningTest(ScreeningPreference(z), ...)
+            # which is 1-based indexing. In Python NumberCrunching_100000.py,
+            # ScreeningPreference is used as: ScreeningTest[int(screening_pref), ...]
+            # so we need to store 0-based indices here.
+            screening_matrix[start_idx:end_idx] = f_idx
+            start_idx = end_idx
+
+    return screening_test, screening_matrix
+
+
+def fast_cancer_vector(fast_cancer):
+    """
+    StageVariables['FastCancer'] from the FastCancer setting: padded to the
+    10 polyp types, without fast cancers from stages 6-10.
+    """
+    fast_cancer_src = np.array(fast_cancer, dtype=float)
+    # MATLAB FastCancer has 10 elements (one per polyp type). Settings files
+    # may store fewer elements. Pad to 10 if needed, then zero out indices 5-9.
+    vector = np.zeros(10)
+    vector[:len(fast_cancer_src)] = fast_cancer_src
+    vector[5:10] = 0  # MATLAB: FastCancer(6:10) = 0
+    return vector
+
+
+def register_run(registry, variables, since=0.0):
+    """
+    Add the results file Evaluation wrote for these settings to the run
+    registry (a run_registry.RunRegistry or its file); nothing without
+    ResultsFlag or a results file written after `since` (time.time()).
+    """
+    if registry is None or not variables.get('ResultsFlag'):
+        return
+    path = os.path.join(variables.get('ResultsPath', ''),
+                        variables.get('Settings_Name', '')) + '_Results.npz'
+    if not os.path.exists(path) or os.path.getmtime(path) < since:
+        return
+    try:
+        if isinstance(registry, str):
+            with RunRegistry(registry) as reg:
+                reg.register(path, variables)
+        else:
+            registry.register(path, variables)
+    except Exception as e:
+        print(f"Could not register {path} in the run registry: {e}")
+
+
+def calculate_sub(handles, progress_callback=None, cancel_token=None,
+                  progress_every=0, instrumentation=None, metrics_log=None,
+                  checkpoint_path=None, checkpoint_every=0, resume_from=None,
+                  resume_keep_preference=False, stop_after_year=None,
+                  warm_start_dir=None, warm_start_year=40, crn_seed=None,
+                  rct_trials=None, scenarios=None, result_cache=None,
+                  stream_evaluation=False, evaluation_groups=None, seed=None,
+                  registry=None):
     """
     Prepare simulation variables and run the CMOST simulation pipeline.
 
@@ -67,6 +176,76 @@ def calculate_sub(handles):
     ----------
     handles : dict
         Must contain key 'Variables' with a dict of all simulation parameters.
+    progress_callback : callable, optional
+        Forwarded to NumberCrunching_100000; called with a progress dict
+        after every simulated year (see run_control.ProgressReporter).
+    cancel_token : run_control.CancellationToken, optional
+        If cancelled while the engine runs, the simulation stops at the next
+        patient boundary and (handles, None) is returned.
+    progress_every : int, optional
+        Additionally report every N patients within a year (0 = per year only).
+    instrumentation : instrumentation.EngineInstrumentation, optional
+        Collects per-phase engine timings and per-year event counts; its
+        report is stored in handles['Instrumentation'].
+    metrics_log : str or metrics_log.YearMetricsLog, optional
+        File (.csv or JSON Lines) receiving one record of cohort metrics per
+        simulated year while the engine runs.
+    checkpoint_path, checkpoint_every : optional
+        Write the engine state to the directory checkpoint_path every
+        checkpoint_every simulated years (see checkpoint.py).
+    resume_from : str, optional
+        Checkpoint directory to continue from.  The settings must be the
+        ones of the interrupted run; the result is identical to an
+        uninterrupted run.
+    resume_keep_preference : bool, optional
+        Use the ScreeningPreference drawn for these settings instead of the
+        checkpointed one (see branching.py).
+    stop_after_year : int, optional
+        Stop the engine after this simulated year (writing a checkpoint if
+        checkpoint_path is given).  Evaluation is skipped for such partial
+        runs and BM is None.
+    warm_start_dir, warm_start_year : optional
+        Start from a stored population state after warm_start_year years,
+        kept in (and created on first use in) warm_start_dir; see
+        warmstart.py.
+    crn_seed : int, optional
+        Use common random numbers with this seed: natural-history and
+        intervention draws come from separate per patient-year streams, so
+        runs of different strategies see the same patients (see crn.py).
+    rct_trials : sequence of str, optional
+        Emulate these rectosigmoidoscopy trials (see rct.RCT_TRIALS) with a
+        control and an intervention arm of Number_patients each in one run;
+        requires crn_seed.  The trial outcomes are stored in handles['RCT'],
+        Evaluation is skipped and BM is None (see rct.py).
+    scenarios : scenarios.ScenarioTable, optional
+        Simulate the scenarios of the table, Number_patients each, in one
+        engine run.  handles['Scenarios'] holds a dict with 'Variables',
+        'data' and 'BM' per scenario; handles['data'] is the stacked run and
+        BM is None (see scenarios.py).
+    result_cache : result_cache.ResultCache or str, optional
+        Cache (or cache directory) of results keyed by the effective engine
+        inputs; a run that is in the cache is not simulated again (see
+        result_cache.py).  Only used for complete single-cohort runs.
+    stream_evaluation : bool, optional
+        Collect the per-year counts Evaluation needs while the engine runs
+        instead of keeping the (100, n) per-patient matrices; they are None
+        in handles['data'] and data['YearSummary'] holds the counts (see
+        year_summary.py).  Not possible with checkpoints or scenarios.
+    evaluation_groups : sequence of str, optional
+        Only compute these benchmark groups (and their dependencies) in
+        Evaluation, e.g. Evaluation.CALIBRATION_GROUPS[k] for calibration
+        step k; BM holds only their benchmarks and no results file is
+        written unless 'results' is requested.  The result cache is not
+        used for such runs.
+    seed : int, optional
+        Seed the global numpy generator with this value before the run
+        (the same as np.random.seed(seed) before the call).  It is recorded
+        in data['RunInfo'] and in the results file, together with the
+        settings hash, engine version and timings (see results_io.py).
+    registry : run_registry.RunRegistry or str, optional
+        Registry (or registry file) the results file of the run is added
+        to, with the settings as parameters (see run_registry.py); each
+        scenario's file with scenarios.
 
     Returns
     -------
@@ -79,6 +258,10 @@ def calculate_sub(handles):
     # 1. Preparation of Variables
     # ---------------------------------------------------------
 
+    if seed is not None:
+        np.random.seed(seed)
+    run_started = time.time()
+
     p = 10   # types of polyps
     n = handles['Variables']['Number_patients']
 
@@ -108,13 +291,7 @@ def calculate_sub(handles):
     stage_variables = {}
     stage_variables['Progression'] = np.array(handles['Variables']['Progression'], dtype=float)
 
-    fast_cancer_src = np.array(handles['Variables']['FastCancer'], dtype=float)
-    # MATLAB FastCancer has 10 elements (one per polyp type). Settings files
-    # may store fewer elements. Pad to 10 if needed, then zero out indices 5-9.
-    fast_cancer = np.zeros(10)
-    fast_cancer[:len(fast_cancer_src)] = fast_cancer_src
-    fast_cancer[5:10] = 0  # MATLAB: FastCancer(6:10) = 0
-    stage_variables['FastCancer'] = fast_cancer
+    stage_variables['FastCancer'] = fast_cancer_vector(handles['Variables']['FastCancer'])
 
     stage_variables['Healing'] = np.array(handles['Variables']['Healing'], dtype=float)
     stage_variables['Symptoms'] = np.array(handles['Variables']['Symptoms'], dtype=float)
@@ -196,8 +373,7 @@ def calculate_sub(handles):
     flag['Correlation'] = (handles['Variables'].get('RiskCorrelation', 'on') == 'on')
 
     # Default False flags
-    for k in ['Schoen', 'Holme', 'Segnan', 'Atkin', 'perfect', 'Mock',
-              'Kolo1', 'Kolo2', 'Kolo3', 'Po55', 'treated', 'AllPolypFollowUp']:
+    for k in SPECIAL_FLAGS:
         flag[k] = False
 
     # String comparisons (matching MATLAB isequal checks)
@@ -231,46 +407,7 @@ def calculate_sub(handles):
     # 2. Screening Variables
     # ---------------------------------------------------------
 
-    # ScreeningTest matrix: 7 tests x 8 parameters
-    # Row 0: Colonoscopy, Row 1: Rectosigmoidoscopy, Row 2: FOBT,
-    # Row 3: I_FOBT, Row 4: Sept9_HiSens, Row 5: Sept9_HiSpec, Row 6: other
-    screening_test = np.zeros((7, 8))
-
-    # Colonoscopy: MATLAB inserts 0 as third element
-    # MATLAB: [handles.Variables.Screening.Colonoscopy(1:2), 0, handles.Variables.Screening.Colonoscopy(3:7)]
-    col_vars = list(handles['Variables']['Screening']['Colonoscopy'])
-    screening_test[0, :] = [col_vars[0], col_vars[1], 0,
-                            col_vars[2], col_vars[3], col_vars[4], col_vars[5], col_vars[6]]
-
-    screening_test[1, :] = handles['Variables']['Screening']['Rectosigmoidoscopy']
-    screening_test[2, :] = handles['Variables']['Screening']['FOBT']
-    screening_test[3, :] = handles['Variables']['Screening']['I_FOBT']
-    screening_test[4, :] = handles['Variables']['Screening']['Sept9_HiSens']
-    screening_test[5, :] = handles['Variables']['Screening']['Sept9_HiSpec']
-    screening_test[6, :] = handles['Variables']['Screening']['other']
-
-    screening_handles = ['Colonoscopy', 'Rectosigmoidoscopy', 'FOBT', 'I_FOBT',
-                         'Sept9_HiSens', 'Sept9_HiSpec', 'other']
-
-    # Construct ScreeningMatrix: a 1000-element lookup table for screening type assignment
-    # MATLAB: ScreeningMatrix = zeros(1, 1000) then fills with test index (1-based)
-    # Python: we fill with 0-based test index, then patients look up their preference
-    screening_matrix = np.zeros(1000, dtype=int)
-    start_idx = 0
-    for f_idx, name in enumerate(screening_handles):
-        prob = handles['Variables']['Screening'][name][0]
-        if prob > 0:
-            length = int(round(prob * 1000))
-            end_idx = min(start_idx + length, 1000)
-            # MATLAB stores 1-based test index (f); in Python NumberCrunching uses
-            # ScreeningPreference values to index into ScreeningTest which is 0-based.
-            # The MATLAB code: ScreeningMatrix(Start:Ende) = f (where f=1..7)
-            # NumberCrunching then does: ScreeningTest(ScreeningPreference(z), ...)
-            # which is 1-based indexing. In Python NumberCrunching_100000.py,
-            # ScreeningPreference is used as: ScreeningTest[int(screening_pref), ...]
-            # so we need to store 0-based indices here.
-            screening_matrix[start_idx:end_idx] = f_idx
-            start_idx = end_idx
+    screening_test, screening_matrix = screening_tables(handles['Variables']['Screening'])
 
     # Sensitivity arrays for stool/blood tests
     # MATLAB: Sensitivity(3,:) = FOBT_Sens (10 elements)
@@ -310,6 +447,13 @@ def calculate_sub(handles):
     new_polyp = np.array(handles['Variables']['NewPolyp'], dtype=float)
     colonoscopy_likelyhood = np.array(handles['Variables']['ColonoscopyLikelyhood'], dtype=float)
 
+    # --- Scenario stacking: K blocks of Number_patients ---
+    if scenarios is not None:
+        if rct_trials:
+            raise ValueError('scenarios and rct_trials cannot be combined')
+        if scenarios.independent:
+            n = n * scenarios.k
+
     # --- Patient Distribution ---
     individual_risk = np.zeros(n)
     risk_dist = {}
@@ -479,13 +623,80 @@ def calculate_sub(handles):
             location_matrix[1, loc_counter:ende] = f + 1
             loc_counter = ende
 
+    # --- Paired RCT emulation: one control and one intervention arm per trial ---
+    design = None
+    if rct_trials:
+        if crn_seed is None:
+            raise ValueError('rct_trials needs a crn_seed: the arms are paired by common random numbers')
+        design = TrialDesign(flag, rct_trials, n)
+        individual_risk = np.tile(individual_risk, design.groups)
+        gender_arr = np.tile(gender_arr, design.groups)
+        screening_preference = np.tile(screening_preference, design.groups)
+        n = n * design.groups
+
+    if scenarios is not None:
+        size = handles['Variables']['Number_patients']
+        if not scenarios.independent:
+            individual_risk = np.tile(individual_risk, scenarios.k)
+            gender_arr = np.tile(gender_arr, scenarios.k)
+            screening_preference = np.tile(screening_preference, scenarios.k)
+            n = n * scenarios.k
+        scenarios.prepare(stage_variables, direct_cancer_speed, size)
+
     # ---------------------------------------------------------
     # 5. Running Calculations
     # ---------------------------------------------------------
 
     print(f"Running CMOST simulation with {n} patients...")
+    start = time.perf_counter()
+
+    engine_args = (
+        p, stage_variables, location, cost, cost_stage, risc,
+        flag, special_text, female, sensitivity,
+        screening_test, screening_preference, age_progression,
+        new_polyp, colonoscopy_likelyhood, individual_risk,
+        risk_dist, gender_arr, life_table, mortality_matrix,
+        location_matrix, stage_duration, tx1, direct_cancer_rate,
+        direct_cancer_speed, dwell_speed)
+
+    cache_key = None
+    if result_cache is not None:
+        if (checkpoint_path or resume_from or stop_after_year is not None
+                or design is not None or scenarios is not None
+                or evaluation_groups is not None):
+            print("Result cache is only used for complete single-cohort runs; not consulted.")
+        else:
+            if isinstance(result_cache, str):
+                result_cache = ResultCache(result_cache)
+            cache_key = run_key(engine_args, np.random.get_state(),
+                                handles['Variables'].get('Benchmarks'), crn_seed,
+                                stream_evaluation)
+            cached = result_cache.get(cache_key)
+            if cached is not None:
+                print(f"Using cached result {cache_key[:16]}.")
+                data, bm = cached['data'], cached['BM']
+                if handles['Variables'].get('ResultsFlag'):
+                    # Evaluation writes the results file of these settings
+                    data, bm = Evaluation(data, handles['Variables'])
+                    register_run(registry, handles['Variables'], run_started)
+                np.random.set_state(cached['rng_state'])
+                handles['data'] = data
+                return handles, bm
 
     try:
+        crn = None
+        if crn_seed is not None:
+            if design is not None:
+                crn = CommonRandomNumbers(crn_seed, design.cohort_size)
+            elif scenarios is not None and not scenarios.independent:
+                crn = CommonRandomNumbers(crn_seed, scenarios.size)
+            else:
+                crn = CommonRandomNumbers(crn_seed)
+        summary = YearSummary() if stream_evaluation else None
+        warm_start = warm_start_dir is not None and resume_from is None
+        if warm_start:
+            resume_from = warm_start_state(warm_start_dir, warm_start_year, engine_args, crn)
+
         (y_result, gender_out, death_cause, last, death_year, natural_death_year,
          direct_cancer_out, direct_cancer_r, direct_cancer2, direct_cancer2_r,
          progressed_cancer, progressed_cancer_r, tumor_record,
@@ -495,17 +706,23 @@ def calculate_sub(handles):
          early_polyps_removed, diagnosed_cancer, advanced_polyps_removed,
          year_included, year_alive
          ) = NumberCrunching_100000(
-            p, stage_variables, location, cost, cost_stage, risc,
-            flag, special_text, female, sensitivity,
-            screening_test, screening_preference, age_progression,
-            new_polyp, colonoscopy_likelyhood, individual_risk,
-            risk_dist, gender_arr, life_table, mortality_matrix,
-            location_matrix, stage_duration, tx1, direct_cancer_rate,
-            direct_cancer_speed, dwell_speed
+            *engine_args,
+            progress_callback=progress_callback, cancel_token=cancel_token,
+            progress_every=progress_every, instrumentation=instrumentation,
+            metrics_log=metrics_log, checkpoint_path=checkpoint_path,
+            checkpoint_every=checkpoint_every, resume_from=resume_from,
+            resume_keep_preference=resume_keep_preference,
+            stop_after_year=stop_after_year, warm_start=warm_start,
+            common_random_numbers=crn, trial_design=design,
+            scenarios=scenarios, year_summary=summary
         )
 
         print(f"Simulation complete. Simulated {y_result} years.")
 
+    except SimulationCancelled as e:
+        print(f"NumberCrunching_100000 stopped: {e}")
+        return handles, None
+
     except Exception as e:
         print(f"Error running NumberCrunching_100000: {e}")
         import traceback
@@ -547,6 +764,16 @@ def calculate_sub(handles):
         'InputCost': cost,
         'InputCostStage': cost_stage,
     }
+    if summary is not None:
+        data['YearSummary'] = summary.result()
+    # written into the results file by Evaluation
+    data['RunInfo'] = {
+        'settings_hash': settings_fingerprint(handles['Variables']),
+        'seed': seed,
+        'crn_seed': crn_seed,
+        'engine_version': engine_version(),
+        'timings': {'simulation': time.perf_counter() - start},
+    }
 
     # ---------------------------------------------------------
     # 6. Evaluation
@@ -554,15 +781,46 @@ def calculate_sub(handles):
 
     # MATLAB: [data, BM] = Evaluation(data, handles.Variables);
     bm = None
-    try:
-        data, bm = Evaluation(data, handles['Variables'])
-        print("Evaluation complete.")
-    except Exception as e:
-        print(f"Error in Evaluation: {e}")
-        import traceback
-        traceback.print_exc()
+    if stop_after_year is not None:
+        print(f"Partial run stopped after year {y_result}; Evaluation skipped.")
+    elif design is not None:
+        handles['RCT'] = evaluate_trials(data, design)
+        handles['RCTDesign'] = design
+        print("RCT emulation complete; Evaluation skipped.")
+    elif scenarios is not None:
+        handles['Scenarios'] = []
+        for k in range(scenarios.k):
+            scenario = {'Variables': scenarios.variables(handles['Variables'], k),
+                        'data': scenarios.split(data, k), 'BM': None}
+            # the hash of this scenario's settings, not of the base settings
+            scenario['data']['RunInfo'] = dict(
+                data['RunInfo'], settings_hash=settings_fingerprint(scenario['Variables']))
+            try:
+                scenario['data'], scenario['BM'] = Evaluation(
+                    scenario['data'], scenario['Variables'], evaluation_groups)
+                register_run(registry, scenario['Variables'], run_started)
+            except Exception as e:
+                print(f"Error in Evaluation of scenario {k + 1}: {e}")
+                import traceback
+                traceback.print_exc()
+            handles['Scenarios'].append(scenario)
+        print(f"Evaluation of {scenarios.k} scenarios complete.")
+    else:
+        try:
+            data, bm = Evaluation(data, handles['Variables'], evaluation_groups)
+            print("Evaluation complete.")
+            register_run(registry, handles['Variables'], run_started)
+            if cache_key is not None:
+                result_cache.put(cache_key, {'data': data, 'BM': bm,
+                                             'rng_state': np.random.get_state()})
+        except Exception as e:
+            print(f"Error in Evaluation: {e}")
+            import traceback
+            traceback.print_exc()
 
     # Store data in handles (matching MATLAB behavior: handles.data = data)
     handles['data'] = data
+    if instrumentation is not None:
+        handles['Instrumentation'] = instrumentation.report()
 
     return handles, bm
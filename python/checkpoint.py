@@ -0,0 +1,208 @@
+"""
+checkpoint.py -- Save and restore the state of NumberCrunching_100000 at the
+end of a simulated year.
+
+A checkpoint is a directory:
+
+    state.json          year, patient count, scalar counters, numpy RNG
+                        state (without the key) and an index of the arrays
+    rng_key.npy         MT19937 key of the numpy global random generator
+    <Name>.npy          one file per engine array (lesion arrays, Last_*,
+                        Included/Alive, accumulators, TumorRecord, ...)
+
+Each array is a plain .npy file, so a checkpoint can be inspected or
+memory-mapped with  np.load(path, mmap_mode='r')  without loading the
+whole state.  A new checkpoint is written next to the old one and swapped
+in with renames, so an interrupted write never destroys the last good
+checkpoint.
+
+The engine decides what goes into a checkpoint (see CHECKPOINT_ARRAYS and
+CHECKPOINT_SCALARS in NumberCrunching_100000.py); this module only deals
+with the file layout.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+CHECKPOINT_FORMAT = 2
+_STATE_FILE = 'state.json'
+_RNG_KEY_FILE = 'rng_key.npy'
+
+# settings that never influence the engine state (paths, display, benchmarks)
+NON_ENGINE_SETTINGS = (
+    'Benchmarks', 'Calibration', 'Comment', 'CurrentPath', 'DispFlag',
+    'ExcelFlag', 'Identification', 'MaxIterations', 'NumberPatientsValues',
+    'ResultsFlag', 'ResultsPath', 'ScanSettings', 'Settings_Name', 'Starter',
+    'StarterFlag',
+)
+
+
+def _jsonable(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError('cannot fingerprint {!r}'.format(type(value)))
+
+
+def settings_fingerprint(variables, exclude=(), **extra):
+    """
+    Stable SHA-256 hex digest of a settings dict.
+
+    Keys in NON_ENGINE_SETTINGS and `exclude` are ignored; keyword
+    arguments (e.g. seed=..., year=...) are mixed into the digest.
+    """
+    skip = set(NON_ENGINE_SETTINGS) | set(exclude)
+    content = {k: v for k, v in variables.items() if k not in skip}
+    content['__extra__'] = extra
+    text = json.dumps(content, sort_keys=True, default=_jsonable)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _feed(digest, value):
+    if isinstance(value, dict):
+        digest.update(b'{')
+        for key in sorted(value):
+            digest.update(repr(key).encode('utf-8'))
+            _feed(digest, value[key])
+        digest.update(b'}')
+    elif isinstance(value, (np.ndarray, list, tuple)):
+        try:
+            arr = np.asarray(value)
+        except ValueError:
+            arr = None                  # ragged nested lists
+        if arr is None or arr.dtype == object:
+            digest.update(b'[')
+            for item in value:
+                _feed(digest, item)
+            digest.update(b']')
+        else:
+            arr = np.ascontiguousarray(arr)
+            digest.update(repr((arr.dtype.str, arr.shape)).encode('utf-8'))
+            digest.update(arr.tobytes())
+    else:
+        digest.update(repr(value).encode('utf-8'))
+
+
+def inputs_fingerprint(values):
+    """SHA-256 hex digest of (nested dicts / lists of) engine input arrays."""
+    digest = hashlib.sha256()
+    _feed(digest, values)
+    return digest.hexdigest()
+
+
+class Checkpoint:
+    """
+    Engine state read from a checkpoint directory.
+
+    Attributes
+    ----------
+    path : str
+    year : int
+        Last completed simulated year (1-based).
+    n : int
+        Number of patients.
+    arrays : dict of name -> np.ndarray (read-only memory maps by default)
+    scalars : dict of name -> number
+    rng_state : tuple accepted by np.random.set_state
+    meta : dict
+        Free-form metadata stored by the writer (backend, settings name...).
+    """
+
+    def __init__(self, path, year, n, arrays, scalars, rng_state, meta):
+        self.path = path
+        self.year = year
+        self.n = n
+        self.arrays = arrays
+        self.scalars = scalars
+        self.rng_state = rng_state
+        self.meta = meta
+
+
+def save_checkpoint(path, year, n, arrays, scalars, rng_state=None, meta=None):
+    """
+    Write a checkpoint directory at `path` (replacing an existing one).
+
+    Parameters
+    ----------
+    path : str
+        Checkpoint directory.
+    year : int
+        Last completed simulated year.
+    n : int
+        Number of patients.
+    arrays : dict of name -> np.ndarray
+    scalars : dict of name -> int or float
+    rng_state : tuple or None
+        np.random.get_state(); taken from the global generator if None.
+    meta : dict or None
+        JSON-serialisable extra information.
+    """
+    if rng_state is None:
+        rng_state = np.random.get_state()
+    path = os.path.abspath(path)
+    tmp = path + '.tmp-{}'.format(os.getpid())
+    old = path + '.old-{}'.format(os.getpid())
+    if os.path.exists(tmp):
+        shutil.rmtree(tmp)
+    os.makedirs(tmp)
+
+    index = {}
+    for name, value in arrays.items():
+        value = np.asarray(value)
+        np.save(os.path.join(tmp, name + '.npy'), value)
+        index[name] = {'shape': list(value.shape), 'dtype': value.dtype.str}
+
+    rng_name, rng_key, rng_pos, rng_has_gauss, rng_cached = rng_state[:5]
+    np.save(os.path.join(tmp, _RNG_KEY_FILE), np.asarray(rng_key, dtype=np.uint32))
+    state = {
+        'format': CHECKPOINT_FORMAT,
+        'year': int(year),
+        'n': int(n),
+        'scalars': {k: (v.item() if hasattr(v, 'item') else v) for k, v in scalars.items()},
+        'rng': {'name': rng_name, 'pos': int(rng_pos),
+                'has_gauss': int(rng_has_gauss), 'cached_gaussian': float(rng_cached)},
+        'arrays': index,
+        'meta': meta or {},
+    }
+    with open(os.path.join(tmp, _STATE_FILE), 'w') as fh:
+        json.dump(state, fh, indent=1)
+        fh.flush()
+        os.fsync(fh.fileno())
+
+    if os.path.exists(path):
+        os.rename(path, old)
+    os.rename(tmp, path)
+    if os.path.exists(old):
+        shutil.rmtree(old)
+    return path
+
+
+def load_checkpoint(path, mmap_mode='r'):
+    """
+    Read a checkpoint directory written by save_checkpoint.
+
+    Arrays are memory-mapped read-only unless mmap_mode=None.
+    Raises ValueError if the directory is not a checkpoint of a supported
+    format.
+    """
+    state_file = os.path.join(path, _STATE_FILE)
+    if not os.path.isfile(state_file):
+        raise ValueError('{} is not a CMOST checkpoint (missing {})'.format(path, _STATE_FILE))
+    with open(state_file) as fh:
+        state = json.load(fh)
+    if state.get('format') != CHECKPOINT_FORMAT:
+        raise ValueError('unsupported checkpoint format {!r} in {}'.format(state.get('format'), path))
+
+    arrays = {}
+    for name in state['arrays']:
+        arrays[name] = np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode)
+    rng = state['rng']
+    rng_key = np.load(os.path.join(path, _RNG_KEY_FILE))
+    rng_state = (rng['name'], rng_key, rng['pos'], rng['has_gauss'], rng['cached_gaussian'])
+    return Checkpoint(path, state['year'], state['n'], arrays, state['scalars'],
+                      rng_state, state.get('meta', {}))
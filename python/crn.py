@@ -0,0 +1,107 @@
+"""
+crn.py -- Common random numbers for variance-reduced strategy comparisons.
+
+By default every random draw of NumberCrunching_100000 comes from the global
+numpy generator, so two runs that differ only in the screening strategy
+drift apart as soon as the first screening draw happens: from then on every
+patient's polyps, cancers and natural death are different, and incremental
+outcomes carry the full Monte-Carlo noise of both arms.
+
+With a CommonRandomNumbers object (calculate_sub(..., crn_seed=S)) the
+engine draws from two counter-based streams (numpy Philox) that are
+re-positioned at the start of every patient-year:
+
+    natural history    polyp onset and location, progression, healing,
+                       direct cancers, cancer stage and sojourn time,
+                       natural death                     key (S, patient)
+    intervention       screening adherence, detection, reach, complications,
+                       survival after diagnosis, special scenarios
+                                                         key (S, patient)
+
+The stream position depends only on (S, patient, year) and on the number of
+draws the patient made earlier in the same year, so intervention draws never
+shift natural-history draws into another year, and runs of different
+strategies with the same S see the same patients.  Differences between
+strategies then come from the interventions themselves.
+
+The cohort itself (gender, individual risk, survival tables) is drawn by
+calculate_sub from the global generator, so the same np.random.seed must be
+used in all compared runs as well.
+
+Runs in this mode are reproducible but do not reproduce the default mode.
+"""
+
+import numpy as np
+
+# stream index stored in the last word of the Philox counter
+_NATURAL_HISTORY = 0
+_INTERVENTION = 1
+
+
+class CommonRandomNumbers:
+    """
+    Per patient-year random streams for the engine.
+
+    Parameters
+    ----------
+    seed : int
+        Non-negative seed shared by all runs that are to be compared.
+    cohort_size : int or None
+        For stacked cohorts (rct.py): patients z and z + k * cohort_size are
+        twins and draw from the same streams.
+    """
+
+    def __init__(self, seed, cohort_size=None):
+        self.seed = int(seed)
+        if self.seed < 0:
+            raise ValueError('crn seed must be non-negative')
+        self.cohort_size = cohort_size
+        self._streams = {}
+        for stream in (_NATURAL_HISTORY, _INTERVENTION):
+            bitgen = np.random.Philox(key=[self.seed, 0])
+            state = bitgen.state
+            self._streams[stream] = (bitgen, np.random.Generator(bitgen), state)
+        self._saved = None
+
+    def start_patient(self, y, z):
+        """Position both streams at the start of patient z (0-based) in year y."""
+        if self.cohort_size:
+            z = z % self.cohort_size
+        for stream, (bitgen, _, state) in self._streams.items():
+            state['state']['key'][:] = (self.seed, z)
+            state['state']['counter'][:] = (0, 0, y, stream)
+            state['buffer_pos'] = 4
+            state['has_uint32'] = 0
+            bitgen.state = state
+
+    def attach(self, namespace):
+        """Route the engine's draw functions to the streams."""
+        if self._saved is not None:
+            raise RuntimeError('common random numbers are already attached')
+        self._saved = {'_rand_nh': namespace['_rand_nh'], '_rand': namespace['_rand']}
+        namespace['_rand_nh'] = self._streams[_NATURAL_HISTORY][1].random
+        namespace['_rand'] = self._streams[_INTERVENTION][1].random
+
+    def detach(self, namespace):
+        """Restore the draw functions replaced by attach()."""
+        if self._saved is None:
+            return
+        namespace.update(self._saved)
+        self._saved = None
+
+
+def paired_difference(outcome_a, outcome_b):
+    """
+    Mean and standard error of the per-patient difference outcome_b - outcome_a
+    between two runs of the same cohort (e.g. data['DeathYear'] of two
+    strategies run with the same seed and crn_seed).
+
+    Returns
+    -------
+    tuple : (mean, standard_error, n)
+    """
+    diff = np.asarray(outcome_b, dtype=float) - np.asarray(outcome_a, dtype=float)
+    n = diff.size
+    if n < 2:
+        return float(np.mean(diff)) if n else 0.0, float('nan'), n
+    return float(np.mean(diff)), float(np.std(diff, ddof=1) / np.sqrt(n)), n
@@ -0,0 +1,191 @@
+"""
+instrumentation.py -- Optional per-phase timing and event counts for
+NumberCrunching_100000.
+
+Pass an EngineInstrumentation object to the engine (or to calculate_sub)
+to find out where the time of a run goes:
+
+    instr = EngineInstrumentation()
+    handles, BM = calculate_sub(handles, instrumentation=instr)
+    print(instr.format_report())
+    report = handles['Instrumentation']       # same as instr.report()
+
+The engine calls lap(phase) at the end of every phase of the quarterly
+patient update; the time since the previous lap is booked to that phase.
+While attached, the module-level random draw functions and the
+Colonoscopy / RectoSigmo / AddCosts sub-functions of the engine are
+replaced by counting wrappers, so random numbers drawn and procedure calls
+are counted per simulated year; 'rand' counts numbers, not calls, so one
+_rand(2 * n) adds 2 * n.
+
+Without an instrumentation object the engine only pays one
+"is not None" test per phase, so it is safe to leave the hooks in
+production code.  The counting wrappers patch module globals and are
+therefore not meant for two instrumented runs in threads of the same
+process at the same time.
+"""
+
+import time
+
+import numpy as np
+
+
+# engine phases in the order in which they are executed
+PHASES = (
+    'year_setup',           # polyp rates for the year
+    'natural_death',
+    'cancer_death',
+    'polyp_onset',
+    'direct_cancer',
+    'polyp_progression',
+    'polyp_healing',
+    'symptoms',
+    'cancer_progression',
+    'surveillance',
+    'screening',
+    'special_scenarios',
+    'summary',              # per patient polyp and cancer summaries
+    'year_summary',         # cohort summary, printing and progress report
+)
+
+# event counters kept per simulated year
+EVENTS = ('rand', 'colonoscopy', 'rectosigmo', 'add_costs')
+
+# engine module globals replaced by counting wrappers while attached
+_WRAPPED = {
+    '_rand': 'rand',
+    '_rand_nh': 'rand',
+    'Colonoscopy': 'colonoscopy',
+    'RectoSigmo': 'rectosigmo',
+    'AddCosts': 'add_costs',
+}
+
+
+class EngineInstrumentation:
+    """
+    Accumulates wall time and call counts per engine phase and event
+    counts per simulated year.
+
+    Parameters
+    ----------
+    max_years : int
+        Number of year slots for the per-year counters (the engine
+        simulates at most 100 years).
+    """
+
+    def __init__(self, max_years=100):
+        self.max_years = max_years
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.calls = dict.fromkeys(PHASES, 0)
+        self.year_seconds = np.zeros(max_years)
+        self.events = {e: np.zeros(max_years, dtype=np.int64) for e in EVENTS}
+        self.years = 0
+        self.total_seconds = 0.0
+        self._yi = 0
+        self._last = None
+        self._year_start = None
+        self._run_start = None
+        self._saved = None
+
+    # ------------------------------------------------------------------
+    # hooks called by the engine
+    # ------------------------------------------------------------------
+    def attach(self, namespace):
+        """Replace the counted functions in the engine namespace."""
+        if self._saved is not None:
+            raise RuntimeError('instrumentation is already attached')
+        self._saved = {}
+        for name, event in _WRAPPED.items():
+            original = namespace[name]
+            self._saved[name] = original
+            namespace[name] = self._counting(original, self.events[event],
+                                             draws=(event == 'rand'))
+        self._run_start = time.perf_counter()
+
+    def detach(self, namespace):
+        """Restore the functions replaced by attach()."""
+        if self._saved is None:
+            return
+        namespace.update(self._saved)
+        self._saved = None
+        if self._run_start is not None:
+            self.total_seconds += time.perf_counter() - self._run_start
+            self._run_start = None
+
+    def _counting(self, func, counter, draws=False):
+        def wrapper(*args, **kwargs):
+            result = func(*args, **kwargs)
+            # random draws count the numbers drawn (array size), not the calls
+            counter[self._yi] += np.size(result) if draws else 1
+            return result
+        wrapper.__wrapped__ = func
+        return wrapper
+
+    def begin_year(self, y):
+        """Start timing simulated year y (1-based)."""
+        self._yi = min(y, self.max_years) - 1
+        self.years = max(self.years, y)
+        self._year_start = self._last = time.perf_counter()
+
+    def lap(self, phase):
+        """Book the time since the previous lap to `phase`."""
+        now = time.perf_counter()
+        self.seconds[phase] += now - self._last
+        self.calls[phase] += 1
+        self._last = now
+
+    def end_year(self):
+        """Close the current year; call after the final lap of the year."""
+        self.year_seconds[self._yi] += self._last - self._year_start
+
+    # ------------------------------------------------------------------
+    # results
+    # ------------------------------------------------------------------
+    def report(self):
+        """
+        Return the collected figures as a dict.
+
+        Keys
+        ----
+        total_seconds : wall time of the engine run(s)
+        years         : number of simulated years
+        phases        : {phase: {'seconds', 'calls', 'share'}} where share
+                        is the fraction of the timed engine time
+        per_year      : {'seconds': array, <event>: array} trimmed to the
+                        simulated years; events are rand, colonoscopy,
+                        rectosigmo and add_costs
+        totals        : {<event>: int} summed over all years
+        """
+        timed = sum(self.seconds.values())
+        phases = {}
+        for phase in PHASES:
+            phases[phase] = {
+                'seconds': self.seconds[phase],
+                'calls': self.calls[phase],
+                'share': self.seconds[phase] / timed if timed > 0 else 0.0,
+            }
+        per_year = {'seconds': self.year_seconds[:self.years].copy()}
+        for event in EVENTS:
+            per_year[event] = self.events[event][:self.years].copy()
+        return {
+            'total_seconds': self.total_seconds,
+            'years': self.years,
+            'phases': phases,
+            'per_year': per_year,
+            'totals': {e: int(np.sum(self.events[e])) for e in EVENTS},
+        }
+
+    def format_report(self):
+        """Human readable table of report()."""
+        rep = self.report()
+        lines = ['Engine time {:.2f} s over {} years'.format(
+            rep['total_seconds'], rep['years'])]
+        lines.append('  {:<20} {:>10} {:>7} {:>14}'.format(
+            'phase', 'seconds', 'share', 'calls'))
+        for phase in PHASES:
+            ph = rep['phases'][phase]
+            lines.append('  {:<20} {:>10.3f} {:>6.1f}% {:>14d}'.format(
+                phase, ph['seconds'], 100 * ph['share'], ph['calls']))
+        lines.append('  ' + ', '.join(
+            '{} {}'.format(e, rep['totals'][e]) for e in EVENTS))
+        return '\n'.join(lines)
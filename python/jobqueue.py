@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+jobqueue.py -- Queue of settings files on a shared filesystem, worked off by
+any number of worker processes on any number of hosts.
+
+Replaces Cluster/CMOSTCluster.m and the bash submit scripts (submit_standard,
+Calib_submit), which submitted every settings file without a _Results file
+to the cluster scheduler.  Here the queue is a directory
+
+    QUEUE/pending/   settings files waiting to be run (.py, .pkl, .mat)
+    QUEUE/claimed/   settings files being run, one per worker
+    QUEUE/done/      settings files of finished runs
+    QUEUE/failed/    settings files that failed max_attempts times, with
+                     <name>.error.txt
+    QUEUE/results/   <name>_Results.npz written by Evaluation
+    QUEUE/meta/      <name>.json: seed, attempts and history of every job
+
+and scaling out is starting more workers, on any host that sees QUEUE:
+
+    python jobqueue.py submit QUEUE settings/*.pkl
+    python jobqueue.py work QUEUE            # as many as you like
+    python jobqueue.py status QUEUE
+
+  * A worker claims a job by renaming it from pending/ to claimed/; the
+    rename is atomic, so exactly one worker gets every job.
+  * While a job runs, its worker touches the claimed file every
+    `heartbeat` seconds.  A claimed file whose modification time is older
+    than `stale_after` seconds belongs to a dead worker; the next worker
+    that looks moves it back to pending/ (again by rename), counting an
+    attempt.
+  * Runs are headless (DispFlag, ExcelFlag off, ResultsFlag on, as in
+    CMOSTCluster.m).  Evaluation writes into a private directory and the
+    files are renamed into results/, so results/ only ever holds complete
+    files.
+  * With  work --registry FILE  every published run is added to a run
+    registry (run_registry.py) with its settings as parameters; keep the
+    registry on a local disk, one per host.
+  * Seeds are deterministic per job (job_seed: base seed and job name)
+    instead of pid * clock, so a reclaimed or retried job gives the same
+    results wherever it runs.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import socket
+import sys
+import threading
+import time
+import traceback
+
+_this_dir = os.path.dirname(os.path.abspath(__file__))
+if _this_dir not in sys.path:
+    sys.path.insert(0, _this_dir)
+
+from run_registry import RunRegistry
+from settings_io import SETTINGS_EXTENSIONS, load_settings, settings_files
+
+QUEUE_DIRS = ('pending', 'claimed', 'done', 'failed', 'results', 'meta')
+
+
+def job_seed(name, base_seed=0):
+    """Seed of job `name`: the same on every host, worker and attempt."""
+    digest = hashlib.sha256('{}:{}'.format(base_seed, name).encode('utf-8')).digest()
+    return int.from_bytes(digest[:4], 'little')
+
+
+def _job_name(filename):
+    return os.path.splitext(os.path.basename(filename))[0]
+
+
+class JobQueue:
+    """
+    A queue directory (see the module docstring).
+
+    Parameters
+    ----------
+    path : str
+        Queue directory; created with its subdirectories if missing.
+    base_seed : int
+        Mixed into every job seed (job_seed).
+    max_attempts : int
+        Runs (failures or stale claims) before a job is moved to failed/.
+    stale_after : float
+        Seconds without a heartbeat after which a claim is reclaimed.
+    """
+
+    def __init__(self, path, base_seed=0, max_attempts=3, stale_after=600.0):
+        self.path = path
+        self.base_seed = base_seed
+        self.max_attempts = max_attempts
+        self.stale_after = stale_after
+        for sub in QUEUE_DIRS:
+            os.makedirs(self.dir(sub), exist_ok=True)
+
+    def dir(self, sub):
+        return os.path.join(self.path, sub)
+
+    # ------------------------------------------------------------------
+    # jobs and their metadata
+    # ------------------------------------------------------------------
+    def submit(self, filename, name=None):
+        """
+        Copy a settings file into pending/ and return the job name.
+        A job of that name must not be queued already.
+        """
+        ext = os.path.splitext(filename)[1].lower()
+        if ext not in SETTINGS_EXTENSIONS:
+            raise ValueError('not a settings file: {}'.format(filename))
+        name = name or _job_name(filename)
+        if self.state(name) is not None:
+            raise ValueError('job {!r} is already in the queue'.format(name))
+        self._write_meta(name, {'name': name, 'seed': job_seed(name, self.base_seed),
+                                'attempts': 0, 'history': []})
+        tmp = os.path.join(self.dir('pending'), '.{}{}.tmp'.format(name, ext))
+        shutil.copyfile(filename, tmp)
+        os.rename(tmp, os.path.join(self.dir('pending'), name + ext))
+        return name
+
+    def jobs(self, sub):
+        """Settings files in one of pending/, claimed/, done/, failed/."""
+        return settings_files(self.dir(sub))
+
+    def state(self, name):
+        """'pending', 'claimed', 'done', 'failed' or None for job `name`."""
+        for sub in ('pending', 'claimed', 'done', 'failed'):
+            for ext in SETTINGS_EXTENSIONS:
+                if os.path.exists(os.path.join(self.dir(sub), name + ext)):
+                    return sub
+        return None
+
+    def status(self):
+        """Number of jobs per state."""
+        return {sub: len(self.jobs(sub)) for sub in ('pending', 'claimed', 'done', 'failed')}
+
+    def meta(self, name):
+        """Metadata of job `name` (seed, attempts, history)."""
+        path = os.path.join(self.dir('meta'), name + '.json')
+        if os.path.exists(path):
+            with open(path) as fh:
+                return json.load(fh)
+        # dropped into pending/ by hand
+        return {'name': name, 'seed': job_seed(name, self.base_seed),
+                'attempts': 0, 'history': []}
+
+    def _write_meta(self, name, meta):
+        # only the holder of a claim (or the submitter) writes the metadata
+        path = os.path.join(self.dir('meta'), name + '.json')
+        tmp = path + '.{}.tmp'.format(os.getpid())
+        with open(tmp, 'w') as fh:
+            json.dump(meta, fh, indent=1)
+        os.replace(tmp, path)
+
+    def _record(self, name, worker, event, **fields):
+        meta = self.meta(name)
+        if event != 'done':
+            meta['attempts'] += 1
+        meta['history'].append(dict(fields, event=event, worker=worker, time=time.time()))
+        self._write_meta(name, meta)
+        return meta
+
+    # ------------------------------------------------------------------
+    # claiming
+    # ------------------------------------------------------------------
+    def claim(self, worker):
+        """
+        Claim the next pending job; returns the claimed path or None if
+        nothing is pending.
+        """
+        for path in self.jobs('pending'):
+            target = os.path.join(self.dir('claimed'), os.path.basename(path))
+            try:
+                # a fresh modification time travels with the rename, so the
+                # claim is never mistaken for a stale one
+                os.utime(path)
+                os.rename(path, target)
+            except FileNotFoundError:
+                continue                # another worker was faster
+            return target
+        return None
+
+    def reclaim_stale(self, worker):
+        """Move claims without a recent heartbeat back to pending/."""
+        reclaimed = []
+        now = time.time()
+        for path in self.jobs('claimed'):
+            try:
+                age = now - os.path.getmtime(path)
+            except FileNotFoundError:
+                continue
+            if age < self.stale_after:
+                continue
+            name = _job_name(path)
+            held = os.path.join(self.dir('claimed'), '.{}.reclaim'.format(os.path.basename(path)))
+            try:
+                os.rename(path, held)
+            except FileNotFoundError:
+                continue
+            meta = self._record(name, worker, 'stale', seconds=age)
+            self._release(held, os.path.basename(path), meta,
+                          'claim of a dead worker (no heartbeat for {:.0f} s)'.format(age))
+            reclaimed.append(name)
+        return reclaimed
+
+    def _release(self, path, filename, meta, error):
+        """Put a claimed job back to pending/, or to failed/ after max_attempts."""
+        if meta['attempts'] >= self.max_attempts:
+            with open(os.path.join(self.dir('failed'), meta['name'] + '.error.txt'), 'w') as fh:
+                fh.write(error)
+            os.rename(path, os.path.join(self.dir('failed'), filename))
+        else:
+            os.rename(path, os.path.join(self.dir('pending'), filename))
+
+    # ------------------------------------------------------------------
+    # running
+    # ------------------------------------------------------------------
+    def run_claimed(self, path, worker, heartbeat=30.0, registry=None):
+        """
+        Run a claimed job headless, publish its results and move it to
+        done/ (or back to pending/ / to failed/).  Returns True on success.
+
+        A run_registry.RunRegistry `registry` gets the published results
+        file of a successful run.
+        """
+        name = _job_name(path)
+        meta = self.meta(name)
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(heartbeat):
+                try:
+                    os.utime(path)
+                except FileNotFoundError:
+                    return              # reclaimed: this run is a duplicate
+
+        beater = threading.Thread(target=beat, daemon=True)
+        beater.start()
+        scratch = os.path.join(self.dir('results'), '.{}.{}'.format(name, worker))
+        start = time.perf_counter()
+        try:
+            handles, _ = run_settings(path, name, meta['seed'], scratch)
+        except Exception:
+            error = traceback.format_exc()
+            ok = False
+        else:
+            ok = True
+        finally:
+            stop.set()
+            beater.join()
+        seconds = time.perf_counter() - start
+
+        if not os.path.exists(path):
+            # claim was taken over while running; the other run publishes
+            shutil.rmtree(scratch, ignore_errors=True)
+            return False
+        if ok:
+            for filename in os.listdir(scratch):
+                os.replace(os.path.join(scratch, filename),
+                           os.path.join(self.dir('results'), filename))
+            shutil.rmtree(scratch, ignore_errors=True)
+            if registry is not None:
+                try:
+                    registry.register(os.path.join(self.dir('results'), name + '_Results.npz'),
+                                      handles['Variables'])
+                except Exception as e:
+                    print('{}: not registered ({})'.format(name, e))
+            self._record(name, worker, 'done', seconds=seconds)
+            os.rename(path, os.path.join(self.dir('done'), os.path.basename(path)))
+            return True
+        shutil.rmtree(scratch, ignore_errors=True)
+        meta = self._record(name, worker, 'failed', seconds=seconds,
+                            error=error.strip().splitlines()[-1])
+        self._release(path, os.path.basename(path), meta, error)
+        return False
+
+
+def _load_with_retries(path, tries=3, wait=1.0):
+    """load_settings, retried for shared filesystems (as CMOSTCluster.m)."""
+    for attempt in range(tries):
+        variables = load_settings(path)
+        if variables is not None:
+            return variables
+        if attempt + 1 < tries:
+            time.sleep(wait)
+    raise ValueError('could not load settings from {}'.format(path))
+
+
+def run_settings(path, name, seed, results_path):
+    """Run one settings file headless, writing Evaluation's files to results_path."""
+    from calculate_sub import calculate_sub
+
+    variables = _load_with_retries(path)
+    # no Excel and no figures; results files as on the cluster
+    variables['DispFlag'] = False
+    variables['ResultsFlag'] = True
+    variables['ExcelFlag'] = False
+    variables['Settings_Name'] = name
+    variables['ResultsPath'] = results_path
+    os.makedirs(results_path, exist_ok=True)
+    handles, BM = calculate_sub({'Variables': variables}, seed=seed)
+    if BM is None:
+        raise RuntimeError('simulation of {} returned no benchmarks'.format(name))
+    return handles, BM
+
+
+def worker_id():
+    """host-pid of this process."""
+    return '{}-{}'.format(socket.gethostname(), os.getpid())
+
+
+def run_worker(queue, poll=10.0, heartbeat=30.0, idle_exit=None, max_jobs=None,
+               registry=None, log=print):
+    """
+    Work off jobs until the queue stays empty for idle_exit seconds (never
+    with None) or max_jobs jobs were run.  Finished runs are added to
+    `registry` (a run_registry.RunRegistry or its file), if given.
+
+    Returns the number of jobs this worker ran.
+    """
+    if isinstance(registry, str):
+        registry = RunRegistry(registry)
+    worker = worker_id()
+    ran = 0
+    idle_since = time.time()
+    while max_jobs is None or ran < max_jobs:
+        for name in queue.reclaim_stale(worker):
+            log('{}: reclaimed stale job {}'.format(worker, name))
+        path = queue.claim(worker)
+        if path is None:
+            if idle_exit is not None and time.time() - idle_since >= idle_exit:
+                break
+            time.sleep(poll)
+            continue
+        name = _job_name(path)
+        log('{}: running {}'.format(worker, name))
+        ok = queue.run_claimed(path, worker, heartbeat=heartbeat, registry=registry)
+        log('{}: {} {}'.format(worker, name, 'done' if ok else 'failed'))
+        ran += 1
+        idle_since = time.time()
+    return ran
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Shared-filesystem queue of CMOST runs.')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='base seed mixed into every job seed')
+    parser.add_argument('--max-attempts', type=int, default=3)
+    parser.add_argument('--stale-after', type=float, default=600.0,
+                        help='seconds without heartbeat before a claim is reclaimed')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('submit', help='add settings files or directories')
+    p.add_argument('queue')
+    p.add_argument('paths', nargs='+')
+    p = sub.add_parser('work', help='run jobs')
+    p.add_argument('queue')
+    p.add_argument('--poll', type=float, default=10.0)
+    p.add_argument('--heartbeat', type=float, default=30.0)
+    p.add_argument('--idle-exit', type=float, default=None,
+                   help='stop after this many seconds without work')
+    p.add_argument('--max-jobs', type=int, default=None)
+    p.add_argument('--registry', default=None,
+                   help='SQLite run registry the finished runs are added to')
+    p = sub.add_parser('status', help='count jobs per state')
+    p.add_argument('queue')
+    args = parser.parse_args(argv)
+
+    queue = JobQueue(args.queue, base_seed=args.seed, max_attempts=args.max_attempts,
+                     stale_after=args.stale_after)
+    if args.command == 'submit':
+        for path in args.paths:
+            for filename in (settings_files(path) if os.path.isdir(path) else [path]):
+                print('submitted', queue.submit(filename))
+    elif args.command == 'work':
+        ran = run_worker(queue, poll=args.poll, heartbeat=args.heartbeat,
+                         idle_exit=args.idle_exit, max_jobs=args.max_jobs,
+                         registry=args.registry)
+        print('{} jobs run'.format(ran))
+    else:
+        for state, count in queue.status().items():
+            print('{:<8} {}'.format(state, count))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
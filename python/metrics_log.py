@@ -0,0 +1,96 @@
+"""
+metrics_log.py -- Streaming per-year metrics written while the engine runs.
+
+NumberCrunching_100000 (and calculate_sub) accept a `metrics_log` argument,
+either a file name or a YearMetricsLog.  After every simulated year one flat
+record is appended and the file is flushed, so long runs can be followed
+with  tail -f  or a dashboard that polls the file.
+
+The format follows the file extension: '.csv' writes a header line followed
+by one row per year, anything else writes JSON Lines (one object per line).
+
+Record fields (counts refer to the simulated year unless noted):
+    year                        simulated year (1-based, = age)
+    included, alive             patients still included / alive
+    polyp_stage_1..6            included patients by most advanced polyp
+    cancers_direct              cancers arising directly (no polyp)
+    cancers_progressed          cancers progressed from advanced polyps
+    cancers_fast                fast cancers arising from early polyps
+    deaths_natural, deaths_cancer, deaths_colonoscopy
+    colo_screening, colo_symptoms, colo_follow_up, colo_baseline
+    rectosigmo
+    money_treatment, money_future_treatment, money_screening,
+    money_follow_up, money_other
+                                cumulative costs booked so far
+    wall_seconds                wall time spent on this year
+"""
+
+import csv
+import json
+
+FIELDS = (
+    'year', 'included', 'alive',
+    'polyp_stage_1', 'polyp_stage_2', 'polyp_stage_3',
+    'polyp_stage_4', 'polyp_stage_5', 'polyp_stage_6',
+    'cancers_direct', 'cancers_progressed', 'cancers_fast',
+    'deaths_natural', 'deaths_cancer', 'deaths_colonoscopy',
+    'colo_screening', 'colo_symptoms', 'colo_follow_up', 'colo_baseline',
+    'rectosigmo',
+    'money_treatment', 'money_future_treatment', 'money_screening',
+    'money_follow_up', 'money_other',
+    'wall_seconds',
+)
+
+
+class YearMetricsLog:
+    """
+    Append-only per-year metrics file.
+
+    Parameters
+    ----------
+    target : str or file object
+        File name, or an already opened text file.
+    fmt : {'jsonl', 'csv'} or None
+        Output format; inferred from the file name if None.
+    append : bool
+        Append to an existing file instead of truncating it.
+    """
+
+    def __init__(self, target, fmt=None, append=False):
+        if hasattr(target, 'write'):
+            self._fh = target
+            self._owned = False
+            name = getattr(target, 'name', '')
+        else:
+            self._fh = open(target, 'a' if append else 'w', newline='')
+            self._owned = True
+            name = target
+        if fmt is None:
+            fmt = 'csv' if str(name).lower().endswith('.csv') else 'jsonl'
+        if fmt not in ('jsonl', 'csv'):
+            raise ValueError("metrics log format must be 'jsonl' or 'csv', got {!r}".format(fmt))
+        self.fmt = fmt
+        self._writer = None
+        if fmt == 'csv':
+            self._writer = csv.DictWriter(self._fh, fieldnames=FIELDS)
+            if not (append and self._fh.tell() > 0):
+                self._writer.writeheader()
+
+    def write(self, record):
+        """Write one record (a dict with the keys in FIELDS) and flush."""
+        if self.fmt == 'csv':
+            self._writer.writerow(record)
+        else:
+            self._fh.write(json.dumps(record) + '\n')
+        self._fh.flush()
+
+    def close(self):
+        """Close the file if it was opened by this object."""
+        if self._owned and not self._fh.closed:
+            self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
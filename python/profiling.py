@@ -0,0 +1,196 @@
+"""
+profiling.py -- Reproducible profiles of calculate_sub / NumberCrunching_100000
+/ Evaluation on a fixed-size sub-cohort.
+
+profile_run() runs the whole pipeline for `patients` patients under cProfile
+and, at the same time, a light stack sampler.  Two artifacts are written:
+
+    <Settings_Name>_n<patients>_<backend>_profile.pstats
+        cProfile statistics; open with  python -m pstats <file>  or snakeviz
+    <Settings_Name>_n<patients>_<backend>_profile.speedscope.json
+        sampled stacks in speedscope format (https://www.speedscope.app),
+        viewable as a flamegraph
+
+By default they go to Variables['ResultsPath'] (falling back to the current
+directory if that path does not exist on this machine).  The random
+generator is seeded so that the same settings, seed and patient count
+always profile the same simulation.
+
+Usage from the command line:
+
+    python run_100k_benchmark.py --profile [--profile-patients 2000]
+                                          [--profile-dir DIR] [--seed 42]
+"""
+
+import copy
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+
+import numpy as np
+
+_this_dir = os.path.dirname(os.path.abspath(__file__))
+if _this_dir not in sys.path:
+    sys.path.insert(0, _this_dir)
+
+from calculate_sub import calculate_sub
+from NumberCrunching_100000 import ENGINE_BACKEND
+
+
+class StackSampler:
+    """
+    Periodically record the Python call stack of one thread.
+
+    The sampler runs in a daemon thread and reads the target thread's
+    current frame via sys._current_frames(); because of the GIL the
+    effective interval is bounded below by sys.getswitchinterval().
+    """
+
+    def __init__(self, thread_ident=None, interval=0.001):
+        self.thread_ident = thread_ident or threading.get_ident()
+        self.interval = interval
+        self.frames = []            # speedscope frame records
+        self._frame_index = {}      # (name, file, line) -> index
+        self.samples = []           # lists of frame indices, root first
+        self.weights = []           # seconds represented by each sample
+        self._stop = threading.Event()
+        self._thread = None
+        self.start_time = None
+        self.end_time = None
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='StackSampler',
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.end_time = time.perf_counter()
+
+    def _frame_id(self, code):
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        idx = self._frame_index.get(key)
+        if idx is None:
+            idx = len(self.frames)
+            self._frame_index[key] = idx
+            self.frames.append({'name': code.co_name,
+                                'file': code.co_filename,
+                                'line': code.co_firstlineno})
+        return idx
+
+    def _run(self):
+        last = self.start_time
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_ident)
+            now = time.perf_counter()
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_id(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append(stack)
+            self.weights.append(now - last)
+            last = now
+
+    def to_speedscope(self, name):
+        """Return the samples as a speedscope 'sampled' profile document."""
+        total = float(sum(self.weights))
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': name,
+            'exporter': 'CMOST profiling.py',
+            'activeProfileIndex': 0,
+            'shared': {'frames': self.frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'seconds',
+                'startValue': 0.0,
+                'endValue': total,
+                'samples': self.samples,
+                'weights': self.weights,
+            }],
+        }
+
+
+def profile_label(variables, patients):
+    """File label: <Settings_Name>_n<patients>_<backend>."""
+    name = str(variables.get('Settings_Name', '') or 'settings')
+    name = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in name)
+    return '{}_n{}_{}'.format(name, patients, ENGINE_BACKEND)
+
+
+def profile_run(variables, patients=2000, out_dir=None, seed=42,
+                sample_interval=0.001, print_top=25):
+    """
+    Profile calculate_sub (engine and Evaluation) on a sub-cohort.
+
+    Parameters
+    ----------
+    variables : dict
+        Settings (handles['Variables']); not modified.
+    patients : int
+        Size of the profiled cohort (Number_patients is overridden).
+    out_dir : str or None
+        Directory for the artifacts; defaults to variables['ResultsPath'].
+    seed : int or None
+        Seed for np.random before the run (None leaves the generator alone).
+    sample_interval : float
+        Stack sampler interval in seconds.
+    print_top : int
+        Print the top functions by cumulative time (0 to disable).
+
+    Returns
+    -------
+    tuple : (handles, paths)
+        handles : dict returned by calculate_sub
+        paths : dict with keys 'pstats' and 'speedscope'
+    """
+    variables = copy.deepcopy(variables)
+    variables['Number_patients'] = int(patients)
+    # a profiling run must not overwrite the results of a real run
+    variables['ResultsFlag'] = False
+
+    if out_dir is None:
+        out_dir = variables.get('ResultsPath', '')
+        if not out_dir or not os.path.isdir(out_dir):
+            out_dir = os.getcwd()
+    os.makedirs(out_dir, exist_ok=True)
+    label = profile_label(variables, patients)
+    base = os.path.join(out_dir, label + '_profile')
+
+    if seed is not None:
+        np.random.seed(seed)
+
+    sampler = StackSampler(interval=sample_interval)
+    profiler = cProfile.Profile()
+    sampler.start()
+    profiler.enable()
+    try:
+        handles, _ = calculate_sub({'Variables': variables})
+    finally:
+        profiler.disable()
+        sampler.stop()
+
+    paths = {'pstats': base + '.pstats',
+             'speedscope': base + '.speedscope.json'}
+    profiler.dump_stats(paths['pstats'])
+    title = '{} (seed {})'.format(label, seed)
+    with open(paths['speedscope'], 'w') as fh:
+        json.dump(sampler.to_speedscope(title), fh)
+
+    if print_top:
+        stats = pstats.Stats(profiler)
+        stats.sort_stats('cumulative').print_stats(print_top)
+    print('Profile written to {}'.format(paths['pstats']))
+    print('Flamegraph written to {}'.format(paths['speedscope']))
+    return handles, paths
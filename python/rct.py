@@ -0,0 +1,253 @@
+"""
+rct.py -- Emulate the rectosigmoidoscopy screening trials with paired
+control and intervention arms in one simulation.
+
+The RS-Atkin, RS-Schoen, RS-Segnan and RS-Holme special scenarios and their
+_Mock controls are eight separate full-cohort runs, which is what Step 4 of
+the calibration (RSRCT benchmarks) spends most of its time on.  With
+
+    results = run_rct(variables, seed=42, crn_seed=1)
+    results['Atkin']['IncRedOverall'], results['All']['MortRed']
+
+or  calculate_sub(handles, rct_trials=RCT_TRIALS, crn_seed=1)  (results in
+handles['RCT']), the cohort drawn by calculate_sub is stacked into one
+control (Mock) and one intervention arm per trial and all arms run in a
+single engine call:
+
+  * enrollment (randomization year, attendance and the Schoen repeat test)
+    is drawn vectorized, once per trial, and shared by both arms;
+  * the twins of a patient in all arms have the same gender, individual
+    risk and screening preference and, with common random numbers keyed by
+    the patient of the base cohort (crn.py), the same natural history until
+    a rectosigmoidoscopy changes it;
+  * trial-window outcomes -- colorectal cancer incidence (overall, distal,
+    proximal) and colorectal cancer mortality from randomization on -- are
+    aggregated per arm from the engine output, with standard errors from
+    the paired twin differences.
+
+Screening should be off and SpecialFlag on, as in Automatic_RS_Screen.m;
+run_rct() sets both.  The randomization ages and attendance rates are the
+ones of the single-trial scenarios (NumberCrunching_100000.RS_TRIAL_ENROLLMENT).
+"""
+
+import copy
+import os
+import sys
+import warnings
+
+import numpy as np
+
+_this_dir = os.path.dirname(os.path.abspath(__file__))
+if _this_dir not in sys.path:
+    sys.path.insert(0, _this_dir)
+
+from NumberCrunching_100000 import _trial_enrollment
+from crn import paired_difference
+
+RCT_TRIALS = ('Atkin', 'Schoen', 'Segnan', 'Holme')
+
+# years of follow-up after randomization (median follow-up of the trials)
+FOLLOW_UP = {'Atkin': 11, 'Schoen': 12, 'Segnan': 11, 'Holme': 11}
+
+# cancers at locations 7-13 (1 = cecum, 13 = rectum), the segments within
+# reach of most rectosigmoidoscopies, count as distal ('Left')
+DISTAL_FROM = 7
+
+# engine flags of the special scenarios (SpecialText); every arm clears all
+# of them and sets only its trial (and Mock for the control arm)
+SPECIAL_FLAGS = ('Schoen', 'Holme', 'Segnan', 'Atkin', 'perfect', 'Mock',
+                 'Kolo1', 'Kolo2', 'Kolo3', 'Po55', 'treated', 'AllPolypFollowUp')
+
+
+class TrialDesign:
+    """
+    Stacked cohort of trial arms for NumberCrunching_100000(trial_design=...).
+
+    Patient z belongs to group z // cohort_size; group 2 * t is the control
+    (Mock) arm and group 2 * t + 1 the intervention arm of trials[t].
+
+    Parameters
+    ----------
+    flag : dict
+        Engine flags of the settings (from calculate_sub).
+    trials : sequence of str
+        Trials to emulate, a subset of RCT_TRIALS.
+    cohort_size : int
+        Patients per arm.
+    draw : callable
+        Uniform random numbers of a given shape (np.random.random).
+
+    Attributes
+    ----------
+    arm : (n,) int array
+        Group of every patient of the stacked cohort.
+    flags : list of dict
+        Engine flags per group.
+    included, test_year, test_year2 : (n,) float arrays
+        Enrollment (Last.Included, Last.TestYear, Last.TestYear2).
+    """
+
+    def __init__(self, flag, trials, cohort_size, draw=np.random.random):
+        unknown = [t for t in trials if t not in RCT_TRIALS]
+        if unknown or not trials:
+            raise ValueError('trials must be a non-empty subset of {}, got {}'.format(
+                RCT_TRIALS, list(trials)))
+        if flag.get('Screening'):
+            warnings.warn('screening is on: the control arms get screening colonoscopies too')
+        self.trials = tuple(trials)
+        self.cohort_size = int(cohort_size)
+        self.flags = []
+        included, test_year, test_year2 = [], [], []
+        for trial in self.trials:
+            arm_flag = dict(flag, **dict.fromkeys(SPECIAL_FLAGS, False))
+            arm_flag['SpecialFlag'] = True
+            arm_flag[trial] = True
+            self.flags.append(dict(arm_flag, Mock=True))
+            self.flags.append(arm_flag)
+            enrollment = _trial_enrollment(trial, draw((self.cohort_size, 5)))
+            for stacked, arrays in zip((included, test_year, test_year2), enrollment):
+                stacked.extend((arrays, arrays))
+        self.arm = np.repeat(np.arange(self.groups), self.cohort_size)
+        self.included = np.concatenate(included)
+        self.test_year = np.concatenate(test_year)
+        self.test_year2 = np.concatenate(test_year2)
+
+    @property
+    def groups(self):
+        """Number of stacked arms."""
+        return len(self.flags)
+
+    def members(self, trial, intervention):
+        """Slice of the stacked cohort holding one arm of a trial."""
+        g = 2 * self.trials.index(trial) + int(bool(intervention))
+        return slice(g * self.cohort_size, (g + 1) * self.cohort_size)
+
+
+def _reduction(control, intervention):
+    return 100.0 * (1.0 - intervention / control) if control > 0 else float('nan')
+
+
+def _summary(outcomes):
+    """Arm totals, reductions in percent and their paired standard errors."""
+    result = {'follow_up': outcomes['follow_up']}
+    for arm in ('control', 'intervention'):
+        result[arm] = {key: int(np.sum(outcomes[key][arm]))
+                       for key in ('randomized', 'attended', 'cases', 'cases_distal',
+                                   'cases_proximal', 'deaths')}
+    for name, key in (('IncRedOverall', 'cases'), ('IncRedLeft', 'cases_distal'),
+                      ('IncRedRight', 'cases_proximal'), ('MortRed', 'deaths')):
+        control = result['control'][key]
+        result[name] = _reduction(control, result['intervention'][key])
+        _, se, pairs = paired_difference(outcomes[key]['control'], outcomes[key]['intervention'])
+        result[name + 'SE'] = 100.0 * se * pairs / control if control > 0 else float('nan')
+    return result
+
+
+def evaluate_trials(data, design, follow_up=None):
+    """
+    Trial-window outcomes per trial and pooled over all trials ('All').
+
+    A patient counts as randomized if not excluded at the randomization
+    year (Last.Included != -1) and alive after it (as in RS_Evaluation.m).
+    Cancers (TumorRecord) and colorectal cancer deaths of randomized
+    patients in the follow_up years from the randomization year on are
+    counted per arm.
+
+    Parameters
+    ----------
+    data : dict
+        handles['data'] of a calculate_sub(..., rct_trials=...) run.
+    design : TrialDesign
+    follow_up : dict, optional
+        Years of follow-up per trial, overriding FOLLOW_UP.
+
+    Returns
+    -------
+    dict : trial name (and 'All') -> {'follow_up', 'control', 'intervention',
+        'IncRedOverall', 'IncRedLeft', 'IncRedRight', 'MortRed' and their
+        '...SE'}; arms hold randomized, attended, cases, cases_distal,
+        cases_proximal and deaths.
+    """
+    follow_up = dict(FOLLOW_UP, **(follow_up or {}))
+    included = np.asarray(data['Last']['Included'], dtype=float)
+    attended = np.asarray(data['Last']['TestDone']) == 1
+    death_year = np.asarray(data['DeathYear'], dtype=float)
+    death_cause = np.asarray(data['DeathCause'])
+    n = len(included)
+    randomized = (included > 0) & (death_year > included)
+
+    # diagnosed cancers: one TumorRecord entry per patient and year
+    patient_number = np.asarray(data['TumorRecord']['PatientNumber'])
+    rows, cols = np.nonzero(patient_number)
+    patient = patient_number[rows, cols].astype(int) - 1
+    since = rows + 1 - included[patient]
+    distal = np.asarray(data['TumorRecord']['Location'])[rows, cols] >= DISTAL_FROM
+
+    results = {}
+    pooled = {}
+    for trial in design.trials:
+        years = follow_up[trial]
+        in_window = randomized[patient] & (since >= 0) & (since < years)
+        per_patient = {
+            'randomized': randomized,
+            'attended': randomized & attended,
+            'cases': np.bincount(patient[in_window], minlength=n),
+            'cases_distal': np.bincount(patient[in_window & distal], minlength=n),
+            'cases_proximal': np.bincount(patient[in_window & ~distal], minlength=n),
+            'deaths': randomized & (death_cause == 2) & (death_year - included < years),
+        }
+        outcomes = {'follow_up': years}
+        for key, values in per_patient.items():
+            outcomes[key] = {arm: values[design.members(trial, arm == 'intervention')].astype(float)
+                             for arm in ('control', 'intervention')}
+            for arm, arm_values in outcomes[key].items():
+                pooled.setdefault(key, {}).setdefault(arm, []).append(arm_values)
+        results[trial] = _summary(outcomes)
+        if all(np.array_equal(outcomes[key]['control'], outcomes[key]['intervention'])
+               for key in ('attended', 'cases', 'deaths')):
+            warnings.warn('the control and intervention arms of {} have the same attendance, '
+                          'cancers and deaths; check the special-scenario flags'.format(trial))
+
+    pooled = {key: {arm: np.concatenate(parts) for arm, parts in arms.items()}
+              for key, arms in pooled.items()}
+    pooled['follow_up'] = {t: follow_up[t] for t in design.trials}
+    results['All'] = _summary(pooled)
+    return results
+
+
+def run_rct(variables, trials=RCT_TRIALS, seed=42, crn_seed=1, follow_up=None):
+    """
+    Emulate the given trials with paired arms in one run.
+
+    Parameters
+    ----------
+    variables : dict
+        Settings (handles['Variables']); Number_patients is the size of
+        every arm.  Screening is switched off, SpecialFlag on and
+        SpecialText cleared (the arms set their own trial flags).
+    trials : sequence of str
+    seed : int
+        Seed of the global generator (cohort and enrollment).
+    crn_seed : int
+        Common random numbers seed shared by the twins of all arms.
+    follow_up : dict, optional
+        Years of follow-up per trial (see evaluate_trials).
+
+    Returns
+    -------
+    dict : see evaluate_trials
+    """
+    from calculate_sub import calculate_sub
+
+    variables = copy.deepcopy(variables)
+    variables['Screening']['Mode'] = 'off'
+    variables['SpecialFlag'] = 'on'
+    variables['SpecialText'] = ''
+    variables['ResultsFlag'] = False
+    np.random.seed(seed)
+    handles, _ = calculate_sub({'Variables': variables}, rct_trials=trials, crn_seed=crn_seed)
+    if 'RCT' not in handles:
+        raise RuntimeError('RCT emulation failed')
+    if follow_up is not None:
+        return evaluate_trials(handles['data'], handles['RCTDesign'], follow_up)
+    return handles['RCT']
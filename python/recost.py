@@ -0,0 +1,245 @@
+"""
+recost.py -- Re-costing and re-discounting of stored simulation outputs.
+
+NumberCrunching_100000 books every procedure into data['Money'] with the
+unit costs of the run (Variables['Cost'], CostStage).  The engine also
+counts every costed event in data['PaymentType']; with those counts the
+Money series are a linear function of the unit costs and can be recomputed
+for any cost table without simulating again:
+
+    res = recost(data, [cost_a, cost_b, ...], discount_rates=[0, 0.03, 0.05])
+    res['Money']['AllCost']         # (K, 100), one row per cost table
+    res['DiscountedCost']           # (K, R)
+    res['DiscountedYearsLostCa']    # (R,)
+
+Counts used:
+  * procedures (colonoscopy, rectosigmoidoscopy, stool and blood tests,
+    complications): PaymentType_<type>[m - 1, yi], where row m - 1 is the
+    colonoscopy modus (screening, symptoms, follow up, baseline) and thus
+    the Money series the cost went to; the tests are always in row 0;
+  * cancer treatment: PaymentType['CancerQuarters'][phase, stage, yi], the
+    number of quarters treated in phase initial / continuing / final, which
+    cost Initial, Cont / 4 and Final / 4 per quarter (Fut* for
+    Money['FutureTreatment']).
+
+Discounting follows Evaluation: the factor is 1 up to year 20 and is
+multiplied by (1 - rate) for every following year (Evaluation uses 0.97).
+Money[yi] is spent in year yi + 1 and discounted with mask[yi + 1]; the
+years lost per year index i (Results['YearsLostCa'] / ['YearsLostColo'])
+with mask[i].
+
+Cost tables are dicts like Variables['Cost'] (missing keys are taken from
+the run's data['InputCost'] / ['InputCostStage'], so a table may contain
+only the values that change), or the output of cost_grid().  Outputs older
+than the 'CancerQuarters' counter can not be re-costed.
+"""
+
+import itertools
+
+import numpy as np
+
+from binning import years_lived
+
+STAGES = ('I', 'II', 'III', 'IV')
+
+# PaymentType entry -> Cost key
+PROCEDURE_COSTS = {
+    'FOBT': 'FOBT',
+    'I_FOBT': 'I_FOBT',
+    'Sept9_HighSens': 'Sept9_HighSens',
+    'Sept9_HighSpec': 'Sept9_HighSpec',
+    'Other': 'other',
+    'RS': 'Sigmoidoscopy',
+    'RSPolyp': 'Sigmoidoscopy_Polyp',
+    'Colonoscopy': 'Colonoscopy',
+    'ColonoscopyPolyp': 'Colonoscopy_Polyp',
+    'Colonoscopy_Cancer': 'Colonoscopy_Cancer',
+    'Perforation': 'Colonoscopy_Perforation',
+    'Serosa': 'Colonoscopy_Serosal_burn',
+    'Bleeding': 'Colonoscopy_bleed',
+    'BleedingTransf': 'Colonoscopy_bleed_transfusion',
+}
+
+# PaymentType row -> Money series
+MODUS_SERIES = ('Screening', 'Treatment', 'FollowUp', 'Other')
+
+# CostStage phases, with the share of the yearly cost paid per quarter
+PHASES = (('Initial', 1.0), ('Cont', 0.25), ('Final', 0.25))
+FUTURE_PHASES = (('FutInitial', 1.0), ('FutCont', 0.25), ('FutFinal', 0.25))
+
+
+def procedure_counts(data):
+    """
+    Procedure counts as an array (procedure, modus row, year).
+
+    The procedure axis follows PROCEDURE_COSTS.
+    """
+    payment = data['PaymentType']
+    counts = np.zeros((len(PROCEDURE_COSTS), len(MODUS_SERIES), 100))
+    for p, name in enumerate(PROCEDURE_COSTS):
+        arr = np.asarray(payment[name], dtype=float)
+        counts[p, :arr.shape[0], :] = arr[:len(MODUS_SERIES), :100]
+    return counts
+
+
+def cancer_quarters(data):
+    """Treated quarters per (phase, stage, year), see the module docstring."""
+    if 'CancerQuarters' not in data['PaymentType']:
+        raise ValueError('the output has no PaymentType CancerQuarters counts '
+                         '(simulated before re-costing was supported)')
+    return np.asarray(data['PaymentType']['CancerQuarters'], dtype=float)
+
+
+def _stage_costs(stage, phase):
+    """Cost of `phase` for the four stages, from a CostStage-like dict."""
+    if phase in stage:
+        return np.asarray(stage[phase], dtype=float)
+    # Variables['Cost'] layout: Initial_I, Initial_II, ...
+    return np.array([stage['{}_{}'.format(phase, s)] for s in STAGES], dtype=float)
+
+
+def cost_matrices(data, costs):
+    """
+    Stack cost tables into arrays.
+
+    Parameters
+    ----------
+    data : dict
+        Engine output; data['InputCost'] and data['InputCostStage'] provide
+        the values a table does not set.
+    costs : dict or list of dict
+        Cost tables with Variables['Cost'] keys (and optionally CostStage
+        keys 'Initial', 'Cont', ... with one value per stage).
+
+    Returns
+    -------
+    procedure : ndarray (K, procedures)
+    stage : dict
+        Phase name -> ndarray (K, 4).
+    """
+    if isinstance(costs, dict):
+        costs = [costs]
+    base_cost = data.get('InputCost', {})
+    base_stage = data.get('InputCostStage', {})
+    procedure = np.zeros((len(costs), len(PROCEDURE_COSTS)))
+    stage = {name: np.zeros((len(costs), len(STAGES)))
+             for name, _ in PHASES + FUTURE_PHASES}
+    for k, table in enumerate(costs):
+        merged = dict(base_cost)
+        merged.update(table)
+        for p, key in enumerate(PROCEDURE_COSTS.values()):
+            if key not in merged:
+                raise ValueError('cost table {} has no value for {!r}'.format(k, key))
+            procedure[k, p] = merged[key]
+        for name in stage:
+            if name in table:
+                stage[name][k] = _stage_costs(table, name)
+            elif '{}_I'.format(name) in table:
+                # Variables['Cost'] keys override InputCostStage
+                stage[name][k] = _stage_costs(merged, name)
+            elif name in base_stage:
+                stage[name][k] = _stage_costs(base_stage, name)
+            else:
+                stage[name][k] = _stage_costs(merged, name)
+    return procedure, stage
+
+
+def cost_grid(base, **ranges):
+    """
+    Cost tables for all combinations of the given values.
+
+    cost_grid(cost, Colonoscopy=[600, 800], FOBT=[5, 10, 20]) returns six
+    copies of `cost` with these keys replaced.
+    """
+    keys = list(ranges)
+    tables = []
+    for values in itertools.product(*(ranges[k] for k in keys)):
+        table = dict(base)
+        table.update(zip(keys, values))
+        tables.append(table)
+    return tables
+
+
+def discount_masks(rates, start=20, length=101):
+    """
+    Discount factors per year index for each rate, shape (R, length).
+
+    Factor 1 up to index `start`, then multiplied by (1 - rate) per year;
+    rate 0.03 gives Evaluation's DisCountMask.
+    """
+    rates = np.atleast_1d(np.asarray(rates, dtype=float))
+    steps = np.maximum(np.arange(length) - start, 0)
+    return (1 - rates[:, None]) ** steps[None, :]
+
+
+def years_lost(data, cause):
+    """
+    Life years lost per year index (101,) by deaths of `cause` (2: CRC,
+    3: colonoscopy), as Results['YearsLostCa'] / ['YearsLostColo'].
+    """
+    sel = np.asarray(data['DeathCause']) == cause
+    return (years_lived(np.asarray(data['NaturalDeathYear'], dtype=float)[sel])
+            - years_lived(np.asarray(data['DeathYear'], dtype=float)[sel]))
+
+
+def recost(data, costs, discount_rates=(0.03,), discount_start=20):
+    """
+    Recompute the Money series under cost tables and discount rates.
+
+    Parameters
+    ----------
+    data : dict
+        Engine output (handles['data']).
+    costs : dict or list of dict
+        K cost tables, see cost_matrices().
+    discount_rates : sequence of float, optional
+        R yearly discount rates.
+    discount_start : int, optional
+        Last undiscounted year index (Evaluation: 20).
+
+    Returns
+    -------
+    dict with
+        'Money' : dict of (K, 100) arrays with the keys of data['Money'],
+        'DiscountedCost', 'DiscountedCostFuture' : (K, R) sums of AllCost
+            and AllCostFuture,
+        'YearsLostCa', 'YearsLostColo' : (101,) life years lost,
+        'DiscountedYearsLostCa', 'DiscountedYearsLostColo' : (R,),
+        'DiscountedLifeYears' : (R,) life years lived by the cohort,
+        'discount_rates' : (R,).
+    """
+    procedure, stage = cost_matrices(data, costs)
+    counts = procedure_counts(data)
+    quarters = cancer_quarters(data)
+
+    # (K, modus row, year)
+    by_modus = np.einsum('kp,pmy->kmy', procedure, counts)
+    treatment = sum(share * np.einsum('ks,sy->ky', stage[name], quarters[i])
+                    for i, (name, share) in enumerate(PHASES))
+    future = sum(share * np.einsum('ks,sy->ky', stage[name], quarters[i])
+                 for i, (name, share) in enumerate(FUTURE_PHASES))
+
+    money = {series: by_modus[:, m, :] for m, series in enumerate(MODUS_SERIES)}
+    money['Treatment'] = money['Treatment'] + treatment
+    money['FutureTreatment'] = future
+    rest = money['Screening'] + money['FollowUp'] + money['Other']
+    money['AllCost'] = money['Treatment'] + rest
+    money['AllCostFuture'] = money['FutureTreatment'] + rest
+
+    masks = discount_masks(discount_rates, start=discount_start)
+    # Money[yi] is spent in year yi + 1
+    cost_masks = masks[:, 1:101]
+    lost_ca = years_lost(data, 2)
+    lost_colo = years_lost(data, 3)
+    lived = years_lived(np.asarray(data['DeathYear'], dtype=float))
+    return {
+        'Money': money,
+        'DiscountedCost': money['AllCost'] @ cost_masks.T,
+        'DiscountedCostFuture': money['AllCostFuture'] @ cost_masks.T,
+        'YearsLostCa': lost_ca,
+        'YearsLostColo': lost_colo,
+        'DiscountedYearsLostCa': masks @ lost_ca,
+        'DiscountedYearsLostColo': masks @ lost_colo,
+        'DiscountedLifeYears': masks @ lived,
+        'discount_rates': np.atleast_1d(np.asarray(discount_rates, dtype=float)),
+    }
@@ -0,0 +1,168 @@
+"""
+result_cache.py -- Content-addressed on-disk cache of simulation results.
+
+GUI sessions re-run the same settings, calibration revisits parameter sets
+and Repeat_identical_settings writes N copies of one settings file on
+purpose.  With
+
+    cache = ResultCache('result_cache', max_bytes=20e9, max_age=30 * 86400)
+    handles, BM = calculate_sub(handles, result_cache=cache)
+
+calculate_sub computes the key of the run just before the engine is called
+and, if the cache holds it, restores the engine output (handles['data']) and
+the benchmarks instead of simulating.  The key is a digest of the effective
+inputs:
+
+  * all positional engine arguments, which include the cohort drawn for
+    this run (gender, individual risk, screening preference);
+  * the state of the global random generator at the engine call, i.e. the
+    seed and everything drawn before;
+  * the common random numbers seed;
+  * the Benchmarks, the only settings Evaluation reads for BM;
+  * whether the run streamed its year summaries (the output then has no
+    per-patient matrices, see year_summary.py);
+  * engine_version(), a digest of the engine and Evaluation sources.
+
+A hit also restores the generator state after the cached run, so code that
+runs several simulations in a row without reseeding gets the same numbers
+with and without cache.  Settings that only name or place the output
+(Settings_Name, ResultsPath, Comment, ...) are not part of the key; with
+ResultsFlag on, Evaluation is run on the cached data to write the results
+file.
+
+Entries are pickles in <dir>/<key[:2]>/<key>.pkl, written atomically.  Their
+modification time is the time of last use; evict() removes entries unused
+for max_age seconds and then the least recently used ones until the cache
+is below max_bytes.  put() evicts automatically.
+"""
+
+import hashlib
+import os
+import pickle
+import time
+
+from checkpoint import inputs_fingerprint
+
+# sources whose content defines the results of a run
+ENGINE_SOURCES = ('NumberCrunching_100000.py', 'calculate_sub.py', 'Evaluation.py',
+                  'binning.py', 'year_summary.py', 'benchmark_table.py', 'crn.py',
+                  'warmstart.py', 'checkpoint.py')
+
+_this_dir = os.path.dirname(os.path.abspath(__file__))
+_engine_version = None
+
+
+def engine_version():
+    """Digest of the engine sources; changes whenever the engine does."""
+    global _engine_version
+    if _engine_version is None:
+        digest = hashlib.sha256()
+        for name in ENGINE_SOURCES:
+            with open(os.path.join(_this_dir, name), 'rb') as fh:
+                digest.update(fh.read())
+        _engine_version = digest.hexdigest()[:16]
+    return _engine_version
+
+
+def run_key(engine_args, rng_state, benchmarks, crn_seed=None, streamed=False):
+    """Cache key of a run (see the module docstring)."""
+    return inputs_fingerprint({
+        'engine_args': list(engine_args),
+        'rng_state': list(rng_state[:5]),
+        'benchmarks': benchmarks,
+        'crn_seed': crn_seed,
+        'streamed': bool(streamed),
+        'engine_version': engine_version(),
+    })
+
+
+class ResultCache:
+    """
+    Directory of cached run results.
+
+    Parameters
+    ----------
+    path : str
+        Cache directory (created if missing).
+    max_bytes : float, optional
+        Size limit of all entries; least recently used entries go first.
+    max_age : float, optional
+        Entries not used for this many seconds are removed.
+    """
+
+    def __init__(self, path, max_bytes=None, max_age=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key):
+        return os.path.join(self.path, key[:2], key + '.pkl')
+
+    def get(self, key):
+        """Cached entry (dict) for `key`, or None."""
+        path = self._file(key)
+        try:
+            with open(path, 'rb') as fh:
+                entry = pickle.load(fh)
+            os.utime(path)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        """Store `entry` (a picklable dict) under `key`, then evict."""
+        path = self._file(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp, 'wb') as fh:
+            pickle.dump(entry, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self.evict()
+
+    def entries(self):
+        """(last use, bytes, path) of all entries, least recently used first."""
+        found = []
+        for sub in os.listdir(self.path):
+            folder = os.path.join(self.path, sub)
+            if not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                if not name.endswith('.pkl'):
+                    continue
+                path = os.path.join(folder, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                found.append((st.st_mtime, st.st_size, path))
+        return sorted(found)
+
+    def evict(self):
+        """Apply max_age and max_bytes; returns the number of removed entries."""
+        entries = self.entries()
+        removed = 0
+        now = time.time()
+        total = sum(size for _, size, _ in entries)
+        for used, size, path in entries:
+            too_old = self.max_age is not None and now - used > self.max_age
+            too_big = self.max_bytes is not None and total > self.max_bytes
+            if not (too_old or too_big):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+    def stats(self):
+        """Number of entries, total bytes, hits and misses of this object."""
+        entries = self.entries()
+        return {'entries': len(entries), 'bytes': sum(size for _, size, _ in entries),
+                'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+results_export.py -- Export results files (<name>_Results.npz) to CSV,
+Parquet or one long table.
+
+    export_results(['replicas/'], 'csv_out', fmt='csv', workers=8)
+    export_results(['replicas/'], 'all.csv', fmt='long')
+
+or from the command line
+
+    python results_export.py replicas/ --out csv_out --format csv -j 8
+    python results_export.py replicas/ --out all.parquet --format long
+
+Formats:
+  csv      one CSV per field and results file, <name>_Results_<field>.csv
+           as Results/npz_converter.py wrote them (Variable and Benchmark
+           combined with their descriptions, dicts as one table or one
+           file per entry), plus <name>_Results_BM_Table.csv;
+  parquet  one Parquet file per results file holding its long table (needs
+           pyarrow);
+  long     all files in one long table (.csv, or .parquet with pyarrow)
+           with the columns run, field, index, value, text: one row per
+           array entry, `index` the flat C-order index, numbers in `value`
+           and strings in `text`.
+
+Files are exported in parallel by a ProcessPoolExecutor; each worker
+reads one results file field by field (results_io.ResultsFile) and writes
+its output, so memory use does not grow with the number of files.  The
+long table is assembled from per-file parts in <out>.parts/, streamed in
+file order.
+
+An output is up to date if its stamp (<out_dir>/.<name>.<format>.stamp)
+records the size and modification time of the results file and the same
+field selection; such files are skipped unless force=True.  Results files
+written by np.savez before results_io need allow_pickle=True.
+"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+_this_dir = os.path.dirname(os.path.abspath(__file__))
+if _this_dir not in sys.path:
+    sys.path.insert(0, _this_dir)
+
+from results_io import TEXT_SUFFIX, ResultsFile, flatten_results, typed_fields
+
+EXPORT_FORMATS = ('csv', 'parquet', 'long')
+RESULTS_SUFFIX = '_Results.npz'
+LONG_COLUMNS = ('run', 'field', 'index', 'value', 'text')
+
+# value field -> description field, exported together (npz_converter.py)
+COMBINED_FIELDS = {'Variable': 'Var_Legend', 'Benchmark': 'BM_Description'}
+
+
+def results_files(paths):
+    """The results files among `paths` (files or directories), sorted."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, '*' + RESULTS_SUFFIX)))
+        else:
+            files.append(path)
+    return sorted(set(files))
+
+
+def run_name(path):
+    """'CMOST13' for .../CMOST13_Results.npz."""
+    name = os.path.basename(path)
+    if name.endswith(RESULTS_SUFFIX):
+        return name[:-len(RESULTS_SUFFIX)]
+    return os.path.splitext(name)[0]
+
+
+def iter_fields(rf, fields=None):
+    """
+    (name, array) of the fields of an open ResultsFile, one at a time.
+
+    `fields` selects fields by name or 'prefix' of 'prefix/...'; the dicts
+    of files written by np.savez are flattened as results_io does.
+    """
+    for name in rf.fields:
+        if fields is not None and not any(name == f or name.startswith(f + '/') for f in fields):
+            continue
+        value = rf.read(name)
+        if isinstance(value, dict):
+            arrays = flatten_results({name: value})
+        elif isinstance(value, np.ndarray) and value.dtype != object:
+            arrays = {name: value}
+        else:
+            arrays = typed_fields(name, value)
+        for key, arr in arrays.items():
+            yield key, arr
+
+
+# ----------------------------------------------------------------------
+# long table
+# ----------------------------------------------------------------------
+def long_columns(run, name, arr):
+    """Columns (see LONG_COLUMNS) of the long table of one field."""
+    if arr.dtype.names:
+        parts = [long_columns(run, name + '.' + col, arr[col]) for col in arr.dtype.names]
+        return {key: np.concatenate([p[key] for p in parts]) for key in LONG_COLUMNS}
+    flat = np.ravel(arr)
+    size = len(flat)
+    if flat.dtype.kind in 'biuf':
+        value = flat.astype(float)
+        text = np.full(size, '', dtype='U1')
+    else:
+        value = np.full(size, np.nan)
+        text = flat.astype(str)
+    return {'run': np.full(size, run, dtype=object), 'field': np.full(size, name, dtype=object),
+            'index': np.arange(size), 'value': value, 'text': text}
+
+
+def _write_long_csv(fh, columns):
+    rows = zip(columns['run'].tolist(), columns['field'].tolist(), columns['index'].tolist(),
+               ['' if v != v else v for v in columns['value'].tolist()], columns['text'].tolist())
+    csv.writer(fh, lineterminator='\n').writerows(rows)
+
+
+def _parquet():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('Parquet output needs pyarrow (pip install pyarrow)')
+    return pyarrow, pyarrow.parquet
+
+
+def _arrow_table(columns):
+    pa, _ = _parquet()
+    return pa.table({'run': pa.array(columns['run'].tolist(), pa.string()),
+                     'field': pa.array(columns['field'].tolist(), pa.string()),
+                     'index': pa.array(columns['index'], pa.int64()),
+                     'value': pa.array(columns['value'], pa.float64()),
+                     'text': pa.array(columns['text'].tolist(), pa.string())})
+
+
+def write_long_part(path, out_path, fields=None, allow_pickle=False):
+    """The long table of one results file as .csv (no header) or .parquet."""
+    run = run_name(path)
+    tmp = out_path + '.tmp'
+    with ResultsFile(path, allow_pickle=allow_pickle) as rf:
+        if out_path.endswith('.parquet'):
+            _, pq = _parquet()
+            writer = None
+            for name, arr in iter_fields(rf, fields):
+                table = _arrow_table(long_columns(run, name, arr))
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp, table.schema, compression='zstd')
+                writer.write_table(table)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp, _arrow_table(long_columns(run, '', np.zeros(0))).schema)
+            writer.close()
+        else:
+            with open(tmp, 'w', newline='') as fh:
+                for name, arr in iter_fields(rf, fields):
+                    _write_long_csv(fh, long_columns(run, name, arr))
+    os.replace(tmp, out_path)
+    return [out_path]
+
+
+# ----------------------------------------------------------------------
+# CSV per field
+# ----------------------------------------------------------------------
+def _csv_rows(arr):
+    """Rows of a CSV of one array: 0-D and 1-D as a column, N-D by first axis."""
+    if arr.ndim == 0:
+        return [[arr.item()]]
+    if arr.ndim == 1:
+        return [[v] for v in arr.tolist()]
+    return arr.reshape(arr.shape[0], -1).tolist()
+
+
+def _write_csv(path, header, rows):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', newline='') as fh:
+        writer = csv.writer(fh, lineterminator='\n')
+        if header is not None:
+            writer.writerow(header)
+        writer.writerows(rows)
+    os.replace(tmp, path)
+    return path
+
+
+def write_csv_files(path, out_dir, fields=None, allow_pickle=False):
+    """The CSV files of one results file (see the module docstring)."""
+    stem = os.path.join(out_dir, run_name(path) + '_Results_')
+    written = []
+    arrays = {}
+    groups = {}
+    with ResultsFile(path, allow_pickle=allow_pickle) as rf:
+        for name, arr in iter_fields(rf, fields):
+            if '/' in name:
+                prefix, key = name.split('/', 1)
+                groups.setdefault(prefix, {})[key] = arr
+            else:
+                arrays[name] = arr
+
+    for value_key, desc_key in COMBINED_FIELDS.items():
+        if value_key in arrays and desc_key in arrays:
+            values = arrays.pop(value_key)
+            text = arrays.pop(value_key + TEXT_SUFFIX, None)
+            descriptions = arrays.pop(desc_key).tolist()
+            values = values.tolist()
+            if text is not None:
+                values = [t if t else v for v, t in zip(values, text.tolist())]
+            rows = [[d, '' if v != v else v] for d, v in zip(descriptions, values)]
+            written.append(_write_csv(stem + value_key + '_Combined.csv',
+                                      ['Description', 'Value'], rows))
+
+    for name, arr in arrays.items():
+        if arr.dtype.names:
+            written.append(_write_csv(stem + name + '.csv', list(arr.dtype.names), arr.tolist()))
+        else:
+            written.append(_write_csv(stem + name + '.csv', [name], _csv_rows(arr)))
+
+    for prefix, entries in groups.items():
+        shapes = {np.shape(a) for a in entries.values()}
+        if len(shapes) == 1 and len(next(iter(shapes))) <= 1 and '/' not in ''.join(entries):
+            # scalars or equal-length vectors: one table, a column per entry
+            columns = [np.atleast_1d(a).tolist() for a in entries.values()]
+            written.append(_write_csv(stem + prefix + '.csv', list(entries),
+                                      [list(row) for row in zip(*columns)]))
+        else:
+            for key, arr in entries.items():
+                written.append(_write_csv(stem + prefix + '_' + key.replace('/', '_') + '.csv',
+                                          None, _csv_rows(arr)))
+    return written
+
+
+# ----------------------------------------------------------------------
+# per-file export with stamps
+# ----------------------------------------------------------------------
+def _stamp_path(out_dir, path, fmt):
+    return os.path.join(out_dir, '.{}.{}.stamp'.format(run_name(path), fmt))
+
+
+def _source_state(path, fields):
+    st = os.stat(path)
+    return {'source': os.path.abspath(path), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+            'fields': sorted(fields) if fields is not None else None}
+
+
+def is_up_to_date(path, out_dir, fmt, fields=None):
+    """True if the stamp of this export matches the results file."""
+    try:
+        with open(_stamp_path(out_dir, path, fmt)) as fh:
+            stamp = json.load(fh)
+    except (OSError, ValueError):
+        return False
+    if stamp.get('state') != _source_state(path, fields):
+        return False
+    return all(os.path.exists(os.path.join(out_dir, f)) for f in stamp.get('outputs', []))
+
+
+def export_file(path, out_dir, fmt='csv', fields=None, allow_pickle=False, force=False,
+                part_ext='.csv'):
+    """
+    Export one results file into out_dir.
+
+    fmt 'long' writes the file's part of the long table (<name><part_ext>).
+    Returns the files written, [] if the export was up to date.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError('unknown export format {!r}, use one of {}'.format(fmt, EXPORT_FORMATS))
+    os.makedirs(out_dir, exist_ok=True)
+    if not force and is_up_to_date(path, out_dir, fmt, fields):
+        return []
+    state = _source_state(path, fields)
+    if fmt == 'csv':
+        written = write_csv_files(path, out_dir, fields, allow_pickle)
+    elif fmt == 'parquet':
+        written = write_long_part(path, os.path.join(out_dir, run_name(path) + '_Results.parquet'),
+                                  fields, allow_pickle)
+    else:
+        written = write_long_part(path, os.path.join(out_dir, run_name(path) + part_ext),
+                                  fields, allow_pickle)
+    stamp = {'state': state, 'outputs': [os.path.basename(f) for f in written]}
+    with open(_stamp_path(out_dir, path, fmt), 'w') as fh:
+        json.dump(stamp, fh)
+    return written
+
+
+def _export_task(args):
+    path, out_dir, fmt, fields, allow_pickle, force, part_ext = args
+    try:
+        written = export_file(path, out_dir, fmt, fields, allow_pickle, force, part_ext)
+        return path, written, None
+    except Exception as e:
+        return path, None, '{}: {}'.format(type(e).__name__, e)
+
+
+def _concat_long(parts, out):
+    """Stream the per-file parts into the long table `out`."""
+    tmp = out + '.tmp'
+    if out.endswith('.parquet'):
+        _, pq = _parquet()
+        writer = None
+        for part in parts:
+            pf = pq.ParquetFile(part)
+            for i in range(pf.num_row_groups):
+                group = pf.read_row_group(i)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp, group.schema, compression='zstd')
+                writer.write_table(group)
+        if writer is None:
+            writer = pq.ParquetWriter(tmp, _arrow_table(long_columns('', '', np.zeros(0))).schema)
+        writer.close()
+    else:
+        with open(tmp, 'w', newline='') as fh:
+            csv.writer(fh, lineterminator='\n').writerow(LONG_COLUMNS)
+            for part in parts:
+                with open(part, newline='') as src:
+                    shutil.copyfileobj(src, fh)
+    os.replace(tmp, out)
+
+
+def export_results(paths, out, fmt='csv', workers=None, fields=None, allow_pickle=False,
+                   force=False, log=print):
+    """
+    Export the results files among `paths` (files or directories).
+
+    Parameters
+    ----------
+    out : str
+        Output directory (csv, parquet) or long table file (.csv or
+        .parquet).
+    workers : int, optional
+        Worker processes; None uses one per CPU, 1 exports in this process.
+    fields : sequence of str, optional
+        Only export these fields (names or 'prefix' of 'prefix/...').
+
+    Returns
+    -------
+    dict with 'exported' and 'skipped' (lists of results files) and
+    'failed' (results file -> error message).
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError('unknown export format {!r}, use one of {}'.format(fmt, EXPORT_FORMATS))
+    files = results_files(paths)
+    if fmt == 'long':
+        part_ext = '.parquet' if out.endswith('.parquet') else '.csv'
+        out_dir = out + '.parts'
+    else:
+        part_ext = '.csv'
+        out_dir = out
+    if fmt == 'parquet' or part_ext == '.parquet':
+        _parquet()   # fail early, not in every worker
+    os.makedirs(out_dir, exist_ok=True)
+
+    tasks = [(p, out_dir, fmt, fields, allow_pickle, force, part_ext) for p in files]
+    summary = {'exported': [], 'skipped': [], 'failed': {}}
+    if workers == 1 or len(tasks) < 2:
+        results = map(_export_task, tasks)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        # several small files per task, still enough tasks to balance
+        chunk = max(1, len(tasks) // (8 * (workers or os.cpu_count() or 1)))
+        results = pool.map(_export_task, tasks, chunksize=chunk)
+    try:
+        for path, written, error in results:
+            if error is not None:
+                summary['failed'][path] = error
+                log('{}: failed ({})'.format(path, error))
+            elif written:
+                summary['exported'].append(path)
+            else:
+                summary['skipped'].append(path)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if fmt == 'long':
+        parts = [os.path.join(out_dir, run_name(p) + part_ext) for p in files
+                 if p not in summary['failed']]
+        stale = summary['exported'] or not os.path.exists(out)
+        listing = out + '.sources.json'
+        names = [os.path.basename(p) for p in parts]
+        try:
+            with open(listing) as fh:
+                stale = stale or json.load(fh) != names
+        except (OSError, ValueError):
+            stale = True
+        if stale:
+            _concat_long(parts, out)
+            with open(listing, 'w') as fh:
+                json.dump(names, fh)
+    log('{} exported, {} up to date, {} failed'.format(
+        len(summary['exported']), len(summary['skipped']), len(summary['failed'])))
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export CMOST results files to CSV, '
+                                                 'Parquet or one long table.')
+    parser.add_argument('paths', nargs='+', help='results files or directories')
+    parser.add_argument('--out', required=True,
+                        help='output directory, or the long table file (.csv/.parquet)')
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='worker processes (default: one per CPU)')
+    parser.add_argument('--fields', default=None,
+                        help='comma separated fields to export (default: all)')
+    parser.add_argument('--force', action='store_true', help='export up-to-date files again')
+    parser.add_argument('--allow-pickle', action='store_true',
+                        help='read results files written by np.savez (pickled entries)')
+    args = parser.parse_args(argv)
+    fields = args.fields.split(',') if args.fields else None
+    summary = export_results(args.paths, args.out, fmt=args.format, workers=args.workers,
+                             fields=fields, allow_pickle=args.allow_pickle, force=args.force)
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
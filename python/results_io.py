@@ -0,0 +1,342 @@
+"""
+results_io.py -- Typed, columnar results files (<name>_Results.npz).
+
+Evaluation writes the results of a run as a zip archive with one .npy
+member per field and a JSON header:
+
+    meta.json               format version, field index (dtype, shape,
+                            compression) and run metadata: settings hash,
+                            seed, n, engine version, timings, ...
+    YearsLostCa.npy         one member per field
+    PaymentType/FOBT.npy    dicts are flattened to 'key/subkey' fields
+    Variable.npy            lists become typed arrays ...
+    Variable.text.npy       ... mixed number / text lists are split into a
+                            float column (NaN where not a number) and a text
+                            column ('' where not text)
+
+No member holds pickled objects, so the files are read without
+allow_pickle, and every field can be read on its own.  Each member is
+compressed separately: by default the per-year series (1-D numeric
+fields) are stored uncompressed and can be memory-mapped, all other fields
+are deflated.  The archive is a valid .npz, np.load(path) works as before.
+
+    with ResultsFile(path) as rf:
+        rf.meta['seed'], rf.fields
+        rf['Treatment']                        # one field
+        rf.read('Treatment', mmap=True)        # memory-mapped
+        rf['PaymentType']                      # dict of 'PaymentType/...'
+    read_results(path)                         # everything as nested dicts
+    read_field(paths, 'YearsLostCa')           # (files, 101) from many runs
+
+Results files written with np.savez before this format (pickled lists and
+dicts) are read with ResultsFile(path, allow_pickle=True).
+"""
+
+import json
+import os
+import struct
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+RESULTS_FORMAT = 'cmost-results'
+RESULTS_VERSION = 1
+META_MEMBER = 'meta.json'
+TEXT_SUFFIX = '.text'
+
+COMPRESSION = {
+    'stored': zipfile.ZIP_STORED,
+    'deflate': zipfile.ZIP_DEFLATED,
+    'bz2': zipfile.ZIP_BZIP2,
+    'lzma': zipfile.ZIP_LZMA,
+}
+
+# fixed part of a zip local file header; name and extra lengths at 26
+_LOCAL_HEADER = 30
+
+
+def _jsonable(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError('{!r} can not be stored in the results metadata'.format(type(value)))
+
+
+def _is_number(value):
+    return isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool)
+
+
+def typed_fields(name, value):
+    """
+    The typed arrays of one results entry, {field name: ndarray}.
+
+    Numeric and string values and lists become arrays (None as NaN or '');
+    lists mixing numbers and text are split into `name` and
+    `name + TEXT_SUFFIX`.  Dicts are handled by flatten_results().
+    """
+    arr = np.asarray(value)
+    if arr.dtype != object:
+        return {name: arr}
+    items = arr.ravel().tolist()
+    numbers = [v if _is_number(v) else None for v in items]
+    texts = [v if isinstance(v, str) else None for v in items]
+    for v in items:
+        if v is not None and not _is_number(v) and not isinstance(v, str):
+            raise ValueError('results entry {!r} holds a {} and can not be stored'
+                             .format(name, type(v).__name__))
+    out = {}
+    if any(v is not None for v in numbers) or not any(v is not None for v in texts):
+        out[name] = np.array([np.nan if v is None else v for v in numbers],
+                             dtype=float).reshape(arr.shape)
+    if any(v is not None for v in texts):
+        key = name + TEXT_SUFFIX if name in out else name
+        out[key] = np.array(['' if v is None else v for v in texts]).reshape(arr.shape)
+    return out
+
+
+def flatten_results(results, prefix=''):
+    """Flatten a (nested) results dict into {field name: typed ndarray}."""
+    fields = {}
+    for key, value in results.items():
+        name = prefix + str(key)
+        if isinstance(value, dict):
+            fields.update(flatten_results(value, name + '/'))
+        else:
+            fields.update(typed_fields(name, value))
+    return fields
+
+
+def default_compression(array):
+    """'stored' for 1-D numeric series (memory-mappable), else 'deflate'."""
+    if array.dtype.kind in 'biuf' and array.ndim == 1:
+        return 'stored'
+    return 'deflate'
+
+
+def write_results(path, results, meta=None, compression=None):
+    """
+    Write a results dict to `path` in the typed format.
+
+    Parameters
+    ----------
+    path : str
+    results : dict
+        Field name -> array, number, string, list or (nested) dict.
+    meta : dict, optional
+        Run metadata stored in the header (JSON values and numpy scalars).
+    compression : str or dict, optional
+        One of COMPRESSION for all fields, or field name -> method; fields
+        not named use default_compression().
+
+    The file is written to a temporary file next to `path`, private to this
+    process, and renamed into place, so readers never see a partial file
+    and processes writing the same path do not mix their files.
+    """
+    fields = flatten_results(results)
+    index = {}
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with zipfile.ZipFile(tmp, 'w', allowZip64=True) as zf:
+            for name, arr in fields.items():
+                if isinstance(compression, str):
+                    method = compression
+                elif compression is not None and name in compression:
+                    method = compression[name]
+                else:
+                    method = default_compression(arr)
+                if method not in COMPRESSION:
+                    raise ValueError('unknown compression {!r} for field {!r}'.format(method, name))
+                info = zipfile.ZipInfo(name + '.npy', date_time=(1980, 1, 1, 0, 0, 0))
+                info.compress_type = COMPRESSION[method]
+                with zf.open(info, 'w', force_zip64=arr.nbytes > 2 ** 30) as fh:
+                    np.lib.format.write_array(fh, arr, allow_pickle=False)
+                index[name] = {'dtype': np.lib.format.dtype_to_descr(arr.dtype),
+                               'shape': list(arr.shape), 'compression': method}
+            header = {'format': RESULTS_FORMAT, 'version': RESULTS_VERSION,
+                      'fields': index, 'meta': meta or {}}
+            zf.writestr(META_MEMBER, json.dumps(header, default=_jsonable, indent=1),
+                        compress_type=zipfile.ZIP_DEFLATED)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, path)
+
+
+class ResultsFile:
+    """
+    Lazy reader of a results file; fields are read when accessed.
+
+    Attributes
+    ----------
+    meta : dict
+        Run metadata ({} for files written by np.savez).
+    fields : list of str
+        Field names in file order.
+    legacy : bool
+        True for files written by np.savez (no header).
+    """
+
+    def __init__(self, path, allow_pickle=False):
+        self.path = path
+        self.allow_pickle = allow_pickle
+        self._zip = zipfile.ZipFile(path)
+        names = self._zip.namelist()
+        self.legacy = META_MEMBER not in names
+        if self.legacy:
+            self.meta = {}
+            self._index = {n[:-4]: None for n in names if n.endswith('.npy')}
+        else:
+            header = json.loads(self._zip.read(META_MEMBER))
+            if header.get('format') != RESULTS_FORMAT:
+                raise ValueError('{} is not a CMOST results file'.format(path))
+            if header.get('version', 0) > RESULTS_VERSION:
+                raise ValueError('{} has results format version {}, this version reads up to {}'
+                                 .format(path, header['version'], RESULTS_VERSION))
+            self.meta = header['meta']
+            self._index = header['fields']
+        self.fields = list(self._index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._zip.close()
+
+    def __contains__(self, name):
+        return name in self._index or any(f.startswith(name + '/') for f in self._index)
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __getitem__(self, name):
+        if name in self._index:
+            return self.read(name)
+        group = self.group(name)
+        if not group:
+            raise KeyError('{} has no field {!r}'.format(self.path, name))
+        return group
+
+    def read(self, name, mmap=False):
+        """
+        One field as an array.
+
+        With mmap=True the field is memory-mapped from the file; only
+        fields stored uncompressed can be mapped.
+        """
+        if name not in self._index:
+            raise KeyError('{} has no field {!r}'.format(self.path, name))
+        member = name + '.npy'
+        if mmap:
+            return self._memmap(member)
+        with self._zip.open(member) as fh:
+            try:
+                arr = np.lib.format.read_array(fh, allow_pickle=self.allow_pickle)
+            except ValueError:
+                if not self.legacy or self.allow_pickle:
+                    raise
+                raise ValueError('field {!r} of {} was written by np.savez as a pickled object; '
+                                 'read the file with allow_pickle=True'.format(name, self.path))
+        if self.legacy and arr.dtype == object and arr.ndim == 0:
+            return arr.item()
+        return arr
+
+    def _memmap(self, member):
+        info = self._zip.getinfo(member)
+        if info.compress_type != zipfile.ZIP_STORED:
+            raise ValueError('field {!r} of {} is compressed and can not be memory-mapped'
+                             .format(member[:-4], self.path))
+        with open(self.path, 'rb') as fh:
+            fh.seek(info.header_offset)
+            local = fh.read(_LOCAL_HEADER)
+            name_len, extra_len = struct.unpack('<HH', local[26:30])
+            fh.seek(info.header_offset + _LOCAL_HEADER + name_len + extra_len)
+            version = np.lib.format.read_magic(fh)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(fh)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(fh)
+            offset = fh.tell()
+        if dtype.hasobject:
+            raise ValueError('field {!r} of {} holds objects'.format(member[:-4], self.path))
+        if not shape:
+            return self.read(member[:-4])
+        return np.memmap(self.path, dtype=dtype, mode='r', offset=offset, shape=shape,
+                         order='F' if fortran else 'C')
+
+    def group(self, prefix):
+        """The fields 'prefix/...' as a nested dict."""
+        out = {}
+        for name in self.fields:
+            if name.startswith(prefix + '/'):
+                _nest(out, name[len(prefix) + 1:], self.read(name))
+        return out
+
+    def to_dict(self, fields=None):
+        """
+        The fields (all, or those named and their 'name/...' sub-fields) as
+        nested dicts; split number / text lists are joined again.
+        """
+        out = {}
+        for name in self.fields:
+            if fields is not None and not any(name == f or name.startswith(f + '/') for f in fields):
+                continue
+            if name.endswith(TEXT_SUFFIX) and name[:-len(TEXT_SUFFIX)] in self._index:
+                continue
+            value = self.read(name)
+            if name + TEXT_SUFFIX in self._index:
+                value = _join_text(value, self.read(name + TEXT_SUFFIX))
+            _nest(out, name, value)
+        return out
+
+
+def _nest(out, name, value):
+    *parents, leaf = name.split('/')
+    for key in parents:
+        out = out.setdefault(key, {})
+    out[leaf] = value
+
+
+def _join_text(numbers, texts):
+    """List of the number column with the text entries put back."""
+    return [t if t else v for v, t in zip(numbers.ravel().tolist(), texts.ravel().tolist())]
+
+
+def read_results(path, fields=None, allow_pickle=False):
+    """A results file (or the named fields) as a nested dict."""
+    with ResultsFile(path, allow_pickle=allow_pickle) as rf:
+        return rf.to_dict(fields)
+
+
+def read_meta(path):
+    """The run metadata of a results file, without reading any field."""
+    with ResultsFile(path) as rf:
+        return rf.meta
+
+
+def read_field(paths, name, workers=None):
+    """
+    One field of many results files, stacked along a new first axis.
+
+    Only the member of that field is read from each file.  workers > 1
+    reads files in a thread pool (decompression releases the GIL); None
+    uses one thread per CPU.
+    """
+    def one(path):
+        with ResultsFile(path) as rf:
+            return rf.read(name)
+
+    paths = list(paths)
+    if workers == 1 or len(paths) < 2:
+        arrays = [one(p) for p in paths]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            arrays = list(pool.map(one, paths))
+    if not arrays:
+        return np.zeros(0)
+    return np.stack(arrays)
@@ -5,11 +5,19 @@ print key metrics for comparison with MATLAB reference.
 
 Usage:
     python run_100k_benchmark.py
+    python run_100k_benchmark.py --profile [--profile-patients N] [--profile-dir DIR]
+    python run_100k_benchmark.py --checkpoint DIR [--checkpoint-every K] [--resume]
+
+With --profile a sub-cohort of N patients (default 2000) is run under the
+profiler instead and .pstats / speedscope files are written (see profiling.py).
+With --checkpoint the engine state is saved to DIR every K years (default 10);
+--resume continues an interrupted run from that checkpoint.
 """
 
 import os
 import sys
 import copy
+import argparse
 import numpy as np
 
 _this_dir = os.path.dirname(os.path.abspath(__file__))
@@ -28,8 +36,32 @@ def load_cmost13():
     return copy.deepcopy(mod.settings)
 
 
-def main():
-    np.random.seed(42)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the CMOST13 100K benchmark.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--profile', action='store_true',
+                        help='profile a sub-cohort instead of running the benchmark')
+    parser.add_argument('--profile-patients', type=int, default=2000,
+                        help='number of patients in the profiled sub-cohort')
+    parser.add_argument('--profile-dir', default=None,
+                        help='directory for the profile files (default: ResultsPath)')
+    parser.add_argument('--checkpoint', default=None,
+                        help='checkpoint directory')
+    parser.add_argument('--checkpoint-every', type=int, default=10,
+                        help='years between checkpoints')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue from the checkpoint directory')
+    args = parser.parse_args(argv)
+    if args.resume and not args.checkpoint:
+        parser.error('--resume requires --checkpoint')
+
+    if args.profile:
+        from profiling import profile_run
+        profile_run(load_cmost13(), patients=args.profile_patients,
+                    out_dir=args.profile_dir, seed=args.seed)
+        return
+
+    np.random.seed(args.seed)
 
     variables = load_cmost13()
     # CMOST13 defaults: 100K patients, screening off, surveillance on
@@ -46,7 +78,13 @@ def main():
     print()
 
     handles = {'Variables': variables}
-    handles, bm = calculate_sub(handles)
+    if args.checkpoint:
+        handles, bm = calculate_sub(
+            handles, checkpoint_path=args.checkpoint,
+            checkpoint_every=args.checkpoint_every,
+            resume_from=args.checkpoint if args.resume else None)
+    else:
+        handles, bm = calculate_sub(handles)
 
     if 'data' not in handles:
         print("ERROR: simulation did not produce data.")
@@ -0,0 +1,135 @@
+"""
+run_control.py -- Progress reporting and cancellation for simulation runs.
+
+NumberCrunching_100000 and calculate_sub accept an optional progress
+callback and an optional CancellationToken.  The callback is invoked once
+per simulated year (and optionally every N patients inside a year) with a
+dict describing how far the run has got; the token is checked at the same
+points, which are patient boundaries where the engine state is consistent.
+
+Embedding applications (GUI, job runners, notebooks) typically do:
+
+    token = CancellationToken()
+
+    def on_progress(info):
+        print(info['year'], info['included'], info['eta'])
+        if diverging(info):
+            token.cancel()
+
+    handles, BM = calculate_sub(handles, progress_callback=on_progress,
+                                cancel_token=token)
+
+A cancelled run raises SimulationCancelled inside the engine; calculate_sub
+catches it and returns (handles, None) without running Evaluation.
+"""
+
+import threading
+import time
+
+
+class SimulationCancelled(Exception):
+    """Raised by the engine when its CancellationToken has been triggered."""
+
+    def __init__(self, year, patient=None):
+        self.year = year
+        self.patient = patient
+        if patient is None:
+            msg = 'simulation cancelled after year {}'.format(year)
+        else:
+            msg = 'simulation cancelled in year {} at patient {}'.format(year, patient)
+        super().__init__(msg)
+
+
+class CancellationToken:
+    """
+    Thread-safe flag used to request that a running simulation stops.
+
+    The token may be cancelled from any thread (e.g. a GUI button handler
+    or the progress callback itself); the engine polls it at safe points.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        """Request cancellation."""
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        """True once cancel() has been called."""
+        return self._event.is_set()
+
+    def raise_if_cancelled(self, year, patient=None):
+        """Raise SimulationCancelled if cancellation was requested."""
+        if self._event.is_set():
+            raise SimulationCancelled(year, patient)
+
+
+class ProgressReporter:
+    """
+    Build progress records for the engine and hand them to a callback.
+
+    Parameters
+    ----------
+    callback : callable or None
+        Called with a single dict argument (see report()).
+    n : int
+        Number of patients in the cohort.
+    every : int
+        If > 0, additionally report every `every` patients within a year.
+    cancel_token : CancellationToken or None
+        Checked every time a record is produced.
+    max_years : int
+        Upper bound of simulated years, used for the time estimate.
+    """
+
+    def __init__(self, callback, n, every=0, cancel_token=None, max_years=100):
+        self.callback = callback
+        self.n = n
+        self.every = int(every) if every else 0
+        self.cancel_token = cancel_token
+        self.max_years = max_years
+        self.start = time.perf_counter()
+
+    def due(self, z):
+        """True if patient z (0-based) completes an intra-year reporting block."""
+        return self.every > 0 and (z + 1) % self.every == 0 and (z + 1) < self.n
+
+    def report(self, y, patients_done, included, cancers, colonoscopies):
+        """
+        Check the cancellation token and invoke the callback.
+
+        Parameters
+        ----------
+        y : int
+            Current simulated year (1-based).
+        patients_done : int
+            Patients already processed in year y (n at the end of a year).
+        included, cancers, colonoscopies : int
+            Patients still included, cancers that arose so far and
+            colonoscopies performed so far.
+        """
+        if self.cancel_token is not None:
+            self.cancel_token.raise_if_cancelled(
+                y, None if patients_done >= self.n else patients_done)
+        if self.callback is None:
+            return
+
+        elapsed = time.perf_counter() - self.start
+        done = (y - 1) + patients_done / float(self.n)
+        if done > 0:
+            eta = elapsed / done * max(self.max_years - done, 0.0)
+        else:
+            eta = None
+
+        self.callback({
+            'year': y,
+            'patients_done': patients_done,
+            'n': self.n,
+            'included': int(included),
+            'cancers': int(cancers),
+            'colonoscopies': int(colonoscopies),
+            'elapsed': elapsed,
+            'eta': eta,
+        })
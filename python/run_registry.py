@@ -0,0 +1,507 @@
+#!/usr/bin/env python3
+"""
+run_registry.py -- Indexed SQLite registry of completed runs.
+
+After a large batch there are thousands of <name>_Results.npz files, and a
+question such as "all runs with DirectCancerSpeed between X and Y, best
+cancer mortality first" meant opening every one.  The registry keeps what
+such questions need in one SQLite file with indexes:
+
+    runs              path, settings name and hash, seed, crn seed, n,
+                      engine version, simulation and evaluation seconds
+    parameters        the scalar numeric settings of the run (name, value)
+    summary           the summary variables (Results['Variable'], named
+                      by Var_Legend; text entries in the text column)
+    benchmarks        the benchmark table (Results['BM_Table'])
+    benchmark_errors  per benchmark group (and 'all'): scored rows, red
+                      rows and the relative RMS deviation from the
+                      benchmarks, sqrt(mean(((value - benchmark) /
+                      benchmark) ** 2)) over the scored rows
+
+Runs are added when they complete (calculate_sub(..., registry=...), the
+job queue with  work --registry) or from existing files:
+
+    python run_registry.py scan runs.sqlite QUEUE/results --settings QUEUE/done
+    python run_registry.py query runs.sqlite \\
+        --param DirectCancerSpeed 1e-7 3e-7 --rms CancerMortality --limit 20
+
+and from Python
+
+    with RunRegistry('runs.sqlite') as reg:
+        reg.find(parameters={'DirectCancerSpeed': (1e-7, 3e-7)},
+                 rms_group='CancerMortality', limit=20)
+        reg.get(run_id)                 # with parameters, summary, benchmarks
+
+The file uses write-ahead logging, so analyses can read while workers add
+runs; SQLite locking is not reliable on network filesystems, so keep the
+registry on a local disk (one registry per host, or scan afterwards).
+A results file is registered once per path; registering it again (or a
+newer file at that path) replaces the entry.
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+_this_dir = os.path.dirname(os.path.abspath(__file__))
+if _this_dir not in sys.path:
+    sys.path.insert(0, _this_dir)
+
+from benchmark_table import BENCHMARK_DTYPE
+from results_export import RESULTS_SUFFIX, run_name
+from results_io import TEXT_SUFFIX, ResultsFile
+from settings_io import load_settings, settings_files
+
+REGISTRY_VERSION = 1
+ALL_GROUPS = 'all'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    name TEXT,
+    settings_name TEXT,
+    settings_hash TEXT,
+    engine_version TEXT,
+    seed INTEGER,
+    crn_seed INTEGER,
+    n INTEGER,
+    simulation_seconds REAL,
+    evaluation_seconds REAL,
+    file_mtime REAL,
+    registered REAL
+);
+CREATE INDEX IF NOT EXISTS runs_settings_hash ON runs (settings_hash);
+CREATE INDEX IF NOT EXISTS runs_name ON runs (name);
+
+CREATE TABLE IF NOT EXISTS parameters (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (run_id, name)
+);
+CREATE INDEX IF NOT EXISTS parameters_value ON parameters (name, value, run_id);
+
+CREATE TABLE IF NOT EXISTS summary (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    k INTEGER NOT NULL,
+    name TEXT,
+    value REAL,
+    text TEXT,
+    PRIMARY KEY (run_id, k)
+);
+CREATE INDEX IF NOT EXISTS summary_value ON summary (name, value, run_id);
+
+CREATE TABLE IF NOT EXISTS benchmarks (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    k INTEGER NOT NULL,
+    grp TEXT,
+    description TEXT,
+    sex INTEGER,
+    age REAL,
+    benchmark REAL,
+    value REAL,
+    lower REAL,
+    upper REAL,
+    flag TEXT,
+    PRIMARY KEY (run_id, k)
+);
+CREATE INDEX IF NOT EXISTS benchmarks_description ON benchmarks (description, run_id);
+
+CREATE TABLE IF NOT EXISTS benchmark_errors (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    grp TEXT NOT NULL,
+    rows INTEGER,
+    red INTEGER,
+    rms REAL,
+    PRIMARY KEY (run_id, grp)
+);
+CREATE INDEX IF NOT EXISTS benchmark_errors_rms ON benchmark_errors (grp, rms, run_id);
+"""
+
+RUN_COLUMNS = ('id', 'path', 'name', 'settings_name', 'settings_hash', 'engine_version',
+               'seed', 'crn_seed', 'n', 'simulation_seconds', 'evaluation_seconds',
+               'file_mtime', 'registered')
+
+
+def _number(value):
+    """float of a finite number, else None (SQL NULL)."""
+    if isinstance(value, (bool, np.bool_)):
+        return float(value)
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        value = float(value)
+        return value if np.isfinite(value) else None
+    return None
+
+
+def setting_parameters(variables):
+    """{name: float} of the scalar numeric (and boolean) settings."""
+    params = {}
+    for key, value in variables.items():
+        if isinstance(value, np.ndarray) and value.ndim == 0:
+            value = value.item()
+        number = _number(value)
+        if number is not None:
+            params[str(key)] = number
+    return params
+
+
+def _summary_rows(rf):
+    """(k, name, value, text) of the summary variables of a results file."""
+    if 'Variable' not in rf:
+        return []
+    legend = [str(v) for v in np.asarray(rf['Var_Legend']).tolist()] if 'Var_Legend' in rf else []
+    values = rf['Variable']
+    if rf.legacy:
+        values = list(values)
+        texts = [v if isinstance(v, str) else None for v in values]
+    else:
+        values = values.tolist()
+        texts = (rf['Variable' + TEXT_SUFFIX].tolist()
+                 if 'Variable' + TEXT_SUFFIX in rf.fields else [''] * len(values))
+    rows = []
+    for k, value in enumerate(values):
+        text = texts[k] or None
+        number = _number(value)
+        if number is None and text is None:
+            continue
+        rows.append((k, legend[k] if k < len(legend) else None, number, text))
+    return rows
+
+
+def _benchmark_table(rf):
+    """The benchmark table of a results file (BENCHMARK_DTYPE)."""
+    if 'BM_Table' in rf:
+        return rf['BM_Table']
+    if 'BM_Description' not in rf:
+        return np.zeros(0, dtype=BENCHMARK_DTYPE)
+    # files before the benchmark table: parallel lists, no groups or flags
+    descriptions = [d if isinstance(d, str) else '' for d in np.asarray(rf['BM_Description'],
+                                                                        dtype=object).tolist()]
+    values = [_number(v) for v in np.asarray(rf['BM_Value'], dtype=object).tolist()]
+    benchmarks = [_number(v) for v in np.asarray(rf['Benchmark'], dtype=object).tolist()]
+    keep = [k for k, d in enumerate(descriptions) if d]
+    table = np.zeros(len(keep), dtype=BENCHMARK_DTYPE)
+    for row, k in zip(table, keep):
+        row['description'] = descriptions[k]
+        row['value'] = np.nan if values[k] is None else values[k]
+        row['benchmark'] = np.nan if benchmarks[k] is None else benchmarks[k]
+        row['age'] = row['lower'] = row['upper'] = np.nan
+        row['flag'] = 'black' if not benchmarks[k] else ''
+    return table
+
+
+def benchmark_errors(table):
+    """
+    {group: (scored rows, red rows, relative RMS)} of a benchmark table,
+    with ALL_GROUPS over all groups.  Rows flagged 'black' and rows with a
+    zero or missing benchmark are not scored.
+    """
+    scored = ((table['flag'] != 'black') & np.isfinite(table['benchmark'])
+              & (table['benchmark'] != 0) & np.isfinite(table['value']))
+    errors = {}
+    for group in [ALL_GROUPS] + sorted(set(table['group'].tolist()) - {''}):
+        sel = scored if group == ALL_GROUPS else scored & (table['group'] == group)
+        rows = int(np.sum(sel))
+        if rows == 0:
+            continue
+        rel = (table['value'][sel] - table['benchmark'][sel]) / table['benchmark'][sel]
+        errors[group] = (rows, int(np.sum(table['flag'][sel] == 'red')),
+                         float(np.sqrt(np.mean(rel ** 2))))
+    return errors
+
+
+class RunRegistry:
+    """
+    SQLite registry of runs (see the module docstring).
+
+    Parameters
+    ----------
+    path : str
+        Database file, created with the schema if missing.
+    timeout : float, optional
+        Seconds to wait for another process holding the write lock.
+    """
+
+    def __init__(self, path, timeout=60.0):
+        self.path = path
+        self._db = sqlite3.connect(path, timeout=timeout)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute('PRAGMA foreign_keys = ON')
+        self._db.execute('PRAGMA journal_mode = WAL')
+        version = self._db.execute('PRAGMA user_version').fetchone()[0]
+        if version > REGISTRY_VERSION:
+            raise ValueError('{} has registry version {}, this version reads up to {}'
+                             .format(path, version, REGISTRY_VERSION))
+        with self._db:
+            self._db.executescript(SCHEMA)
+            self._db.execute('PRAGMA user_version = {}'.format(REGISTRY_VERSION))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._db.close()
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM runs').fetchone()[0]
+
+    # ------------------------------------------------------------------
+    # adding runs
+    # ------------------------------------------------------------------
+    def register(self, results_path, variables=None, allow_pickle=False):
+        """
+        Add (or replace) the run of a results file.
+
+        Parameters
+        ----------
+        results_path : str
+        variables : dict, optional
+            Settings of the run; their scalar numeric entries are stored as
+            parameters.  Without them only the file is registered.
+        allow_pickle : bool, optional
+            Needed for results files written by np.savez.
+
+        Returns
+        -------
+        int : the run id.
+        """
+        path = os.path.abspath(results_path)
+        with ResultsFile(path, allow_pickle=allow_pickle) as rf:
+            meta = rf.meta
+            summary = _summary_rows(rf)
+            table = _benchmark_table(rf)
+        timings = meta.get('timings', {})
+        run = (path, run_name(path), meta.get('settings_name') or None,
+               meta.get('settings_hash'), meta.get('engine_version'), meta.get('seed'),
+               meta.get('crn_seed'), meta.get('n'), timings.get('simulation'),
+               timings.get('evaluation'), os.path.getmtime(path), time.time())
+        params = setting_parameters(variables) if variables is not None else {}
+
+        with self._db:
+            self._db.execute('DELETE FROM runs WHERE path = ?', (path,))
+            run_id = self._db.execute(
+                'INSERT INTO runs ({}) VALUES ({})'.format(
+                    ', '.join(RUN_COLUMNS[1:]), ', '.join('?' * (len(RUN_COLUMNS) - 1))),
+                run).lastrowid
+            self._db.executemany('INSERT INTO parameters VALUES (?, ?, ?)',
+                                 [(run_id, k, v) for k, v in params.items()])
+            self._db.executemany('INSERT INTO summary VALUES (?, ?, ?, ?, ?)',
+                                 [(run_id,) + row for row in summary])
+            self._db.executemany(
+                'INSERT INTO benchmarks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(run_id, k, row['group'] or None, row['description'], int(row['sex']),
+                  _number(row['age']), _number(row['benchmark']), _number(row['value']),
+                  _number(row['lower']), _number(row['upper']), row['flag'] or None)
+                 for k, row in enumerate(table)])
+            self._db.executemany('INSERT INTO benchmark_errors VALUES (?, ?, ?, ?, ?)',
+                                 [(run_id, group) + values
+                                  for group, values in benchmark_errors(table).items()])
+        return run_id
+
+    def is_current(self, results_path):
+        """True if the file is registered and unchanged since."""
+        path = os.path.abspath(results_path)
+        row = self._db.execute('SELECT file_mtime FROM runs WHERE path = ?', (path,)).fetchone()
+        return row is not None and row[0] == os.path.getmtime(path)
+
+    def remove(self, results_path):
+        """Remove a run; returns True if it was registered."""
+        with self._db:
+            cursor = self._db.execute('DELETE FROM runs WHERE path = ?',
+                                      (os.path.abspath(results_path),))
+        return cursor.rowcount > 0
+
+    def scan(self, directory, settings_dirs=(), allow_pickle=False, force=False, log=print):
+        """
+        Register the results files in `directory` that are new or changed.
+
+        Settings files (settings_io.settings_files) named like a run in
+        `settings_dirs` give its parameters.  Files that can not be read are
+        reported and skipped.  Returns the number of runs registered.
+        """
+        settings = {}
+        for d in settings_dirs:
+            for f in settings_files(d):
+                settings[os.path.splitext(os.path.basename(f))[0]] = f
+        added = 0
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith(RESULTS_SUFFIX):
+                continue
+            path = os.path.join(directory, filename)
+            if not force and self.is_current(path):
+                continue
+            name = run_name(filename)
+            variables = load_settings(settings[name]) if name in settings else None
+            try:
+                self.register(path, variables, allow_pickle=allow_pickle)
+            except Exception as e:
+                log('{}: not registered ({}: {})'.format(path, type(e).__name__, e))
+                continue
+            added += 1
+        return added
+
+    # ------------------------------------------------------------------
+    # queries
+    # ------------------------------------------------------------------
+    def find(self, parameters=None, summary=None, settings_hash=None, rms_group=None,
+             limit=None):
+        """
+        Runs matching all conditions, as dicts of RUN_COLUMNS.
+
+        Parameters
+        ----------
+        parameters, summary : dict, optional
+            name -> (low, high), inclusive; None leaves a side open.
+            Summary variables are named as in Var_Legend.
+        settings_hash : str, optional
+        rms_group : str, optional
+            Benchmark group (or ALL_GROUPS): adds its 'rms' and 'red' to
+            the rows and sorts by the RMS, smallest first; runs without
+            that group are left out.
+        limit : int, optional
+        """
+        sql = 'SELECT runs.*'
+        joins, where, args = '', [], []
+        if rms_group is not None:
+            sql += ', e.rms AS rms, e.red AS red'
+            joins = ' JOIN benchmark_errors e ON e.run_id = runs.id AND e.grp = ?'
+            args.append(rms_group)
+        for table, conditions in (('parameters', parameters), ('summary', summary)):
+            for name, (low, high) in (conditions or {}).items():
+                cond = ['name = ?']
+                cond_args = [name]
+                if low is not None:
+                    cond.append('value >= ?')
+                    cond_args.append(low)
+                if high is not None:
+                    cond.append('value <= ?')
+                    cond_args.append(high)
+                where.append('runs.id IN (SELECT run_id FROM {} WHERE {})'.format(
+                    table, ' AND '.join(cond)))
+                args.extend(cond_args)
+        if settings_hash is not None:
+            where.append('runs.settings_hash = ?')
+            args.append(settings_hash)
+        sql += ' FROM runs' + joins
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY ' + ('e.rms, runs.id' if rms_group is not None else 'runs.id')
+        if limit is not None:
+            sql += ' LIMIT ?'
+            args.append(int(limit))
+        return [dict(row) for row in self._db.execute(sql, args)]
+
+    def get(self, run):
+        """
+        One run (id or results path) with 'parameters' ({name: value}),
+        'summary' ({name: value or text}), 'benchmarks' (list of dicts) and
+        'benchmark_errors' ({group: dict}); None if not registered.
+        """
+        if isinstance(run, str):
+            row = self._db.execute('SELECT * FROM runs WHERE path = ?',
+                                   (os.path.abspath(run),)).fetchone()
+        else:
+            row = self._db.execute('SELECT * FROM runs WHERE id = ?', (int(run),)).fetchone()
+        if row is None:
+            return None
+        out = dict(row)
+        run_id = out['id']
+        out['parameters'] = dict(self._db.execute(
+            'SELECT name, value FROM parameters WHERE run_id = ? ORDER BY name', (run_id,)))
+        out['summary'] = {
+            (name if name is not None else k): (text if value is None else value)
+            for k, name, value, text in self._db.execute(
+                'SELECT k, name, value, text FROM summary WHERE run_id = ? ORDER BY k',
+                (run_id,))}
+        out['benchmarks'] = [
+            {key: r[key] for key in r.keys() if key not in ('run_id', 'k')}
+            for r in self._db.execute('SELECT * FROM benchmarks WHERE run_id = ? ORDER BY k',
+                                      (run_id,))]
+        out['benchmark_errors'] = {
+            r['grp']: {'rows': r['rows'], 'red': r['red'], 'rms': r['rms']}
+            for r in self._db.execute('SELECT * FROM benchmark_errors WHERE run_id = ?',
+                                      (run_id,))}
+        return out
+
+    def execute(self, sql, args=()):
+        """Rows of an arbitrary (read) query, as dicts."""
+        return [dict(row) for row in self._db.execute(sql, args)]
+
+
+def _print_runs(rows, columns):
+    print('\t'.join(columns))
+    for row in rows:
+        print('\t'.join('' if row.get(c) is None else str(row[c]) for c in columns))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Indexed registry of CMOST runs.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('scan', help='register new or changed results files')
+    p.add_argument('registry')
+    p.add_argument('directories', nargs='+', help='directories with _Results.npz files')
+    p.add_argument('--settings', action='append', default=[],
+                   help='directory of the settings files (parameters); repeatable')
+    p.add_argument('--force', action='store_true', help='register unchanged files again')
+    p.add_argument('--allow-pickle', action='store_true',
+                   help='read results files written by np.savez (pickled entries)')
+    p = sub.add_parser('query', help='list runs')
+    p.add_argument('registry')
+    p.add_argument('--param', nargs=3, action='append', default=[],
+                   metavar=('NAME', 'LOW', 'HIGH'),
+                   help="parameter range, inclusive ('-' for open); repeatable")
+    p.add_argument('--summary', nargs=3, action='append', default=[],
+                   metavar=('NAME', 'LOW', 'HIGH'), help='summary variable range')
+    p.add_argument('--rms', default=None, metavar='GROUP',
+                   help="sort by the RMS deviation of this benchmark group ('all')")
+    p.add_argument('--show', action='append', default=[], metavar='PARAM',
+                   help='also print this parameter; repeatable')
+    p.add_argument('--limit', type=int, default=None)
+    p = sub.add_parser('show', help='one run in full')
+    p.add_argument('registry')
+    p.add_argument('run', help='run id or results file')
+    args = parser.parse_args(argv)
+
+    with RunRegistry(args.registry) as reg:
+        if args.command == 'scan':
+            for directory in args.directories:
+                added = reg.scan(directory, args.settings, allow_pickle=args.allow_pickle,
+                                 force=args.force)
+                print('{}: {} runs registered'.format(directory, added))
+            print('{} runs in {}'.format(len(reg), args.registry))
+        elif args.command == 'query':
+            def ranges(items):
+                return {name: tuple(None if v == '-' else float(v) for v in (low, high))
+                        for name, low, high in items}
+
+            rows = reg.find(ranges(args.param), ranges(args.summary), rms_group=args.rms,
+                            limit=args.limit)
+            for row in rows:
+                params = reg.get(row['id'])['parameters'] if args.show else {}
+                row.update({name: params.get(name) for name in args.show})
+            columns = ['id', 'name', 'seed'] + (['rms', 'red'] if args.rms else []) \
+                + args.show + ['path']
+            _print_runs(rows, columns)
+        else:
+            run = reg.get(int(args.run) if args.run.isdigit() else args.run)
+            if run is None:
+                print('{} is not registered'.format(args.run))
+                return 1
+            for key in RUN_COLUMNS:
+                print('{}: {}'.format(key, run[key]))
+            for group, err in sorted(run['benchmark_errors'].items()):
+                print('rms {}: {:.4g} ({} rows, {} red)'.format(group, err['rms'], err['rows'],
+                                                                 err['red']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,260 @@
+"""
+scenarios.py -- Simulate K parameter sets, or K replicas of one, in one
+engine run.
+
+Calibration and sensitivity analyses run many small simulations that differ
+only in a few parameters.  A ScenarioTable holds those parameters with a
+leading scenario axis:
+
+    table = ScenarioTable({
+        'DirectCancerSpeed': [6e-7, 8e-7, 1e-6],
+        'NewPolypScale':     [1.0, 1.1, 1.2],
+        'FastCancer':        np.tile(variables['FastCancer'], (3, 1)),
+    })
+    results = run_scenarios(variables, table, seed=42)
+    handles_k, BM_k = results[k]
+
+calculate_sub(..., scenarios=table) stacks K copies of the cohort along the
+patient axis (patients k * size ... (k + 1) * size - 1 form scenario k) and
+runs them in a single engine call:
+
+  * NewPolypScale multiplies the per-year polyp rates of all patients in
+    one array operation;
+  * FastCancer, Healing (per polyp stage, as in the settings) and
+    DirectCancerSpeed are switched at the start of each scenario block;
+  * per-patient outputs are sliced per scenario, and per-year totals
+    (costs, counts, cancer records) are attributed to the scenario block
+    that produced them, so every scenario gets its own data dict and
+    Evaluation.
+
+Scenarios share the drawn cohort (gender, individual risk, screening
+preference); with a crn_seed their twins also share the random numbers
+(crn.py), and every scenario then gives the results of a separate
+crn_seed run of its settings (up to the rounding of summed costs).
+ScenarioTable.replicas(K) instead draws K independent cohorts of
+the same settings.  The patient loop itself stays scalar: stacking saves the
+per-run preparation and lets the scenarios be compared patient by patient.
+"""
+
+import copy
+import os
+import sys
+
+import numpy as np
+
+_this_dir = os.path.dirname(os.path.abspath(__file__))
+if _this_dir not in sys.path:
+    sys.path.insert(0, _this_dir)
+
+from calculate_sub import calculate_sub, fast_cancer_vector
+
+SCENARIO_PARAMETERS = ('FastCancer', 'Healing', 'DirectCancerSpeed', 'NewPolypScale')
+
+# engine arrays summed over patients; split by differences at block bounds
+ADDITIVE_ARRAYS = (
+    'DirectCancer', 'DirectCancerR', 'DirectCancer2', 'DirectCancer2R',
+    'ProgressedCancer', 'ProgressedCancerR', 'AllPolyps',
+    'EarlyPolypsRemoved', 'AdvancedPolypsRemoved',
+    'Money_Treatment', 'Money_FutureTreatment', 'Money_Screening',
+    'Money_FollowUp', 'Money_Other',
+    'Number_Screening_Colonoscopy', 'Number_Symptoms_Colonoscopy',
+    'Number_Follow_Up_Colonoscopy', 'Number_Baseline_Colonoscopy',
+    'Number_RectoSigmo', 'Number_FOBT', 'Number_I_FOBT', 'Number_Sept9',
+    'Number_other',
+    'PaymentType_FOBT', 'PaymentType_I_FOBT', 'PaymentType_Sept9_HighSens',
+    'PaymentType_Sept9_HighSpec', 'PaymentType_RS', 'PaymentType_RSPolyp',
+    'PaymentType_Colonoscopy', 'PaymentType_ColonoscopyPolyp',
+    'PaymentType_Colonoscopy_Cancer', 'PaymentType_Perforation',
+    'PaymentType_Serosa', 'PaymentType_Bleeding', 'PaymentType_BleedingTransf',
+    'PaymentType_Cancer_ini', 'PaymentType_Cancer_con', 'PaymentType_Cancer_fin',
+    'PaymentType_QCancer_ini', 'PaymentType_QCancer_con',
+    'PaymentType_QCancer_fin', 'PaymentType_CancerQuarters', 'PaymentType_Other',
+)
+
+# engine arrays filled per year at the next free column; split by columns
+APPENDED_ARRAYS = ('TumorRecord_Stage', 'DwellTimeProgression', 'DwellTimeFastCancer')
+
+# data keys of per-patient outputs: (n,) and (100, n)
+_PATIENT_KEYS = ('Gender', 'DeathCause', 'DeathYear', 'NaturalDeathYear')
+_PATIENT_YEAR_KEYS = ('HasCancer', 'NumPolyps', 'MaxPolyps', 'NumCancer', 'MaxCancer',
+                      'DiagnosedCancer', 'YearIncluded', 'YearAlive')
+# data groups packed from engine arrays named <group>_<key>
+_GROUPS = ('Money', 'Number', 'PaymentType')
+
+
+def _data_location(name):
+    """(group, key) of an engine array in the data dict (group None: top level)."""
+    group, _, key = name.partition('_')
+    if group in _GROUPS:
+        return group, key
+    return None, name
+
+
+class ScenarioTable:
+    """
+    Parameters of K scenarios with a leading scenario axis.
+
+    Parameters
+    ----------
+    parameters : dict of name -> array-like
+        Names from SCENARIO_PARAMETERS.  DirectCancerSpeed and NewPolypScale
+        are (K,), FastCancer and Healing (K, stages) as in the settings.
+        Parameters that are not given keep the value of the settings.
+    replicas : int, optional
+        Number of scenarios when no parameters vary (see replicas()).
+    independent : bool
+        Draw an independent cohort for every scenario instead of sharing one.
+    """
+
+    def __init__(self, parameters=None, replicas=None, independent=False):
+        self.parameters = {}
+        for name, values in (parameters or {}).items():
+            if name not in SCENARIO_PARAMETERS:
+                raise ValueError('unknown scenario parameter {!r}; use one of {}'.format(
+                    name, SCENARIO_PARAMETERS))
+            self.parameters[name] = np.asarray(values, dtype=float)
+        sizes = {len(values) for values in self.parameters.values()}
+        if replicas is not None:
+            sizes.add(int(replicas))
+        if len(sizes) != 1 or min(sizes) < 1:
+            raise ValueError('scenario parameters need one common leading length, got {}'.format(
+                sorted(sizes)))
+        self.k = sizes.pop()
+        self.independent = independent
+        self.size = None
+
+    @classmethod
+    def replicas(cls, k):
+        """K replicas of the settings, each with its own cohort."""
+        return cls(replicas=k, independent=True)
+
+    def row(self, k):
+        """Parameters of scenario k as a dict of plain values."""
+        return {name: values[k].tolist() for name, values in self.parameters.items()}
+
+    def variables(self, variables, k):
+        """Settings of scenario k: a copy of `variables` with its parameters."""
+        variables = copy.deepcopy(variables)
+        for name, value in self.row(k).items():
+            if name == 'NewPolypScale':
+                variables['NewPolyp'] = (np.asarray(variables['NewPolyp'], dtype=float) * value).tolist()
+            else:
+                variables[name] = value
+        if self.k > 1:
+            variables['Settings_Name'] = '{}_s{}'.format(variables.get('Settings_Name', ''), k + 1)
+        return variables
+
+    # ------------------------------------------------------------------
+    # hooks called by calculate_sub and the engine
+    # ------------------------------------------------------------------
+    def prepare(self, stage_variables, direct_cancer_speed, size):
+        """Per-scenario engine parameters for blocks of `size` patients."""
+        self.size = int(size)
+        self.stage_variables = []
+        self.direct_cancer_speed = []
+        for k in range(self.k):
+            sv = dict(stage_variables)
+            if 'FastCancer' in self.parameters:
+                sv['FastCancer'] = fast_cancer_vector(self.parameters['FastCancer'][k])
+            if 'Healing' in self.parameters:
+                sv['Healing'] = self.parameters['Healing'][k].copy()
+            self.stage_variables.append(sv)
+            self.direct_cancer_speed.append(
+                self.parameters['DirectCancerSpeed'][k]
+                if 'DirectCancerSpeed' in self.parameters else direct_cancer_speed)
+        scale = self.parameters.get('NewPolypScale')
+        self.new_polyp_scale = None if scale is None else np.repeat(scale, self.size)
+
+    def start(self, arrays):
+        """Track the engine arrays (name -> array) before the first year."""
+        self._additive = {name: arrays[name] for name in ADDITIVE_ARRAYS}
+        self._appended = {name: arrays[name] for name in APPENDED_ARRAYS}
+        self._totals = [{name: np.zeros_like(a) for name, a in self._additive.items()}
+                        for _ in range(self.k)]
+        self._bounds = {name: np.zeros((a.shape[0], self.k + 1), dtype=int)
+                        for name, a in self._appended.items()}
+        self._block = None
+
+    def switch(self, yi, k):
+        """
+        The engine starts scenario block k in year index yi (k = K closes
+        the year): book the changes since the previous block to it.
+        """
+        if self._block is not None:
+            totals = self._totals[self._block]
+            for name, array in self._additive.items():
+                totals[name] += array - self._last[name]
+        for name, array in self._appended.items():
+            self._bounds[name][yi, k] = np.count_nonzero(array[yi])
+        if k < self.k:
+            self._last = {name: array.copy() for name, array in self._additive.items()}
+            self._block = k
+        else:
+            self._block = None
+
+    # ------------------------------------------------------------------
+    # results
+    # ------------------------------------------------------------------
+    def split(self, data, k):
+        """The data dict of scenario k from the data of the stacked run."""
+        members = slice(k * self.size, (k + 1) * self.size)
+        out = dict(data)
+        out['n'] = self.size
+        for key in _PATIENT_KEYS:
+            out[key] = data[key][members].copy()
+        for key in _PATIENT_YEAR_KEYS:
+            out[key] = data[key][:, members].copy()
+        out['Last'] = {key: values[members].copy() for key, values in data['Last'].items()}
+
+        for group in _GROUPS:
+            out[group] = dict(data[group])
+        for name, total in self._totals[k].items():
+            group, key = _data_location(name)
+            if group is None:
+                out[key] = total.copy()
+            else:
+                out[group][key] = total.copy()
+        money = out['Money']
+        money['AllCost'] = money['Treatment'] + money['Screening'] + money['FollowUp'] + money['Other']
+        money['AllCostFuture'] = (money['FutureTreatment'] + money['Screening'] +
+                                  money['FollowUp'] + money['Other'])
+
+        out['TumorRecord'] = self._columns(data['TumorRecord'], 'TumorRecord_Stage', k)
+        patient_number = out['TumorRecord']['PatientNumber']
+        patient_number[patient_number > 0] -= k * self.size
+        for key in ('DwellTimeProgression', 'DwellTimeFastCancer'):
+            out[key] = self._columns({key: data[key]}, key, k)[key]
+        return out
+
+    def _columns(self, arrays, bound_name, k):
+        """Per year, the columns filled by block k, moved to the front."""
+        bounds = self._bounds[bound_name]
+        width = round(self.size / 10)
+        out = {}
+        for key, array in arrays.items():
+            part = np.zeros((array.shape[0], max(width, 1)))
+            for yi in np.flatnonzero(bounds[:, k + 1] > bounds[:, k]):
+                cols = array[yi, bounds[yi, k]:bounds[yi, k + 1]]
+                cols = cols[:part.shape[1]] if len(cols) > part.shape[1] else cols
+                part[yi, :len(cols)] = cols
+            out[key] = part
+        return out
+
+
+def run_scenarios(variables, table, seed=42, crn_seed=None):
+    """
+    Run all scenarios of `table` for the settings `variables` in one
+    engine call.
+
+    Returns
+    -------
+    list of (handles, BM), one per scenario; handles['Variables'] holds the
+    scenario settings and handles['data'] its data.
+    """
+    variables = copy.deepcopy(variables)
+    np.random.seed(seed)
+    handles, _ = calculate_sub({'Variables': variables}, crn_seed=crn_seed, scenarios=table)
+    if 'Scenarios' not in handles:
+        raise RuntimeError('scenario run failed')
+    return [({'Variables': s['Variables'], 'data': s['data']}, s['BM'])
+            for s in handles['Scenarios']]
@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+"""
+service.py -- Local simulation service: an asyncio HTTP server on the
+loopback interface that queues CMOST runs to a process pool and caches
+their results.
+
+    python service.py --port 8765 --workers 4 --cache-dir service_cache
+
+Requests and responses are JSON:
+
+    GET  /health              engine version, workers, jobs per status
+    GET  /bases               named base settings (settings/<name>.py)
+    POST /jobs                submit a job; returns its id (202), or the
+                              result straight away (200) if it is cached
+    GET  /jobs/<id>           status, last progress record, result or error
+    GET  /jobs/<id>/events    stream of JSON lines: progress records while
+                              the job runs, then one final record with the
+                              status and the result
+
+A job document is either a full settings document or overrides against a
+named base:
+
+    {"base": "CMOST13", "overrides": {"Screening": {"Mode": "on"}},
+     "seed": 42, "n": 10000}
+
+Overrides are merged into the base recursively (nested dicts are merged,
+everything else is replaced).  Results are cached by the settings
+fingerprint (checkpoint.settings_fingerprint), the seed, the number of
+patients, the benchmarks the results are scored against and the engine
+version (a digest of the engine sources), so a
+repeated query is answered without running anything; a query identical
+to a job that is still queued or running gets that job's id.
+
+The server only binds to loopback addresses and needs no network access;
+deployments put their own front end in front of it.
+"""
+
+import argparse
+import asyncio
+import copy
+import json
+import multiprocessing
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+_this_dir = os.path.dirname(os.path.abspath(__file__))
+if _this_dir not in sys.path:
+    sys.path.insert(0, _this_dir)
+
+from checkpoint import settings_fingerprint
+from result_cache import engine_version
+from settings_io import load_settings
+
+LOOPBACK_HOSTS = ('127.0.0.1', '::1', 'localhost')
+
+_BASE_NAME = re.compile(r'^[A-Za-z0-9_]+$')
+_REASONS = {200: 'OK', 202: 'Accepted', 400: 'Bad Request', 404: 'Not Found',
+            405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+def to_json(value):
+    """Plain JSON value of engine output (arrays to lists, NaN/inf to None)."""
+    if isinstance(value, dict):
+        return {str(k): to_json(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json(v) for v in value]
+    if isinstance(value, np.ndarray) and value.dtype.names:
+        # structured arrays (BM['Table']): one object per row
+        names = value.dtype.names
+        return [dict(zip(names, to_json(list(row)))) for row in value.tolist()]
+    if isinstance(value, np.ndarray):
+        return to_json(value.tolist())
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+
+def merge_settings(base, overrides):
+    """Copy of `base` with `overrides` merged in recursively."""
+    merged = copy.deepcopy(base)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_settings(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+def base_names():
+    """Names of the base settings in settings/."""
+    folder = os.path.join(_this_dir, 'settings')
+    return sorted(os.path.splitext(f)[0] for f in os.listdir(folder)
+                  if f.endswith('.py') and _BASE_NAME.match(os.path.splitext(f)[0])
+                  and not f.startswith('_'))
+
+
+def load_base(name):
+    """Base settings settings/<name>.py."""
+    if not _BASE_NAME.match(name or '') or name not in base_names():
+        raise ValueError('unknown base settings {!r}'.format(name))
+    return load_settings(os.path.join(_this_dir, 'settings', name + '.py'))
+
+
+# ----------------------------------------------------------------------
+# worker side
+# ----------------------------------------------------------------------
+_progress_queue = None
+
+
+def _init_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+    import calculate_sub  # noqa: F401  (import the engine once per worker)
+
+
+def _simulate(job_id, variables, seed):
+    """Run one job in a worker; returns the JSON result."""
+    from calculate_sub import calculate_sub
+
+    def on_progress(info):
+        _progress_queue.put((job_id, info))
+
+    variables['DispFlag'] = False
+    variables['ResultsFlag'] = False
+    variables['ExcelFlag'] = False
+    start = time.perf_counter()
+    handles, BM = calculate_sub({'Variables': variables}, progress_callback=on_progress,
+                                seed=seed)
+    if BM is None:
+        raise RuntimeError('simulation returned no benchmarks')
+    return {'seconds': time.perf_counter() - start, 'BM': to_json(BM)}
+
+
+# ----------------------------------------------------------------------
+# service
+# ----------------------------------------------------------------------
+class Job:
+    """A submitted simulation and its state."""
+
+    def __init__(self, job_id, key, variables, seed):
+        self.id = job_id
+        self.key = key
+        self.variables = variables
+        self.seed = seed
+        self.status = 'queued'
+        self.progress = None
+        self.result = None
+        self.error = None
+        self.cached = False
+        self.submitted = time.time()
+        self.listeners = []
+
+    def info(self, with_result=True):
+        out = {'id': self.id, 'key': self.key, 'status': self.status,
+               'cached': self.cached, 'seed': self.seed,
+               'n': self.variables.get('Number_patients'), 'progress': self.progress}
+        if self.error is not None:
+            out['error'] = self.error
+        if with_result and self.result is not None:
+            out['result'] = self.result
+        return out
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+
+class SimulationService:
+    """
+    Job table, result cache and process pool behind the HTTP server.
+
+    Parameters
+    ----------
+    workers : int
+        Worker processes of the pool.
+    cache_dir : str, optional
+        Keep results as <key>.json in this directory across restarts
+        (in memory only if None).
+    """
+
+    def __init__(self, workers=2, cache_dir=None):
+        self.workers = workers
+        self.cache_dir = cache_dir
+        self.engine_version = engine_version()
+        self.jobs = {}
+        self._cache = {}
+        self._active = {}           # key -> id of a queued or running job
+        self._pool = None
+        self._progress = None
+        self._relay = None
+        self._loop = None
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # lifecycle
+    # ------------------------------------------------------------------
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._progress = multiprocessing.Queue()
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                         initargs=(self._progress,))
+        self._relay = threading.Thread(target=self._relay_progress, daemon=True)
+        self._relay.start()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+        if self._progress is not None:
+            self._progress.put(None)
+            self._relay.join()
+            self._progress = None
+
+    def _relay_progress(self):
+        while True:
+            message = self._progress.get()
+            if message is None:
+                return
+            self._loop.call_soon_threadsafe(self._on_progress, *message)
+
+    def _on_progress(self, job_id, info):
+        job = self.jobs.get(job_id)
+        if job is None or job.finished:
+            return
+        job.status = 'running'
+        job.progress = info
+        self._notify(job, {'id': job.id, 'status': job.status, 'progress': to_json(info)})
+
+    def _notify(self, job, record):
+        for listener in job.listeners:
+            listener.put_nowait(record)
+
+    # ------------------------------------------------------------------
+    # cache
+    # ------------------------------------------------------------------
+    def cache_key(self, variables, seed):
+        # the Benchmarks are not engine settings but define the cached BM
+        return settings_fingerprint(variables, seed=seed, n=variables.get('Number_patients'),
+                                    engine=self.engine_version,
+                                    benchmarks=variables.get('Benchmarks'))
+
+    def cached(self, key):
+        if key in self._cache:
+            return self._cache[key]
+        if self.cache_dir:
+            path = os.path.join(self.cache_dir, key + '.json')
+            if os.path.exists(path):
+                with open(path) as fh:
+                    self._cache[key] = json.load(fh)
+                return self._cache[key]
+        return None
+
+    def _store(self, key, result):
+        self._cache[key] = result
+        if self.cache_dir:
+            path = os.path.join(self.cache_dir, key + '.json')
+            tmp = path + '.tmp'
+            with open(tmp, 'w') as fh:
+                json.dump(result, fh)
+            os.replace(tmp, path)
+
+    # ------------------------------------------------------------------
+    # jobs
+    # ------------------------------------------------------------------
+    def resolve(self, document):
+        """Settings and seed of a job document (see the module docstring)."""
+        if not isinstance(document, dict):
+            raise ValueError('job document must be a JSON object')
+        if 'settings' in document:
+            variables = copy.deepcopy(document['settings'])
+            if not isinstance(variables, dict):
+                raise ValueError('settings must be a JSON object')
+        else:
+            variables = load_base(document.get('base', 'CMOST13'))
+        overrides = document.get('overrides', {})
+        if not isinstance(overrides, dict):
+            raise ValueError('overrides must be a JSON object')
+        variables = merge_settings(variables, overrides)
+        if document.get('n') is not None:
+            variables['Number_patients'] = int(document['n'])
+        if int(variables.get('Number_patients', 0)) < 1:
+            raise ValueError('the number of patients must be positive')
+        return variables, int(document.get('seed', 42))
+
+    def submit(self, document):
+        """Create a job for a document; returns the Job."""
+        variables, seed = self.resolve(document)
+        key = self.cache_key(variables, seed)
+        if key in self._active:
+            return self.jobs[self._active[key]]
+        job = Job(uuid.uuid4().hex[:12], key, variables, seed)
+        self.jobs[job.id] = job
+        result = self.cached(key)
+        if result is not None:
+            job.status, job.result, job.cached = 'done', result, True
+            return job
+        self._active[key] = job.id
+        future = self._loop.run_in_executor(self._pool, _simulate, job.id,
+                                            copy.deepcopy(variables), seed)
+        future.add_done_callback(lambda f: self._finish(job, f))
+        return job
+
+    def _finish(self, job, future):
+        self._active.pop(job.key, None)
+        error = future.exception() if not future.cancelled() else RuntimeError('cancelled')
+        if error is None:
+            job.status, job.result = 'done', future.result()
+            self._store(job.key, job.result)
+        else:
+            job.status, job.error = 'failed', '{}: {}'.format(type(error).__name__, error)
+        self._notify(job, job.info())
+
+    async def events(self, job):
+        """Progress records of `job`, ending with its final state."""
+        if job.finished:
+            yield job.info()
+            return
+        listener = asyncio.Queue()
+        job.listeners.append(listener)
+        try:
+            if job.progress is not None:
+                yield {'id': job.id, 'status': job.status, 'progress': to_json(job.progress)}
+            while True:
+                record = await listener.get()
+                yield record
+                if record['status'] in ('done', 'failed'):
+                    return
+        finally:
+            job.listeners.remove(listener)
+
+    def health(self):
+        counts = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {'status': 'ok', 'engine_version': self.engine_version,
+                'workers': self.workers, 'jobs': counts, 'cached_results': len(self._cache)}
+
+
+# ----------------------------------------------------------------------
+# HTTP
+# ----------------------------------------------------------------------
+def _response_head(status, content_type='application/json', length=None):
+    lines = ['HTTP/1.1 {} {}'.format(status, _REASONS.get(status, '')),
+             'Content-Type: ' + content_type, 'Connection: close']
+    if length is not None:
+        lines.append('Content-Length: {}'.format(length))
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('ascii')
+
+
+async def _send_json(writer, status, payload):
+    body = json.dumps(to_json(payload)).encode('utf-8')
+    writer.write(_response_head(status, length=len(body)) + body)
+    await writer.drain()
+
+
+async def _read_request(reader):
+    request_line = (await reader.readline()).decode('latin-1').strip()
+    if not request_line:
+        return None
+    method, target, _ = request_line.split(' ', 2)
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode('latin-1').strip()
+        if not line:
+            break
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    body = b''
+    if 'content-length' in headers:
+        body = await reader.readexactly(int(headers['content-length']))
+    return method.upper(), target.split('?', 1)[0], body
+
+
+async def _handle(service, reader, writer):
+    try:
+        request = await _read_request(reader)
+        if request is None:
+            return
+        method, path, body = request
+        parts = [p for p in path.split('/') if p]
+        if parts == ['health'] and method == 'GET':
+            await _send_json(writer, 200, service.health())
+        elif parts == ['bases'] and method == 'GET':
+            await _send_json(writer, 200, {'bases': base_names()})
+        elif parts == ['jobs'] and method == 'POST':
+            try:
+                job = service.submit(json.loads(body or b'{}'))
+            except (ValueError, TypeError, KeyError) as e:
+                await _send_json(writer, 400, {'error': str(e)})
+            else:
+                await _send_json(writer, 200 if job.finished else 202, job.info())
+        elif len(parts) in (2, 3) and parts[0] == 'jobs' and method == 'GET':
+            job = service.jobs.get(parts[1])
+            if job is None:
+                await _send_json(writer, 404, {'error': 'no job {}'.format(parts[1])})
+            elif len(parts) == 2:
+                await _send_json(writer, 200, job.info())
+            elif parts[2] == 'events':
+                writer.write(_response_head(200, 'application/x-ndjson'))
+                async for record in service.events(job):
+                    writer.write(json.dumps(to_json(record)).encode('utf-8') + b'\n')
+                    await writer.drain()
+            else:
+                await _send_json(writer, 404, {'error': 'not found'})
+        else:
+            await _send_json(writer, 404, {'error': 'not found'})
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    except Exception as e:
+        await _send_json(writer, 500, {'error': '{}: {}'.format(type(e).__name__, e)})
+    finally:
+        writer.close()
+
+
+async def serve(host='127.0.0.1', port=8765, workers=2, cache_dir=None, ready=None):
+    """
+    Run the service until cancelled.  `ready`, if given, is called with
+    the bound (host, port) once the server accepts connections.
+    """
+    if host not in LOOPBACK_HOSTS:
+        raise ValueError('the service only binds to loopback addresses {}, got {!r}'.format(
+            LOOPBACK_HOSTS, host))
+    service = SimulationService(workers=workers, cache_dir=cache_dir)
+    service.start()
+    server = await asyncio.start_server(lambda r, w: _handle(service, r, w), host, port)
+    try:
+        if ready is not None:
+            ready(server.sockets[0].getsockname()[:2])
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local CMOST simulation service.')
+    parser.add_argument('--host', default='127.0.0.1', choices=LOOPBACK_HOSTS)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--cache-dir', default=None,
+                        help='keep results on disk in this directory')
+    args = parser.parse_args(argv)
+
+    def ready(address):
+        print('CMOST service on http://{}:{} (engine {})'.format(
+            address[0], address[1], engine_version()), flush=True)
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.cache_dir, ready))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+settings_io.py -- Load CMOST settings files without the GUI.
+
+Settings are stored as
+  - .pkl (pickle) files containing the settings dict,
+  - .py modules with a module-level 'settings' dict (settings/CMOST13.py),
+  - .mat files saved by the MATLAB version (save(filename, 'temp')), which
+    need scipy.
+
+CMOST_Main uses load_settings() for its file dialogs and the Starter batch;
+batch.py uses it in worker processes that do not import tkinter.
+"""
+
+import copy
+import os
+import pickle
+
+import numpy as np
+
+SETTINGS_EXTENSIONS = ('.py', '.pkl', '.mat')
+
+
+def load_settings(filepath):
+    """
+    Load a settings dictionary from a file.
+
+    Supports:
+      - .pkl (pickle) files: expected to contain a dict
+      - .py (Python settings module): expected to have a 'settings' dict
+      - .mat (MATLAB) files, via scipy
+
+    Returns
+    -------
+    dict or None
+        The loaded settings dictionary, or None on failure.
+
+    Raises
+    ------
+    ImportError
+        For .mat files if scipy is not installed.
+    """
+    ext = os.path.splitext(filepath)[1].lower()
+
+    if ext == '.pkl':
+        try:
+            with open(filepath, 'rb') as f:
+                data = pickle.load(f)
+            if isinstance(data, dict):
+                return data
+        except Exception:
+            pass
+        return None
+
+    elif ext == '.py':
+        # Import the Python settings module dynamically
+        try:
+            import importlib.util
+            spec = importlib.util.spec_from_file_location('_tmp_settings', filepath)
+            mod = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(mod)
+            if hasattr(mod, 'settings') and isinstance(mod.settings, dict):
+                return copy.deepcopy(mod.settings)
+        except Exception:
+            pass
+        return None
+
+    elif ext == '.mat':
+        import scipy.io
+        try:
+            mat_data = scipy.io.loadmat(filepath, squeeze_me=True)
+            # The MATLAB code saves as: save(filename, 'temp')
+            # so the dict key is 'temp'
+            if 'temp' in mat_data:
+                return mat_struct_to_dict(mat_data['temp'])
+            elif 'Variables' in mat_data:
+                return mat_struct_to_dict(mat_data['Variables'])
+            else:
+                # Return the first non-internal key
+                for key in mat_data:
+                    if not key.startswith('__'):
+                        return mat_struct_to_dict(mat_data[key])
+        except Exception:
+            pass
+        return None
+
+    return None
+
+
+def mat_struct_to_dict(obj):
+    """
+    Recursively convert a scipy.io loaded MATLAB struct to a Python dict.
+    """
+    if hasattr(obj, 'dtype') and obj.dtype.names is not None:
+        # structured numpy array (MATLAB struct)
+        result = {}
+        for name in obj.dtype.names:
+            val = obj[name]
+            if hasattr(val, 'item'):
+                val = val.item()
+            result[name] = mat_struct_to_dict(val)
+        return result
+    elif isinstance(obj, np.ndarray):
+        if obj.ndim == 0:
+            return obj.item()
+        elif obj.dtype.kind in ('U', 'S', 'O'):
+            # String or object array
+            if obj.size == 1:
+                return str(obj.flat[0])
+            return [str(x) for x in obj.flat]
+        else:
+            return obj.tolist()
+    else:
+        return obj
+
+
+def settings_files(directory, extensions=SETTINGS_EXTENSIONS):
+    """Sorted paths of the settings files directly in `directory`."""
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if os.path.splitext(name)[1].lower() in extensions
+                  and not name.startswith(('_', '.'))
+                  and os.path.isfile(os.path.join(directory, name)))
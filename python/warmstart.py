@@ -0,0 +1,81 @@
+"""
+warmstart.py -- Start simulations from a stored population state at a given
+age instead of from year 1.
+
+Calibration steps that only change parameters acting late in life, or RCT
+emulations enrolling at 55-64, spend a large part of every run on identical
+early years.  calculate_sub(..., warm_start_dir=DIR, warm_start_year=40)
+looks for a stored state of the cohort after `warm_start_year` years in DIR:
+
+  * if none exists, the engine is run up to that year once and its state is
+    stored (see checkpoint.py), after which the run continues from it;
+  * if one exists, the engine starts directly after that year.
+
+States are keyed by the natural-history inputs truncated to the warm-start
+year (see NumberCrunching_100000.natural_history_fingerprint), which include
+the randomized cohort drawn from the seed, plus the surveillance / special
+scenario flags.  Any parameter change that affects the first years therefore
+selects (or creates) a different state, while changes confined to later
+years reuse it.  A warm-started run gives the same results as a full run
+with the same seed and settings.
+
+Screening must not start before the warm-start year + 1.
+"""
+
+import inspect
+import os
+
+import numpy as np
+
+from checkpoint import inputs_fingerprint, load_checkpoint
+from NumberCrunching_100000 import (NumberCrunching_100000, ENGINE_BACKEND,
+                                    natural_history_fingerprint)
+
+
+def warm_start_key(year, inputs, crn_seed=None):
+    """Key of the stored state for the engine inputs (dict) at `year`."""
+    flag = {k: v for k, v in inputs['flag'].items() if k != 'Screening'}
+    return inputs_fingerprint({
+        'natural_history': natural_history_fingerprint(year, inputs),
+        'flag': flag,
+        'SpecialText': inputs['SpecialText'],
+        'backend': ENGINE_BACKEND,
+        'year': year,
+        'crn_seed': crn_seed,
+    })
+
+
+def warm_start_state(cache_dir, year, engine_args, crn=None):
+    """
+    Return the path of the stored population state after `year` for the
+    positional engine arguments `engine_args` (and common random numbers
+    `crn`, if used), creating it if necessary.
+
+    Creating the state runs the engine for `year` years and consumes the
+    random generator; the warm-started run restores the generator state from
+    the stored state, so results do not depend on whether it was cached.
+    """
+    inputs = inspect.signature(NumberCrunching_100000).bind_partial(*engine_args).arguments
+    if inputs['flag'].get('Screening', False):
+        screening_test = inputs['ScreeningTest']
+        used = screening_test[:, 0] > 0
+        if np.any(used) and np.min(screening_test[used, 3]) <= year:
+            raise ValueError('warm start year {} is not before the screening start '
+                             'year {}'.format(year, np.min(screening_test[used, 3])))
+
+    crn_seed = None if crn is None else crn.seed
+    key = warm_start_key(year, inputs, crn_seed)
+    path = os.path.join(cache_dir, 'warm_y{}_{}'.format(year, key[:32]))
+    if os.path.isdir(path):
+        try:
+            if load_checkpoint(path).year == year:
+                print('Warm start from {}'.format(path))
+                return path
+        except ValueError:
+            pass
+
+    os.makedirs(cache_dir, exist_ok=True)
+    print('Creating warm start state {} (year {})'.format(path, year))
+    NumberCrunching_100000(*engine_args, checkpoint_path=path, stop_after_year=year,
+                           common_random_numbers=crn)
+    return path
@@ -0,0 +1,112 @@
+"""
+year_summary.py -- Per-year cohort summaries for Evaluation.
+
+Evaluation reads the (100, n) per-patient matrices of the engine output
+(MaxPolyps, NumPolyps, MaxCancer, HasCancer, YearIncluded, YearAlive) only
+through a few counts per year.  summarize() computes these counts from the
+matrices; YearSummary collects the same counts while the engine runs, so
+the matrices never have to exist:
+
+    summary = YearSummary()
+    out = NumberCrunching_100000(..., year_summary=summary)
+    data['YearSummary'] = summary.result()
+
+With a YearSummary the engine keeps one row per matrix (the current year)
+and returns None for the matrices; calculate_sub(stream_evaluation=True)
+does this and Evaluation then reads data['YearSummary'].  BM and Results
+are identical to a run with the full matrices.  The tumour records and the
+per-patient vectors (DeathYear, DeathCause, ...) are kept as before.
+
+Summary entries, first axis the year index (0-99):
+  'MaxPolyps'  (100, 3, 7)  included patients by gender (1, 2) and most
+                            advanced polyp (0: none, 1-6)
+  'MaxCancer'  (100, 11)    included patients by most advanced cancer
+                            (0: none, 7-10)
+  'NumPolyps'  (100, K)     all patients by number of polyps
+  'Alive'      (100, 3)     living patients by gender
+  'HasCancer'  (100,)       patients who had a cancer up to that year
+"""
+
+import numpy as np
+
+from binning import year_counts
+
+# Polyp_Polyps holds 51 polyps per patient
+NUM_POLYPS_SIZE = 52
+
+SUMMARY_KEYS = ('MaxPolyps', 'MaxCancer', 'NumPolyps', 'Alive', 'HasCancer')
+
+
+def summarize(gender, max_polyps, num_polyps, max_cancer, has_cancer, included,
+              alive, num_polyps_size=NUM_POLYPS_SIZE, keys=SUMMARY_KEYS):
+    """
+    Summary entries (see the module docstring) of (years, n) matrices.
+
+    `gender` is the (n,) gender of the patients; only the entries named in
+    `keys` are computed.
+    """
+    gender = np.asarray(gender).astype(np.intp)
+    out = {}
+    if 'MaxPolyps' in keys:
+        out['MaxPolyps'] = year_counts(max_polyps, size=7, mask=included, by=gender, n_by=3)
+    if 'MaxCancer' in keys:
+        out['MaxCancer'] = year_counts(max_cancer, size=11, mask=included)
+    if 'NumPolyps' in keys:
+        num_polyps = np.asarray(num_polyps)
+        if num_polyps.size:
+            num_polyps_size = max(num_polyps_size, int(np.max(num_polyps)) + 1)
+        out['NumPolyps'] = year_counts(num_polyps, size=num_polyps_size)
+    if 'Alive' in keys:
+        out['Alive'] = year_counts(alive, size=2, by=gender, n_by=3)[:, :, 1]
+    if 'HasCancer' in keys:
+        out['HasCancer'] = np.count_nonzero(has_cancer, axis=1)
+    return out
+
+
+def summarize_data(data, keys=SUMMARY_KEYS):
+    """Summary entries of an engine output with the full matrices."""
+    return summarize(data['Gender'], data['MaxPolyps'], data['NumPolyps'],
+                     data['MaxCancer'], data['HasCancer'], data['YearIncluded'],
+                     data['YearAlive'], keys=keys)
+
+
+class YearSummary:
+    """
+    Summary entries collected year by year during a simulation.
+
+    The engine calls start() once and add() at the end of every simulated
+    year.  Years that are not simulated (the cohort died out) hold the
+    counts of an empty year, as the zero rows of the matrices do.
+    """
+
+    def __init__(self, years=100):
+        self.years = years
+        self.gender = None
+        self.entries = None
+
+    def start(self, gender):
+        """Set up the counts for a cohort of the given (n,) genders."""
+        self.gender = np.asarray(gender).astype(np.intp)
+        empty = np.zeros((1, len(self.gender)))
+        blank = summarize(self.gender, empty, empty, empty, empty,
+                          empty.astype(bool), empty.astype(bool))
+        self.entries = {key: np.repeat(value, self.years, axis=0)
+                        for key, value in blank.items()}
+
+    def add(self, yi, max_polyps, num_polyps, max_cancer, has_cancer, included, alive):
+        """Count year index `yi` from the (n,) rows of the engine matrices."""
+        if self.entries is None:
+            raise ValueError('YearSummary.start() was not called')
+        row = summarize(self.gender, max_polyps[None], num_polyps[None],
+                        max_cancer[None], has_cancer[None], included[None],
+                        alive[None])
+        for key, value in row.items():
+            self.entries[key][yi] = value[0]
+        # the engine sets HasCancer for all following years
+        self.entries['HasCancer'][yi:] = row['HasCancer'][0]
+
+    def result(self):
+        """The summary entries (dict of arrays)."""
+        if self.entries is None:
+            raise ValueError('YearSummary.start() was not called')
+        return {key: value.copy() for key, value in self.entries.items()}